@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # `carts` registers its job handler with `jobs`.
+        from . import carts, signals  # noqa: F401
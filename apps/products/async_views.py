@@ -0,0 +1,111 @@
+from django.http import Http404, HttpResponse, HttpResponseBase
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from .cache import aread_through, category_key, product_key
+from .fast_serializers import product_values, review_values
+from .models import Category, Product, Review
+from .pagination import ProductPagination, ReviewPagination
+from .serializers import CategorySerializer
+from .views import CatalogFilterMixin
+
+
+class AsyncAPIView(View):
+    """
+    Base of the async read endpoints served under ASGI.
+
+    DRF views only run synchronously, so these are plain Django views whose handlers return the data to
+    send: it is rendered with DRF's JSON renderer, and `Http404` and DRF exceptions become the error
+    bodies a DRF view would answer with. Handlers must only touch the database through the async ORM.
+    """
+    renderer = JSONRenderer()
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            data = await super().dispatch(request, *args, **kwargs)
+        except Http404:
+            return self.render({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+        except APIException as error:
+            detail = error.detail if isinstance(error.detail, (list, dict)) else {'detail': error.detail}
+            return self.render(detail, error.status_code)
+        if isinstance(data, HttpResponseBase):
+            return data
+        return self.render(data)
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status_code, content_type='application/json')
+
+
+class AsyncProductListView(CatalogFilterMixin, AsyncAPIView):
+    """
+    Async twin of `ProductListView`: the same filters, orderings, pages and payload, read with the async ORM.
+    """
+    pagination_class = ProductPagination
+
+    def get_filter_params(self):
+        filters = self.filter_serializer_class(data=self.request.GET, context={'request': self.request})
+        filters.is_valid(raise_exception=True)
+        return filters.validated_data
+
+    async def get(self, request):
+        # The lazy `request.user` cannot load the user from an async context, so resolve it first.
+        request.user = await request.auser()
+        rows = product_values.values(self.filter_catalog(self.get_filter_params()))
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(rows, request)
+        return paginator.get_paginated_data(await product_values.aserialize_rows(page, request))
+
+
+async def aload_product_payload(slug):
+    payloads = await product_values.aserialize(Product.objects.exclude(status='draft').filter(slug=slug))
+    return payloads[0] if payloads else None
+
+
+async def aload_category_payload(slug):
+    try:
+        category = await Category.objects.aget(slug=slug)
+    except Category.DoesNotExist:
+        return None
+    return dict(CategorySerializer(category).data)
+
+
+class AsyncProductDetailView(AsyncAPIView):
+    """
+    Async twin of `ProductDetailView`, sharing its read-through cache entries.
+    """
+
+    async def get(self, request, slug):
+        payload = await aread_through(product_key(slug), lambda: aload_product_payload(slug))
+        if payload is None:
+            raise Http404
+        return payload
+
+
+class AsyncCategoryDetailView(AsyncAPIView):
+    """
+    Async twin of `CategoryDetailView`, sharing its read-through cache entries.
+    """
+
+    async def get(self, request, slug):
+        payload = await aread_through(category_key(slug), lambda: aload_category_payload(slug))
+        if payload is None:
+            raise Http404
+        return payload
+
+
+class AsyncProductReviewListView(AsyncAPIView):
+    """
+    Async twin of `ProductReviewListView`.
+    """
+    pagination_class = ReviewPagination
+
+    async def get(self, request, slug):
+        try:
+            product = await Product.objects.exclude(status='draft').only('pk').aget(slug=slug)
+        except Product.DoesNotExist:
+            raise Http404
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(review_values.values(Review.objects.filter(product=product)), request)
+        return paginator.get_paginated_data(await review_values.aserialize_rows(page, request))
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+# Entries are served as fresh for FRESH_FOR seconds; after that the first reader recomputes them while
+# everyone else keeps getting the stale copy, until the entry finally expires after STORE_FOR seconds.
+FRESH_FOR = 5 * 60
+STORE_FOR = 60 * 60
+# How long a recomputation may hold its key's lock, and how long readers without any copy wait for it.
+LOCK_FOR = 30
+WAIT_FOR = 2.0
+WAIT_STEP = 0.05
+
+
+def is_shared():
+    """
+    Returns `True` when the cache is shared by every process, so that one process, e.g. the job worker,
+    sees what another wrote.
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def product_key(slug):
+    return f'products:product:{slug}'
+
+
+def category_key(slug):
+    return f'products:category:{slug}'
+
+
+def read_through(key, loader):
+    """
+    Returns the payload cached under `key`, computing and caching it with `loader()` when needed.
+
+    Stampedes are prevented with a per-key lock taken through `cache.add`: only its holder runs
+    `loader`. Other readers are served the stale copy if there is one, otherwise they wait up to
+    `WAIT_FOR` seconds for the holder's result before falling back to `loader` themselves.
+    `loader` may return `None` for missing objects; that answer is cached as well.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['payload']
+
+    lock = f'{key}:lock'
+    if cache.add(lock, True, LOCK_FOR):
+        try:
+            payload = loader()
+            cache.set(key, {'payload': payload, 'fresh_until': time.time() + FRESH_FOR}, STORE_FOR)
+            return payload
+        finally:
+            cache.delete(lock)
+
+    if entry is not None:
+        return entry['payload']
+    deadline = time.monotonic() + WAIT_FOR
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['payload']
+    return loader()
+
+
+async def aread_through(key, loader):
+    """
+    Async counterpart of `read_through` for async views: `loader` is a coroutine function, the cache is
+    used through its async API and waiting readers yield to the event loop instead of blocking it.
+    """
+    entry = await cache.aget(key)
+    if entry is not None and entry['fresh_until'] > time.time():
+        return entry['payload']
+
+    lock = f'{key}:lock'
+    if await cache.aadd(lock, True, LOCK_FOR):
+        try:
+            payload = await loader()
+            await cache.aset(key, {'payload': payload, 'fresh_until': time.time() + FRESH_FOR}, STORE_FOR)
+            return payload
+        finally:
+            await cache.adelete(lock)
+
+    if entry is not None:
+        return entry['payload']
+    deadline = time.monotonic() + WAIT_FOR
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_STEP)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry['payload']
+    return await loader()
+
+
+def invalidate(keys):
+    """
+    Drops the cached payloads under `keys`, now and again once the current transaction commits,
+    so a reader cannot re-cache the old rows in between.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_products(slugs):
+    invalidate(product_key(slug) for slug in slugs)
+
+
+def invalidate_categories(slugs):
+    invalidate(category_key(slug) for slug in slugs)
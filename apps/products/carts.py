@@ -0,0 +1,206 @@
+import secrets
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import User
+
+from . import cache as shared_cache
+from .checkout import place_order, snapshot_price
+from .jobs import enqueue, handler
+from .models import Cart, CartItem, Product
+
+# Cookie identifying the cart of an anonymous visitor.
+CART_COOKIE = 'cart'
+# Carts are kept this many seconds after their last change.
+CART_TTL = 30 * 24 * 60 * 60
+# A logged-in user's cart is written to the database at most this often while it changes; a change made
+# sooner is written by a `persist_cart` job due when the interval is over.
+PERSIST_EVERY = 60
+MAX_QUANTITY = 99
+
+
+class EmptyCart(Exception):
+    """
+    Raised when checking out a cart without lines.
+    """
+
+
+def cart_key(user_id=None, token=None):
+    if user_id is not None:
+        return f'carts:user:{user_id}'
+    return f'carts:anonymous:{token}'
+
+
+class ShoppingCart:
+    """
+    The shopping cart of a logged-in user or of an anonymous visitor identified by a cookie token.
+
+    The cart lives in the cache, so adding to it costs no database write and no session write. Carts of
+    logged-in users are written behind to `Cart` and `CartItem`, and reloaded from there when the cache
+    lost them: a change is written at once when the last write is older than `PERSIST_EVERY` seconds;
+    otherwise the cart is marked dirty and a `persist_cart` job writes it when the interval is over. The
+    job reads the cart from the cache, so with a per-process cache, which the worker cannot see, carts are
+    written through on every change instead. Anonymous carts only live in the cache and are merged into
+    the user's cart once the visitor logs in.
+
+    Attributes:
+        user (User): The owner of the cart, `None` for anonymous visitors.
+        token (str): The cookie token of an anonymous cart.
+        lines (dict): The `{product_id: quantity}` lines of the cart.
+        dirty (bool): Whether the cart changed since it was last written to the database.
+    """
+
+    def __init__(self, user=None, token=None):
+        self.user = user
+        self.token = token
+        self.key = cart_key(user.pk if user is not None else None, token)
+        state = cache.get(self.key)
+        if state is None and user is not None:
+            lines = dict(CartItem.objects.filter(cart__user=user).values_list('product_id', 'quantity'))
+            # A cart read back from the database is in sync with it; a new one is persisted on its first change.
+            state = {'lines': lines, 'persisted_at': time.time() if lines else None}
+        self.lines = state['lines'] if state else {}
+        self.persisted_at = state['persisted_at'] if state else None
+        self.dirty = state.get('dirty', False) if state else False
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Returns the cart of the requesting user, merging the anonymous cart of the cookie into it, or the
+        anonymous cart of the cookie, with a new token when there is none.
+        """
+        token = request.COOKIES.get(CART_COOKIE)
+        if not request.user.is_authenticated:
+            return cls(token=token or secrets.token_urlsafe(16))
+        cart = cls(user=request.user)
+        if token:
+            anonymous = cls(token=token)
+            if anonymous.lines:
+                for product_id, quantity in anonymous.lines.items():
+                    cart.lines[product_id] = min(cart.lines.get(product_id, 0) + quantity, MAX_QUANTITY)
+                cart.save()
+                anonymous.clear()
+        return cart
+
+    def set_quantity(self, product_id, quantity):
+        """
+        Sets the quantity of a product, removing it from the cart when `quantity` is 0.
+        """
+        if quantity:
+            self.lines[product_id] = quantity
+        else:
+            self.lines.pop(product_id, None)
+        self.save()
+
+    def save(self):
+        now = time.time()
+        if self.user is not None:
+            if (
+                not shared_cache.is_shared() or self.persisted_at is None
+                or now - self.persisted_at >= PERSIST_EVERY
+            ):
+                self.persist()
+            elif not self.dirty:
+                self.dirty = True
+                due_in = self.persisted_at + PERSIST_EVERY - now
+                enqueue('persist_cart', {'user': self.user.pk}, timezone.now() + timedelta(seconds=due_in))
+        self.store()
+
+    def store(self):
+        cache.set(
+            self.key,
+            {'lines': self.lines, 'persisted_at': self.persisted_at, 'dirty': self.dirty},
+            CART_TTL
+        )
+
+    def persist(self):
+        """
+        Replaces the persisted copy of the cart with its current lines.
+        """
+        self.persisted_at, self.dirty = time.time(), False
+        existing = set(Product.objects.filter(pk__in=list(self.lines)).values_list('pk', flat=True))
+        with transaction.atomic():
+            cart, _ = Cart.objects.update_or_create(user=self.user)
+            cart.items.all().delete()
+            CartItem.objects.bulk_create([
+                CartItem(cart=cart, product_id=product_id, quantity=quantity)
+                for product_id, quantity in self.lines.items()
+                if product_id in existing
+            ])
+
+    def clear(self):
+        self.lines = {}
+        cache.delete(self.key)
+        if self.user is not None:
+            Cart.objects.filter(user=self.user).delete()
+
+    def priced(self):
+        """
+        Returns the lines of the cart with the current price, discount and availability of their products,
+        all read with one query, and the cart total as the order would charge it.
+
+        Products that no longer exist are dropped from the cart.
+        """
+        products = Product.objects.only(
+            'name', 'slug', 'price', 'discount', 'effective_price', 'status', 'stock'
+        ).in_bulk(list(self.lines))
+        items = []
+        for product_id, quantity in sorted(self.lines.items()):
+            product = products.get(product_id)
+            if product is None:
+                continue
+            unit_price = snapshot_price(product)
+            items.append({
+                'product': product_id,
+                'name': product.name,
+                'slug': product.slug,
+                'price': product.price,
+                'discount': product.discount,
+                'effective_price': product.effective_price,
+                'unit_price': unit_price,
+                'quantity': quantity,
+                'line_total': unit_price * quantity,
+                'available': product.status == 'active' and product.stock >= quantity,
+            })
+        if len(items) != len(self.lines):
+            self.lines = {item['product']: item['quantity'] for item in items}
+            self.save()
+        return {
+            'items': items,
+            'total_quantity': sum(item['quantity'] for item in items),
+            'total': sum(item['line_total'] for item in items),
+            'available': all(item['available'] for item in items),
+        }
+
+    def checkout(self, address):
+        """
+        Places an order for the lines of the cart with `place_order` and empties the cart, in one transaction.
+
+        Raises `EmptyCart` for carts without lines, and `ProductUnavailable` or `InsufficientStock` like
+        `place_order`, leaving the cart as it was.
+        """
+        if not self.lines:
+            raise EmptyCart
+        with transaction.atomic():
+            order = place_order(self.user, address, self.lines.items())
+            Cart.objects.filter(user=self.user).delete()
+        self.lines = {}
+        cache.delete(self.key)
+        return order
+
+
+@handler('persist_cart')
+def persist_dirty_carts(payloads):
+    """
+    Writes the carts of `{'user': id}` payloads that changed since they were last written, as the cache
+    holds them. Carts that were written, checked out or lost from the cache meanwhile are left alone.
+    """
+    for user in User.objects.filter(pk__in={payload['user'] for payload in payloads}):
+        cart = ShoppingCart(user=user)
+        if cart.dirty:
+            cart.persist()
+            cart.store()
@@ -0,0 +1,81 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue_many
+from .models import Order, OrderItem, Product
+from .stock import merge_lines, reserve_lines_bulk
+
+
+class ProductUnavailable(Exception):
+    """
+    Raised when an order references products that do not exist or are not active.
+
+    Attributes:
+        product_ids (list): The ids of the unavailable products, in ascending order.
+    """
+
+    def __init__(self, product_ids):
+        self.product_ids = product_ids
+        super().__init__(
+            'Unavailable product(s): ' + ', '.join(str(product_id) for product_id in product_ids)
+        )
+
+
+def snapshot_price(product):
+    """
+    Returns the whole-unit price stored on an order item for `product`: its effective price, rounded half up.
+    """
+    return int(product.effective_price.quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def place_order(user, address, lines):
+    """
+    Creates an order for `user` from `(product_id, quantity)` lines in a single transaction.
+
+    The number of queries does not depend on the number of lines: all products are loaded with one
+    `in_bulk` query, stock for every line is reserved with `reserve_lines_bulk`, and the items are
+    inserted with one `bulk_create` carrying a snapshot of each product price. Repeated products are
+    merged into one item. The side effects that can wait, the buyer's last purchase date and the
+    confirmation email, are enqueued as jobs in the same transaction rather than done inline.
+
+    Raises `ProductUnavailable` for unknown or inactive products and `InsufficientStock` when stock
+    cannot cover the order; nothing is written in either case.
+    """
+    quantities = merge_lines(lines)
+    with transaction.atomic():
+        products = Product.objects.in_bulk(list(quantities))
+        unavailable = sorted(
+            product_id for product_id in quantities
+            if product_id not in products or products[product_id].status != 'active'
+        )
+        if unavailable:
+            raise ProductUnavailable(unavailable)
+
+        reserve_lines_bulk(quantities.items())
+
+        items = [
+            OrderItem(
+                product=products[product_id],
+                quantity=quantity,
+                price=snapshot_price(products[product_id])
+            )
+            for product_id, quantity in sorted(quantities.items())
+        ]
+        cost = sum(item.price * item.quantity for item in items)
+        order = Order.objects.create(
+            user=user,
+            address=address,
+            cost=cost,
+            items_cost=cost,
+            items_quantity=sum(quantities.values())
+        )
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items, refresh_totals=False)
+        enqueue_many([
+            ('last_purchase_date', {'user': user.pk, 'date': timezone.localdate(order.order_date).isoformat()}),
+            ('order_confirmation', {'order': order.pk}),
+        ])
+    return order
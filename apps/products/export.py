@@ -0,0 +1,108 @@
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OrderItem
+
+# Orders fetched per server-side cursor round trip; the items of each batch are loaded with one query.
+CHUNK_SIZE = 2000
+ORDER_FIELDS = ['id', 'order_date', 'status', 'user_id', 'username', 'email', 'address', 'cost']
+ITEM_FIELDS = ['product_id', 'product_name', 'quantity', 'price']
+CSV_HEADER = ['order_id', *ORDER_FIELDS[1:], *ITEM_FIELDS]
+
+
+def filter_orders(queryset, since=None, until=None, status=None):
+    """
+    Narrows `queryset` to orders placed between the dates `since` and `until` (both inclusive,
+    in the current timezone) and, if given, with `status`.
+    """
+    if since is not None:
+        queryset = queryset.filter(order_date__gte=_start_of(since))
+    if until is not None:
+        queryset = queryset.filter(order_date__lt=_start_of(until + timedelta(days=1)))
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def _start_of(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def iter_orders(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yields every order of `queryset` as a plain dictionary with its user's name and email and
+    an `items` list, in primary key order.
+
+    Orders are read through `.iterator(chunk_size=...)`, a server-side cursor on PostgreSQL, and
+    the items of every `chunk_size` orders are fetched with one query, so memory stays bounded by
+    one batch no matter how many orders are exported.
+    """
+    orders = (
+        queryset
+        .order_by('pk')
+        .values('id', 'order_date', 'status', 'user_id', 'address', 'cost',
+                username=F('user__username'), email=F('user__email'))
+        .iterator(chunk_size=chunk_size)
+    )
+    while batch := list(islice(orders, chunk_size)):
+        items = defaultdict(list)
+        rows = (
+            OrderItem.objects
+            .filter(order_id__in=[order['id'] for order in batch])
+            .order_by('order_id', 'pk')
+            .values('order_id', 'product_id', 'quantity', 'price', product_name=F('product__name'))
+        )
+        for item in rows:
+            items[item.pop('order_id')].append(item)
+        for order in batch:
+            order['order_date'] = order['order_date'].isoformat()
+            order['items'] = items.get(order['id'], [])
+            yield order
+
+
+class _Echo:
+    # A file-like object whose `write` hands the line back to `csv.writer`, so rows can be streamed.
+    def write(self, value):
+        return value
+
+
+def csv_lines(orders):
+    """
+    Renders orders from `iter_orders` as CSV, one line per order item; orders without items get
+    one line with empty item columns.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_HEADER)
+    for order in orders:
+        head = [order[field] for field in ORDER_FIELDS]
+        items = order['items'] or [dict.fromkeys(ITEM_FIELDS, '')]
+        yield ''.join(writer.writerow(head + [item[field] for field in ITEM_FIELDS]) for item in items)
+
+
+def jsonl_lines(orders):
+    """
+    Renders orders from `iter_orders` as JSON Lines, one object per order.
+    """
+    for order in orders:
+        yield json.dumps(order) + '\n'
+
+
+# Supported export formats, as `(renderer, content type)` pairs.
+EXPORT_FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson'),
+}
+
+
+def export_orders(queryset, export_format, chunk_size=CHUNK_SIZE):
+    """
+    Returns a generator of text chunks exporting `queryset` in `export_format`.
+    """
+    render, _ = EXPORT_FORMATS[export_format]
+    return render(iter_orders(queryset, chunk_size))
@@ -0,0 +1,308 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .models.product import RATING_VALUES, rating_bucket
+from .renditions import RenditionsField
+from .serializers import OrderItemSerializer, OrderSerializer, ProductSerializer, ReviewSerializer
+
+# Fields of the compiled serializers that are not model columns, as `(columns, function(row))` pairs,
+# and querysets hooks adding the annotations they read. Nested serializers are compiled with these too.
+COMPUTED_FIELDS = {
+    ProductSerializer: {
+        'rating_histogram': (
+            [rating_bucket(rating) for rating in RATING_VALUES],
+            lambda row: {rating: row[rating_bucket(rating)] for rating in RATING_VALUES}
+        ),
+    },
+    OrderSerializer: {
+        'total_cost': (['annotated_total_cost'], lambda row: row['annotated_total_cost']),
+        'total_products': (['annotated_total_products'], lambda row: row['annotated_total_products']),
+    },
+}
+PREPARE = {
+    OrderSerializer: lambda queryset: queryset.with_totals(),
+}
+
+
+class ValuesSerializer:
+    """
+    Read-only counterpart of a DRF `ModelSerializer` that works on `.values()` rows instead of model instances.
+
+    Everything that does not depend on the data is worked out once, when the instance is created: the columns
+    to select, and for every serializer field a plain function turning a row into the field's representation.
+    Scalar fields reuse the bound DRF field's `to_representation`, so the output renders to the same JSON as
+    the `ModelSerializer` it was compiled from. Many-to-many primary keys and nested serializers are loaded
+    with one query per relation for a whole batch of rows, related objects in primary key order.
+
+    Fields that are not model columns must be listed in `COMPUTED_FIELDS`, otherwise compiling raises
+    `ImproperlyConfigured`.
+    """
+
+    def __init__(self, serializer_class):
+        self.model = serializer_class.Meta.model
+        self.key = self.model._meta.pk.attname
+        self.prepare = PREPARE.get(serializer_class)
+        self.columns = [self.key]
+        self.relations = {}
+        self.extractors = []
+        computed = COMPUTED_FIELDS.get(serializer_class, {})
+        for name, field in serializer_class().fields.items():
+            if name in computed:
+                columns, function = computed[name]
+                self.columns.extend(columns)
+                self.extractors.append((name, _computed_extractor(function)))
+            else:
+                self.extractors.append((name, self._compile(name, field)))
+        self.columns = list(dict.fromkeys(self.columns))
+
+    def _compile(self, name, field):
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise ImproperlyConfigured(
+                f'Cannot compile {self.model.__name__}.{name} from model columns; add it to COMPUTED_FIELDS.'
+            )
+
+        if isinstance(field, serializers.ManyRelatedField):
+            relation = ManyPrimaryKeys(model_field, self.key)
+        elif isinstance(field, serializers.ListSerializer):
+            relation = NestedMany(model_field, self.key, ValuesSerializer(type(field.child)))
+        elif isinstance(field, serializers.BaseSerializer):
+            relation = NestedOne(model_field, ValuesSerializer(type(field)))
+        else:
+            self.columns.append(model_field.attname)
+            if isinstance(field, serializers.FileField):
+                return _file_extractor(model_field)
+            if isinstance(field, RenditionsField):
+                return _renditions_extractor(field, model_field.attname)
+            if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                return _column_extractor(model_field.attname)
+            if _is_plain_iso_datetime(field):
+                return _datetime_extractor(model_field.attname)
+            return _scalar_extractor(field, model_field.attname)
+
+        self.columns.append(relation.key)
+        self.relations[name] = relation
+        return _relation_extractor(name, relation)
+
+    def values(self, queryset):
+        """
+        Returns `queryset` as a `.values()` queryset selecting the compiled columns.
+        """
+        if self.prepare is not None:
+            queryset = self.prepare(queryset)
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def serialize(self, queryset, request=None):
+        """
+        Serializes every object of `queryset`.
+        """
+        return self.serialize_rows(list(self.values(queryset)), request)
+
+    def serialize_rows(self, rows, request=None):
+        """
+        Serializes rows produced by `values()`, e.g. a page of them cut by a paginator.
+        """
+        context = {name: relation.load(rows, request) for name, relation in self.relations.items()}
+        return self._serialize(rows, context, request)
+
+    async def aserialize(self, queryset, request=None):
+        """
+        Async counterpart of `serialize`, for async views.
+        """
+        return await self.aserialize_rows([row async for row in self.values(queryset).aiterator()], request)
+
+    async def aserialize_rows(self, rows, request=None):
+        """
+        Async counterpart of `serialize_rows`: relations are loaded with the async ORM.
+        """
+        context = {name: await relation.aload(rows, request) for name, relation in self.relations.items()}
+        return self._serialize(rows, context, request)
+
+    def _serialize(self, rows, context, request):
+        context['request'] = request
+        context['timezone'] = timezone.get_current_timezone()
+        extractors = self.extractors
+        return [{name: extract(row, context) for name, extract in extractors} for row in rows]
+
+
+def _computed_extractor(function):
+    def extract(row, context):
+        return function(row)
+    return extract
+
+
+def _column_extractor(column):
+    def extract(row, context):
+        return row[column]
+    return extract
+
+
+def _scalar_extractor(field, column):
+    represent = field.to_representation
+
+    def extract(row, context):
+        value = row[column]
+        return None if value is None else represent(value)
+
+    return extract
+
+
+def _is_plain_iso_datetime(field):
+    return (
+        isinstance(field, serializers.DateTimeField)
+        and not hasattr(field, 'timezone')
+        and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601
+        and settings.USE_TZ
+    )
+
+
+def _datetime_extractor(column):
+    # `DateTimeField.to_representation` with the current timezone looked up once per batch instead of per value.
+    def extract(row, context):
+        value = row[column]
+        if not value:
+            return None
+        value = value.astimezone(context['timezone']).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+    return extract
+
+
+def _file_extractor(model_field):
+    # Mirrors `rest_framework.fields.FileField.to_representation` for a stored file name.
+    column = model_field.attname
+    storage = model_field.storage
+
+    def extract(row, context):
+        name = row[column]
+        if not name:
+            return None
+        url = storage.url(name)
+        request = context['request']
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return extract
+
+
+def _renditions_extractor(field, column):
+    represent = field.represent
+
+    def extract(row, context):
+        return represent(row[column], context['request'])
+
+    return extract
+
+
+def _relation_extractor(name, relation):
+    key, empty = relation.key, relation.empty
+
+    def extract(row, context):
+        return context[name].get(row[key], empty)
+
+    return extract
+
+
+class ManyPrimaryKeys:
+    """
+    Loads the primary keys of a many-to-many relation for a batch of rows with one query on the through table.
+    """
+    empty = []
+
+    def __init__(self, model_field, key):
+        self.key = key
+        self.through = model_field.remote_field.through
+        self.source = model_field.m2m_field_name()
+        self.target = model_field.m2m_reverse_field_name()
+
+    def links(self, rows):
+        # `.values()` rather than `.values_list()`: Django 5.0 runs a values_list query eagerly, which
+        # `aiterator()` cannot take out of the event loop.
+        return (
+            self.through.objects
+            .filter(**{f'{self.source}__in': [row[self.key] for row in rows]})
+            .order_by(f'{self.target}_id')
+            .values(f'{self.source}_id', f'{self.target}_id')
+        )
+
+    def load(self, rows, request=None):
+        return self.group(self.links(rows))
+
+    async def aload(self, rows, request=None):
+        return self.group([link async for link in self.links(rows).aiterator()])
+
+    def group(self, links):
+        grouped = {}
+        owner, target = f'{self.source}_id', f'{self.target}_id'
+        for link in links:
+            grouped.setdefault(link[owner], []).append(link[target])
+        return grouped
+
+
+class NestedOne:
+    """
+    Serializes the objects behind a foreign key for a batch of rows with one query.
+    """
+    empty = None
+
+    def __init__(self, model_field, serializer):
+        self.key = model_field.attname
+        self.serializer = serializer
+
+    def related(self, rows):
+        ids = {row[self.key] for row in rows if row[self.key] is not None}
+        return self.serializer.values(self.serializer.model._default_manager.filter(pk__in=ids))
+
+    def load(self, rows, request=None):
+        related = list(self.related(rows))
+        return self.group(related, self.serializer.serialize_rows(related, request))
+
+    async def aload(self, rows, request=None):
+        related = [row async for row in self.related(rows).aiterator()]
+        return self.group(related, await self.serializer.aserialize_rows(related, request))
+
+    def group(self, related, payloads):
+        return dict(zip((row[self.serializer.key] for row in related), payloads))
+
+
+class NestedMany:
+    """
+    Serializes the objects of a reverse foreign key for a batch of rows with one query.
+    """
+    empty = []
+
+    def __init__(self, model_field, key, serializer):
+        self.key = key
+        self.owner = model_field.field.attname
+        self.serializer = serializer
+        if self.owner not in serializer.columns:
+            serializer.columns.append(self.owner)
+
+    def children(self, rows):
+        children = self.serializer.model._default_manager.filter(
+            **{f'{self.owner}__in': [row[self.key] for row in rows]}
+        ).order_by('pk')
+        return self.serializer.values(children)
+
+    def load(self, rows, request=None):
+        child_rows = list(self.children(rows))
+        return self.group(child_rows, self.serializer.serialize_rows(child_rows, request))
+
+    async def aload(self, rows, request=None):
+        child_rows = [row async for row in self.children(rows).aiterator()]
+        return self.group(child_rows, await self.serializer.aserialize_rows(child_rows, request))
+
+    def group(self, child_rows, payloads):
+        grouped = {}
+        for child_row, payload in zip(child_rows, payloads):
+            grouped.setdefault(child_row[self.owner], []).append(payload)
+        return grouped
+
+
+product_values = ValuesSerializer(ProductSerializer)
+order_item_values = ValuesSerializer(OrderItemSerializer)
+order_values = ValuesSerializer(OrderSerializer)
+review_values = ValuesSerializer(ReviewSerializer)
@@ -0,0 +1,155 @@
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+
+from .cache import invalidate_products
+from .models import Category, Product
+from .serializers import ProductImportSerializer
+
+# Feed rows validated and written per transaction.
+CHUNK_SIZE = 1000
+# Product columns a feed may set, in the order they are written.
+IMPORT_FIELDS = ['name', 'description', 'image', 'status', 'price', 'discount', 'stock', 'low_stock_threshold']
+# Separator of the category slugs in the `categories` column of CSV feeds.
+CSV_CATEGORY_SEPARATOR = '|'
+# CSV columns whose empty cells clear the stored value instead of leaving it untouched.
+CSV_NULLABLE_FIELDS = {'discount'}
+
+
+def read_feed(stream, feed_format):
+    """
+    Yields `(line, row)` pairs from a CSV or JSON Lines feed, one row at a time.
+
+    Empty CSV cells are left out of the row, except those of `CSV_NULLABLE_FIELDS`, which are read as `None`,
+    and `categories`, which is always split into a (possibly empty) list of slugs.
+    """
+    if feed_format == 'csv':
+        for line, row in enumerate(csv.DictReader(stream), 2):
+            cells = {column: value for column, value in row.items() if value not in ('', None)}
+            cells.update((column, None) for column in CSV_NULLABLE_FIELDS if row.get(column) == '')
+            if 'categories' in row:
+                categories = row['categories'] or ''
+                cells['categories'] = [slug for slug in categories.split(CSV_CATEGORY_SEPARATOR) if slug]
+            yield line, cells
+    else:
+        for line, text in enumerate(stream, 1):
+            if text.strip():
+                try:
+                    yield line, json.loads(text)
+                except ValueError as error:
+                    yield line, error
+
+
+class ProductImporter:
+    """
+    Creates or updates products from feed rows keyed by slug, one chunk of rows per transaction.
+
+    Every chunk costs a fixed number of queries: categories are resolved with one query, products
+    are written with one `bulk_create(update_conflicts=True)` upsert per set of columns the rows
+    provide, and category memberships are replaced with one DELETE and one `bulk_create`. Rows without a slug get one slugified from their
+    name. Invalid rows, unknown categories and slugs repeated within a chunk are collected in
+    `errors` as `(line, message)` pairs and skipped; the rest of the chunk is still imported.
+
+    Attributes:
+        created (int): The number of products created so far.
+        updated (int): The number of existing products updated so far.
+        errors (list): The rejected rows so far, as `(line, message)` pairs.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        # One bound serializer validates every row; building one per row deep-copies its fields each time.
+        self.serializer = ProductImportSerializer()
+
+    def run(self, rows):
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+        return self
+
+    def import_chunk(self, chunk):
+        rejected = len(self.errors)
+        valid = self.validate(chunk)
+        categories = Category.objects.in_bulk(
+            {slug for _, data in valid.values() for slug in data.get('categories', ())},
+            field_name='slug'
+        )
+        for slug, (line, data) in list(valid.items()):
+            unknown = sorted(set(data.get('categories', ())) - categories.keys())
+            if unknown:
+                self.errors.append((line, 'categories: Unknown category ' + ', '.join(unknown) + '.'))
+                del valid[slug]
+        self.errors[rejected:] = sorted(self.errors[rejected:])
+        if valid:
+            with transaction.atomic():
+                self.write(valid, categories)
+
+    def validate(self, chunk):
+        valid = {}
+        for line, row in chunk:
+            if not isinstance(row, dict):
+                self.errors.append((line, f'Not a JSON object: {row}'))
+                continue
+            try:
+                data = self.serializer.run_validation(row)
+            except ValidationError as error:
+                self.errors.append((line, '; '.join(
+                    f'{field}: {" ".join(str(message) for message in messages)}'
+                    for field, messages in error.detail.items()
+                )))
+                continue
+            slug = data.pop('slug', None) or slugify(data['name'])[:50]
+            if not slug:
+                self.errors.append((line, 'slug: Cannot derive a slug from the name.'))
+            elif slug in valid:
+                self.errors.append((line, f'slug: Duplicate of line {valid[slug][0]}.'))
+            else:
+                valid[slug] = (line, data)
+        return valid
+
+    def write(self, valid, categories):
+        # Rows are upserted in groups of the same columns: a column a row leaves out is not in the groups'
+        # `update_fields`, so it keeps its stored value instead of being reset to the model default.
+        groups = defaultdict(dict)
+        for slug, (_, data) in valid.items():
+            groups[tuple(field for field in IMPORT_FIELDS if field in data)][slug] = data
+        existing = Product.objects.filter(slug__in=valid).count()
+        products = []
+        for columns, rows in groups.items():
+            products += Product.objects.bulk_create(
+                [Product(slug=slug, **{field: data[field] for field in columns}) for slug, data in rows.items()],
+                update_conflicts=True,
+                unique_fields=['slug'],
+                update_fields=[*columns, 'updated_at']
+            )
+        ids = dict(Product.objects.filter(slug__in=valid).values_list('slug', 'pk'))
+        unindexed = [ids[product.slug] for product in products if product.pk is None]
+        if unindexed:
+            Product.objects.filter(pk__in=unindexed).update_search_vector()
+
+        Membership = Product.category.through
+        affected = set(
+            Membership.objects.filter(product_id__in=ids.values()).values_list('category_id', flat=True)
+        )
+        assigned = [ids[slug] for slug, (_, data) in valid.items() if 'categories' in data]
+        links = [
+            Membership(product_id=ids[slug], category_id=categories[category].pk)
+            for slug, (_, data) in valid.items()
+            for category in dict.fromkeys(data.get('categories', ()))
+        ]
+        Membership.objects.filter(product_id__in=assigned).delete()
+        Membership.objects.bulk_create(links)
+        affected.update(link.category_id for link in links)
+        Category.objects.filter(pk__in=affected).refresh_product_counts()
+        invalidate_products(valid)
+
+        self.created += len(valid) - existing
+        self.updated += existing
@@ -0,0 +1,233 @@
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Max, Min, Q
+from django.utils import timezone
+
+from users.models import User
+
+from .models import Job, Order
+
+logger = logging.getLogger(__name__)
+
+# Number of due jobs a worker claims per transaction.
+BATCH_SIZE = 100
+# A job that failed this many times is marked failed and no longer retried.
+MAX_ATTEMPTS = 5
+# Seconds before the first retry, doubled for every further failure up to MAX_RETRY_DELAY.
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """
+    Registers the decorated function as the handler of the jobs of `kind`.
+
+    Handlers are called with the payloads of every due job of their kind in a batch, so they can do the
+    work of many jobs in a few queries. Their database writes commit together with the jobs being marked
+    done; any other side effect may be repeated if that commit fails.
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+def enqueue(kind, payload=None, run_at=None):
+    """
+    Adds a job of `kind` to the queue, due at `run_at` (now by default), and returns it.
+
+    Call it inside the transaction of the change that needs the job, so the job only exists if the
+    change was committed.
+    """
+    return Job.objects.create(kind=kind, payload=payload or {}, run_at=run_at or timezone.now())
+
+
+def enqueue_many(jobs):
+    """
+    Adds the jobs given as `(kind, payload)` pairs to the queue, due now, with one INSERT.
+    """
+    now = timezone.now()
+    return Job.objects.bulk_create(
+        Job(kind=kind, payload=payload, run_at=now, created_at=now) for kind, payload in jobs
+    )
+
+
+def retry_delay(attempts):
+    """
+    Returns how long a job that failed `attempts` times waits before it is run again.
+    """
+    return timedelta(seconds=min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY))
+
+
+def _handle(kind, jobs):
+    """
+    Runs the handler of `kind` for `jobs` in a savepoint, splitting a failed batch into single jobs so one
+    bad payload only holds back its own job. Returns the `(done, failed)` jobs, failed ones paired with
+    their error.
+    """
+    try:
+        if kind not in HANDLERS:
+            raise LookupError(f'No handler registered for {kind!r}.')
+        with transaction.atomic():
+            HANDLERS[kind]([job.payload for job in jobs])
+    except Exception as error:
+        if len(jobs) == 1:
+            logger.warning('Job %s (%s) failed', jobs[0].pk, kind, exc_info=True)
+            return [], [(jobs[0], error)]
+    else:
+        return jobs, []
+    done, failed = [], []
+    for job in jobs:
+        job_done, job_failed = _handle(kind, [job])
+        done += job_done
+        failed += job_failed
+    return done, failed
+
+
+def run_batch(batch_size=BATCH_SIZE, kinds=None, now=None):
+    """
+    Claims up to `batch_size` due jobs, runs them with one handler call per kind and returns how many ran.
+
+    The jobs are locked with `SELECT ... FOR UPDATE SKIP LOCKED`, so several workers can share the queue
+    without running a job twice, and are marked done with one UPDATE in the same transaction. A failed
+    job is retried after `retry_delay` and marked failed after `MAX_ATTEMPTS` runs.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        jobs = Job.objects.due(now)
+        if kinds:
+            jobs = jobs.filter(kind__in=kinds)
+        jobs = list(jobs.select_for_update(skip_locked=True)[:batch_size])
+        by_kind = defaultdict(list)
+        for job in jobs:
+            by_kind[job.kind].append(job)
+
+        done, failed = [], []
+        for kind, batch in by_kind.items():
+            kind_done, kind_failed = _handle(kind, batch)
+            done += kind_done
+            failed += kind_failed
+
+        finished_at = timezone.now()
+        if done:
+            Job.objects.filter(pk__in=[job.pk for job in done]).update(status='done', finished_at=finished_at)
+        for job, error in failed:
+            job.attempts += 1
+            job.last_error = f'{type(error).__name__}: {error}'
+            if job.attempts >= MAX_ATTEMPTS:
+                job.status, job.finished_at = 'failed', finished_at
+            else:
+                job.run_at = finished_at + retry_delay(job.attempts)
+        if failed:
+            Job.objects.bulk_update(
+                [job for job, _ in failed], ['attempts', 'last_error', 'status', 'finished_at', 'run_at']
+            )
+    return len(jobs)
+
+
+def prune(older_than, now=None):
+    """
+    Deletes the jobs done more than `older_than` ago and returns how many were deleted. Failed jobs are
+    kept for inspection.
+    """
+    cutoff = (now or timezone.now()) - older_than
+    deleted, _ = Job.objects.filter(status='done', finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def stats(window=timedelta(hours=1), now=None):
+    """
+    Returns the queue metrics per job kind, in two aggregate queries:
+
+    - `queued`, `due` and `failed`: the number of jobs waiting, waiting and due, and failed for good.
+    - `oldest_due_seconds`: how long the oldest due job has been waiting to run.
+    - `done`, `avg_latency_ms`, `max_latency_ms`: the jobs done in the last `window`, and the time
+      from their enqueueing to their completion.
+    """
+    now = now or timezone.now()
+    kinds = defaultdict(lambda: {
+        'queued': 0,
+        'due': 0,
+        'failed': 0,
+        'oldest_due_seconds': None,
+        'done': 0,
+        'avg_latency_ms': None,
+        'max_latency_ms': None,
+    })
+
+    due = Q(status='queued', run_at__lte=now)
+    pending = Job.objects.filter(status__in=['queued', 'failed']).values('kind').annotate(
+        queued=Count('id', filter=Q(status='queued')),
+        due=Count('id', filter=due),
+        failed=Count('id', filter=Q(status='failed')),
+        oldest_due=Min('run_at', filter=due),
+    ).order_by()
+    for row in pending:
+        oldest_due = row.pop('oldest_due')
+        kinds[row.pop('kind')].update(
+            row, oldest_due_seconds=round((now - oldest_due).total_seconds(), 3) if oldest_due else None
+        )
+
+    latency = ExpressionWrapper(F('finished_at') - F('created_at'), output_field=DurationField())
+    finished = Job.objects.filter(status='done', finished_at__gt=now - window).values('kind').annotate(
+        done=Count('id'),
+        avg_latency=Avg(latency),
+        max_latency=Max(latency),
+    ).order_by()
+    for row in finished:
+        kinds[row['kind']].update(
+            done=row['done'],
+            avg_latency_ms=round(row['avg_latency'].total_seconds() * 1000, 3),
+            max_latency_ms=round(row['max_latency'].total_seconds() * 1000, 3),
+        )
+    return dict(sorted(kinds.items()))
+
+
+@handler('last_purchase_date')
+def update_last_purchase_dates(payloads):
+    """
+    Sets `User.last_purchase_date` from `{'user': id, 'date': 'YYYY-MM-DD'}` payloads with one UPDATE per
+    purchase day rather than one per order, never moving a date back.
+    """
+    latest = {}
+    for payload in payloads:
+        latest[payload['user']] = max(latest.get(payload['user'], payload['date']), payload['date'])
+    users_by_day = defaultdict(list)
+    for user_id, day in latest.items():
+        users_by_day[day].append(user_id)
+    for day, user_ids in users_by_day.items():
+        User.objects.filter(
+            Q(last_purchase_date__isnull=True) | Q(last_purchase_date__lt=day),
+            pk__in=user_ids
+        ).update(last_purchase_date=day)
+
+
+@handler('order_confirmation')
+def send_order_confirmations(payloads):
+    """
+    Emails the confirmation of the orders of `{'order': id}` payloads, loaded with their users in one
+    query and sent over one mail server connection.
+    """
+    orders = Order.objects.filter(pk__in=[payload['order'] for payload in payloads]).select_related('user').only(
+        'cost', 'items_quantity', 'user__username', 'user__email'
+    ).order_by('pk')
+    messages = [
+        EmailMessage(
+            subject=f'Your order #{order.pk}',
+            body=(
+                f'Hi {order.user.username},\n\n'
+                f'Thank you for your order #{order.pk} of {order.items_quantity} item(s) for {order.cost}.\n'
+                'We will let you know when it ships.\n'
+            ),
+            to=[order.user.email]
+        )
+        for order in orders if order.user.email
+    ]
+    if messages:
+        get_connection().send_messages(messages)
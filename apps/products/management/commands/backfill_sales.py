@@ -0,0 +1,150 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from products.export import filter_orders
+from products.models import DailyCategorySales, DailyProductSales, Order, OrderItem, Product
+from products.models.sales import SALES_STATUSES
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds the daily sales rollups from the order history, optionally for a range of days. '
+        'History is processed in chunks of whole days, each in its own transaction: the rollups of a chunk '
+        'are aggregated by the database with one GROUP BY query each and replace the stored ones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='First day to rebuild (YYYY-MM-DD).'
+        )
+        parser.add_argument(
+            '--until',
+            type=date.fromisoformat,
+            help='Last day to rebuild (YYYY-MM-DD).'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of orders rolled up per transaction, rounded up to whole days.'
+        )
+
+    def handle(self, *args, since, until, chunk_size, **options):
+        if since and until and since > until:
+            raise CommandError('--since must not be later than --until.')
+
+        started = time.perf_counter()
+        orders = filter_orders(Order.objects.filter(status__in=SALES_STATUSES), since=since, until=until)
+        count = rows = chunks = 0
+        # First day whose rollups are still to be replaced; None while the range is open-ended.
+        start = since
+        for first, last, chunk_orders in self.chunks(orders, chunk_size):
+            # The rollups of the chunk, and of the days without sales since the previous chunk, are replaced
+            # in the chunk's transaction, so the report never misses history, even if the run stops midway.
+            with transaction.atomic():
+                self.clear(start, last)
+                rows += self.roll_up(filter_orders(orders, since=first, until=last), chunk_size)
+            start = last + timedelta(days=1)
+            count += chunk_orders
+            chunks += 1
+        with transaction.atomic():
+            self.clear(start, until)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rolled up {count} order(s) in {chunks} chunk(s) into {rows} row(s) in {elapsed:.1f}s.'
+        ))
+
+    def clear(self, first, last):
+        days = {}
+        if first:
+            days['day__gte'] = first
+        if last:
+            days['day__lte'] = last
+        DailyProductSales.objects.filter(**days).delete()
+        DailyCategorySales.objects.filter(**days).delete()
+
+    def chunks(self, orders, chunk_size):
+        """
+        Yields `(first_day, last_day, orders)` ranges of consecutive days holding about `chunk_size` orders.
+
+        Chunks never split a day, so every rollup row is complete within its chunk.
+        """
+        per_day = (
+            orders.annotate(day=TruncDate('order_date'))
+            .values('day')
+            .annotate(total=Count('id'))
+            .order_by('day')
+            .values_list('day', 'total')
+        )
+        first = last = None
+        total = 0
+        # One row per day, read up front so no cursor stays open across the chunk transactions.
+        for day, day_total in list(per_day):
+            if first is not None and total + day_total > chunk_size:
+                yield first, last, total
+                first, total = None, 0
+            if first is None:
+                first = day
+            last = day
+            total += day_total
+        if first is not None:
+            yield first, last, total
+
+    def roll_up(self, orders, chunk_size):
+        # Same grouping as `OrderQuerySet.record_sales`: every item counts once for its product and once
+        # for each category of its product, and orders are counted once per product or category.
+        products = (
+            OrderItem.objects
+            .filter(order__in=orders.values('pk'))
+            .values('product_id', day=TruncDate('order__order_date'))
+            .annotate(
+                total_quantity=Sum('quantity'),
+                total_revenue=Sum(F('quantity') * F('price')),
+                total_orders=Count('order_id', distinct=True)
+            )
+            .order_by()
+        )
+        categories = (
+            Product.category.through.objects
+            .filter(product__orderitem__order__in=orders.values('pk'))
+            .values('category_id', day=TruncDate('product__orderitem__order__order_date'))
+            .annotate(
+                total_quantity=Sum('product__orderitem__quantity'),
+                total_revenue=Sum(F('product__orderitem__quantity') * F('product__orderitem__price')),
+                total_orders=Count('product__orderitem__order_id', distinct=True)
+            )
+            .order_by()
+        )
+        return (
+            self.insert(DailyProductSales, products, chunk_size)
+            + self.insert(DailyCategorySales, categories, chunk_size)
+        )
+
+    def insert(self, model, rows, chunk_size):
+        # A row that a status change recorded after the chunk was cleared is replaced by the chunk's aggregate
+        # instead of failing the insert.
+        key = model.rollup_key
+        return len(model.objects.bulk_create(
+            [
+                model(
+                    day=row['day'],
+                    quantity=row['total_quantity'],
+                    revenue=row['total_revenue'],
+                    orders=row['total_orders'],
+                    **{key: row[key]}
+                )
+                for row in rows
+            ],
+            batch_size=chunk_size,
+            update_conflicts=True,
+            unique_fields=['day', key],
+            update_fields=['quantity', 'revenue', 'orders']
+        ))
@@ -0,0 +1,207 @@
+import json
+import statistics
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from products.checkout import place_order
+from products.fast_serializers import order_values
+from products.models import Category, Order, Product, Review
+from products.seeding import VOLUMES, seed_all
+from products.serializers import OrderSerializer
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds configurable volumes of users, categories, products, reviews and orders, then times and counts '
+        'the queries of the catalog, order history, checkout and review scenarios. Everything runs in a '
+        'transaction that is rolled back afterwards. Results can be written as JSON and compared with an '
+        'earlier run, failing when a scenario got slower than the threshold or runs more queries.'
+    )
+
+    def add_arguments(self, parser):
+        for kind, count in VOLUMES.items():
+            parser.add_argument(
+                f'--{kind}',
+                type=int,
+                default=count,
+                help=f'Number of {kind} to seed.'
+            )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed of the seeded data.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per scenario; the median is compared.'
+        )
+        parser.add_argument(
+            '--scenario',
+            dest='scenarios',
+            action='append',
+            help='Only run this scenario; may be repeated.'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write the results to, as JSON.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON results of an earlier run to compare with.'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=20,
+            help='Slowdown of the median, in percent, reported as a regression.'
+        )
+
+    def handle(self, *args, seed, repeat, scenarios, output, compare, threshold, **options):
+        volumes = {kind: options[kind] for kind in VOLUMES}
+        baseline = self.load(compare) if compare else None
+        try:
+            # The test client's host is not in ALLOWED_HOSTS outside of tests.
+            with transaction.atomic(), override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                started = time.perf_counter()
+                seed_all(volumes, prefix='benchmark', seed=seed)
+                self.stdout.write(f'Seeded {volumes} in {time.perf_counter() - started:.1f}s.')
+                available = self.scenarios()
+                unknown = set(scenarios or ()) - available.keys()
+                if unknown:
+                    raise CommandError(f'Unknown scenario(s): {", ".join(sorted(unknown))}.')
+                results = {
+                    name: self.measure(function, repeat)
+                    for name, function in available.items()
+                    if not scenarios or name in scenarios
+                }
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'volumes': volumes,
+            'seed': seed,
+            'repeat': repeat,
+            'results': results,
+        }
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, indent=2)
+
+        if baseline and (baseline['volumes'], baseline['database']) != (volumes, connection.vendor):
+            self.stderr.write(self.style.WARNING(
+                f'Comparing with a run on {baseline["database"]} with {baseline["volumes"]}; '
+                'timings may not be comparable.'
+            ))
+        regressions = self.show(results, baseline and baseline['results'], threshold)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regression(s): {", ".join(regressions)}.')
+
+    def load(self, path):
+        try:
+            with open(path, encoding='utf-8') as stream:
+                return json.load(stream)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Cannot read {path}: {error}')
+
+    def scenarios(self):
+        """
+        Returns `{name: function}` for every scenario, run against the seeded data.
+        """
+        anonymous = Client()
+        customer = Client()
+        busiest = User.objects.filter(username__startswith='benchmark-user-').annotate(
+            orders=Count('order')
+        ).order_by('-orders', 'pk').first()
+        customer.force_login(busiest)
+        root = Category.objects.filter(slug__startswith='benchmark-category-', depth=0).order_by('pk').first()
+        stocked = list(
+            Product.objects.filter(slug__startswith='benchmark-product-', status='active')
+            .order_by('-stock', 'pk').values_list('pk', flat=True)[:5]
+        )
+        reviewed = iter(Product.objects.filter(slug__startswith='benchmark-product-').order_by('pk'))
+        renderer = JSONRenderer()
+
+        def get(client, name, **params):
+            response = client.get(reverse(name), params)
+            if response.status_code != 200:
+                raise CommandError(f'{name} answered {response.status_code}.')
+            return response
+
+        return {
+            'catalog_list': lambda: get(anonymous, 'product-list', page_size=100),
+            'catalog_filtered': lambda: get(
+                anonymous, 'product-list', category=root.slug, min_price=10, max_price=100, page_size=100
+            ),
+            'catalog_price_range': lambda: get(
+                anonymous, 'product-list', min_price=20, max_price=40, ordering='effective_price', page_size=100
+            ),
+            'catalog_top_rated': lambda: get(anonymous, 'product-list', ordering='-rating_avg', page_size=100),
+            'order_history': lambda: get(customer, 'order-list', page_size=100),
+            'order_serialization_drf': lambda: renderer.render(
+                OrderSerializer(Order.objects.with_details()[:200], many=True).data
+            ),
+            'order_serialization_values': lambda: renderer.render(
+                order_values.serialize(Order.objects.all()[:200])
+            ),
+            'checkout': lambda: place_order(busiest, 'Benchmark street 1', [(pk, 1) for pk in stocked]),
+            'review_write': lambda: Review.objects.create(
+                product=next(reviewed), user=busiest, rating=4, text='Fine.'
+            ),
+            'rating_rebuild': lambda: call_command('rebuild_ratings', stdout=StringIO()),
+        }
+
+    def measure(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - started)
+        return {
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'min_ms': round(min(timings) * 1000, 3),
+            'queries': len(queries),
+        }
+
+    def show(self, results, baseline, threshold):
+        """
+        Prints the results, with the change from `baseline` when given, and returns the regressed scenarios.
+        """
+        regressions = []
+        for name, result in results.items():
+            line = (
+                f'{name:<28} {result["median_ms"]:>10.2f} ms  {result["min_ms"]:>10.2f} ms min  '
+                f'{result["queries"]:>5} queries'
+            )
+            previous = (baseline or {}).get(name)
+            if previous:
+                change = (result['median_ms'] / previous['median_ms'] - 1) * 100 if previous['median_ms'] else 0
+                line += f'  {change:>+7.1f}% ({previous["queries"]} queries before)'
+                if change > threshold or result['queries'] > previous['queries']:
+                    regressions.append(name)
+                    self.stdout.write(self.style.ERROR(line))
+                    continue
+            self.stdout.write(line)
+        return regressions
@@ -0,0 +1,115 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from products.fast_serializers import order_values, product_values
+from products.models import Category, Order, OrderItem, Product
+from products.serializers import OrderSerializer, ProductSerializer
+from users.models import User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the throughput of the DRF serializers and their compiled `.values()` counterparts. '
+        'Seeds its own rows inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[1000, 10000],
+            help='Row counts to benchmark.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement; the fastest one is reported.'
+        )
+
+    def handle(self, *args, rows, repeat, **options):
+        try:
+            with transaction.atomic():
+                self.seed(max(rows))
+                for count in rows:
+                    self.compare(
+                        f'products x{count}',
+                        lambda: ProductSerializer(
+                            Product.objects.prefetch_related('category').order_by('pk')[:count],
+                            many=True
+                        ).data,
+                        lambda: product_values.serialize(Product.objects.order_by('pk')[:count]),
+                        count,
+                        repeat
+                    )
+                    orders = max(count // 5, 1)
+                    self.compare(
+                        f'orders x{orders} ({orders * 5} items)',
+                        lambda: OrderSerializer(Order.objects.with_details()[:orders], many=True).data,
+                        lambda: order_values.serialize(Order.objects.all()[:orders]),
+                        orders,
+                        repeat
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        user = User.objects.create_user(
+            username='benchmark-serializers',
+            email='benchmark-serializers@example.com'
+        )
+        categories = Category.objects.bulk_create(
+            [Category(name=f'Category {index}', slug=f'benchmark-category-{index}') for index in range(20)]
+        )
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'Product {index}',
+                slug=f'benchmark-product-{index}',
+                image='images/product.jpg',
+                description='Benchmark product',
+                price=Decimal('19.99'),
+                discount=Decimal('2.50') if index % 3 == 0 else None,
+                stock=index % 50
+            )
+            for index in range(count)
+        ])
+        Product.category.through.objects.bulk_create([
+            Product.category.through(product_id=product.pk, category_id=categories[index % 20].pk)
+            for index, product in enumerate(products)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=user, cost=0, address='Benchmark street 1', items_cost=0, items_quantity=0)
+            for _ in range(max(count // 5, 1))
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=products[(index * 5 + line) % count], quantity=1, price=20)
+            for index, order in enumerate(orders)
+            for line in range(5)
+        ])
+
+    def compare(self, label, drf, values, count, repeat):
+        renderer = JSONRenderer()
+        drf_time = self.measure(lambda: renderer.render(drf()), repeat)
+        values_time = self.measure(lambda: renderer.render(values()), repeat)
+        self.stdout.write(
+            f'{label:<32} drf {count / drf_time:>10.0f} rows/s   '
+            f'values {count / values_time:>10.0f} rows/s   x{drf_time / values_time:.1f}'
+        )
+
+    def measure(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
@@ -0,0 +1,72 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.export import CHUNK_SIZE, EXPORT_FORMATS, filter_orders, iter_orders
+from products.models import Order
+from products.models.order import ORDER_STATUS_CHOICES
+
+
+class Command(BaseCommand):
+    help = 'Streams orders with their items as CSV or JSON Lines to a file or standard output.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            dest='export_format',
+            choices=list(EXPORT_FORMATS),
+            default='csv',
+            help='Output format.'
+        )
+        parser.add_argument(
+            '--since',
+            type=date.fromisoformat,
+            help='First order placement date to export (YYYY-MM-DD).'
+        )
+        parser.add_argument(
+            '--until',
+            type=date.fromisoformat,
+            help='Last order placement date to export (YYYY-MM-DD).'
+        )
+        parser.add_argument(
+            '--status',
+            choices=[value for value, _ in ORDER_STATUS_CHOICES],
+            help='Only export orders with this status.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Orders fetched per round trip.'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write to instead of standard output.'
+        )
+
+    def handle(self, *args, export_format, since, until, status, chunk_size, output, **options):
+        if since and until and since > until:
+            raise CommandError('--since must not be later than --until.')
+        orders = filter_orders(Order.objects.all(), since=since, until=until, status=status)
+        render, _ = EXPORT_FORMATS[export_format]
+        self.count = 0
+        chunks = render(self.counted(iter_orders(orders, chunk_size)))
+
+        started = time.perf_counter()
+        if output:
+            with open(output, 'w', newline='', encoding='utf-8') as stream:
+                stream.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+        elapsed = time.perf_counter() - started
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {self.count} order(s) in {elapsed:.1f}s ({self.count / max(elapsed, 1e-9):.0f} orders/s).'
+        ))
+
+    def counted(self, orders):
+        for order in orders:
+            self.count += 1
+            yield order
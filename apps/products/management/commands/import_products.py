@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.imports import CHUNK_SIZE, ProductImporter, read_feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates or updates products from a CSV or JSON Lines feed keyed by slug, streaming the feed '
+        'and writing it in batched upserts, one transaction per chunk.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'feed',
+            help='Path of the feed file.'
+        )
+        parser.add_argument(
+            '--format',
+            dest='feed_format',
+            choices=['csv', 'jsonl'],
+            help='Feed format; guessed from the file extension by default.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Number of rows validated and written per transaction.'
+        )
+        parser.add_argument(
+            '--errors',
+            help='File to write the rejected rows to, as JSON Lines.'
+        )
+
+    def handle(self, *args, feed, feed_format, chunk_size, errors, **options):
+        feed_format = feed_format or ('csv' if feed.endswith('.csv') else 'jsonl')
+        started = time.perf_counter()
+        try:
+            with open(feed, newline='', encoding='utf-8') as stream:
+                importer = ProductImporter(chunk_size).run(read_feed(stream, feed_format))
+        except OSError as error:
+            raise CommandError(f'Cannot read {feed}: {error}')
+        elapsed = time.perf_counter() - started
+
+        for line, message in importer.errors[:20]:
+            self.stderr.write(f'Line {line}: {message}')
+        if len(importer.errors) > 20:
+            self.stderr.write(f'... and {len(importer.errors) - 20} more rejected row(s).')
+        if errors:
+            with open(errors, 'w', encoding='utf-8') as stream:
+                for line, message in importer.errors:
+                    stream.write(json.dumps({'line': line, 'error': message}) + '\n')
+
+        rows = importer.created + importer.updated + len(importer.errors)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {rows} row(s) in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s): '
+            f'{importer.created} created, {importer.updated} updated, {len(importer.errors)} rejected.'
+        ))
@@ -0,0 +1,250 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from products.models import Category, Product
+
+TARGETS = ('wsgi', 'asgi')
+HOST = 'testserver'
+
+
+def percentile(timings, fraction):
+    """
+    Returns the nearest-rank percentile of the sorted `timings`.
+    """
+    return timings[max(round(fraction * len(timings)) - 1, 0)]
+
+
+async def asgi_request(application, path):
+    """
+    Sends a GET for `path` through the ASGI `application` like a server would and returns the response status.
+    """
+    url = urlsplit(path)
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': url.path,
+        'raw_path': url.path.encode(),
+        'query_string': url.query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    received = False
+    response = {}
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; Django cancels its disconnect listener once the response is sent.
+        await asyncio.get_running_loop().create_future()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+
+    await application(scope, receive, send)
+    return response['status']
+
+
+def wsgi_request(application, path):
+    """
+    Sends a GET for `path` through the WSGI `application` like a server would and returns the response status.
+    """
+    url = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': BytesIO(),
+        'wsgi.errors': StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+
+    body = application(environ, start_response)
+    try:
+        for _ in body:
+            pass
+    finally:
+        # Fires request_finished, which closes the thread's database connection like a server would.
+        body.close()
+    return response['status']
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the catalog, product, category and review read endpoints in-process with concurrent clients: '
+        'the sync views through the WSGI application of onlineshop/wsgi.py, one thread per client as in a '
+        'threaded WSGI server, and their async twins through the ASGI application of onlineshop/asgi.py, '
+        'one task per client on a single event loop as in an ASGI server. Reports requests per second and '
+        'latency percentiles per endpoint. Reads the existing data; seed it first, e.g. with seed_data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=20,
+            help='Number of concurrent clients.'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Number of measured requests per endpoint and target.'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=20,
+            help='Number of unmeasured requests per endpoint and target sent first.'
+        )
+        parser.add_argument(
+            '--endpoint',
+            dest='endpoints',
+            action='append',
+            help='Only load-test this endpoint; may be repeated.'
+        )
+        parser.add_argument(
+            '--target',
+            dest='targets',
+            action='append',
+            choices=TARGETS,
+            help='Only load-test this target; may be repeated.'
+        )
+        parser.add_argument(
+            '--output',
+            help='File to write the results to, as JSON.'
+        )
+
+    def handle(self, *args, concurrency, requests, warmup, endpoints, targets, output, **options):
+        available = self.endpoints()
+        unknown = set(endpoints or ()) - available.keys()
+        if unknown:
+            raise CommandError(f'Unknown endpoint(s): {", ".join(sorted(unknown))}.')
+        # Imported here: loading the applications builds their middleware chains from the settings.
+        from onlineshop.asgi import application as asgi_application
+        from onlineshop.wsgi import application as wsgi_application
+        drivers = {
+            'wsgi': lambda paths, count: self.run_wsgi(wsgi_application, paths, count, concurrency),
+            'asgi': lambda paths, count: asyncio.run(self.run_asgi(asgi_application, paths, count, concurrency)),
+        }
+
+        results = {}
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, HOST]):
+            for name, paths in available.items():
+                if endpoints and name not in endpoints:
+                    continue
+                for target in targets or TARGETS:
+                    drivers[target]([paths[target]], warmup)
+                    started = time.perf_counter()
+                    outcomes = drivers[target]([paths[target]], requests)
+                    elapsed = time.perf_counter() - started
+                    results.setdefault(name, {})[target] = self.summarize(outcomes, elapsed)
+                    self.show(name, target, results[name][target])
+
+        if output:
+            with open(output, 'w', encoding='utf-8') as stream:
+                json.dump({'concurrency': concurrency, 'requests': requests, 'results': results}, stream, indent=2)
+
+    def endpoints(self):
+        """
+        Returns `{name: {'wsgi': path, 'asgi': path}}` for the endpoints to load-test, against the most
+        reviewed published product and the largest category.
+        """
+        product = Product.objects.exclude(status='draft').annotate(
+            review_total=Count('reviews')
+        ).order_by('-review_total', 'pk').only('slug').first()
+        category = Category.objects.order_by('-product_count', 'pk').only('slug').first()
+        if product is None or category is None:
+            raise CommandError('There are no products or categories to request; seed some first.')
+        return {
+            'catalog': {
+                'wsgi': reverse('product-list') + '?page_size=24',
+                'asgi': reverse('async-product-list') + '?page_size=24',
+            },
+            'product': {
+                'wsgi': reverse('product-detail', args=[product.slug]),
+                'asgi': reverse('async-product-detail', args=[product.slug]),
+            },
+            'category': {
+                'wsgi': reverse('category-detail', args=[category.slug]),
+                'asgi': reverse('async-category-detail', args=[category.slug]),
+            },
+            'reviews': {
+                'wsgi': reverse('product-reviews', args=[product.slug]),
+                'asgi': reverse('async-product-reviews', args=[product.slug]),
+            },
+        }
+
+    def run_wsgi(self, application, paths, count, concurrency):
+        def timed(index):
+            started = time.perf_counter()
+            status = wsgi_request(application, paths[index % len(paths)])
+            return status, time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(timed, range(count)))
+
+    async def run_asgi(self, application, paths, count, concurrency):
+        pending = iter(range(count))
+        outcomes = []
+
+        async def client():
+            for index in pending:
+                started = time.perf_counter()
+                status = await asgi_request(application, paths[index % len(paths)])
+                outcomes.append((status, time.perf_counter() - started))
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return outcomes
+
+    def summarize(self, outcomes, elapsed):
+        timings = sorted(timing for _, timing in outcomes)
+        return {
+            'requests_per_second': round(len(outcomes) / elapsed, 1) if elapsed else 0,
+            'mean_ms': round(statistics.mean(timings) * 1000, 3) if timings else 0,
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 3) if timings else 0,
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 3) if timings else 0,
+            'errors': sum(1 for status, _ in outcomes if status >= 400),
+        }
+
+    def show(self, name, target, result):
+        line = (
+            f'{name:<10} {target:<5} {result["requests_per_second"]:>9.1f} req/s  '
+            f'p50 {result["p50_ms"]:>8.2f} ms  p99 {result["p99_ms"]:>8.2f} ms'
+        )
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f'{line}  {result["errors"]} error(s)'))
+        else:
+            self.stdout.write(line)
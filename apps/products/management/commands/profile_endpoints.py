@@ -0,0 +1,73 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+from products import profiling
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests API paths in-process with query profiling enabled and reports, per endpoint, the number '
+        'of queries, the time spent in the database, rendering and overall, and repeated (N+1) queries.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='Paths to request, e.g. /api/products/?page_size=100.'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=10,
+            help='Number of requests per path.'
+        )
+        parser.add_argument(
+            '--user',
+            help='Username to make the requests as.'
+        )
+        parser.add_argument(
+            '--json',
+            dest='as_json',
+            action='store_true',
+            help='Print the report as JSON.'
+        )
+
+    def handle(self, *args, paths, repeat, user, as_json, **options):
+        # The test client's host is not in ALLOWED_HOSTS outside of tests.
+        with override_settings(QUERY_PROFILING=True, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            profiling.reset()
+            client = Client()
+            if user:
+                try:
+                    client.force_login(User.objects.get(username=user))
+                except User.DoesNotExist:
+                    raise CommandError(f'Unknown user {user}.')
+            for path in paths:
+                for _ in range(repeat):
+                    response = client.get(path)
+                if response.status_code >= 400:
+                    self.stderr.write(f'{path} answered {response.status_code}.')
+            rows = profiling.report()
+
+        if as_json:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        self.stdout.write(
+            f'{"endpoint":<40} {"requests":>8} {"queries":>8} {"max":>5} {"db ms":>8} '
+            f'{"render ms":>9} {"total ms":>9} {"n+1":>5}'
+        )
+        for row in rows:
+            self.stdout.write(
+                f'{row["endpoint"]:<40} {row["requests"]:>8} {row["avg_queries"]:>8} {row["max_queries"]:>5} '
+                f'{row["avg_db_ms"]:>8.2f} {row["avg_render_ms"]:>9.2f} {row["avg_total_ms"]:>9.2f} '
+                f'{row["duplicate_requests"]:>5}'
+            )
+            for duplicate in row['duplicates']:
+                self.stdout.write(self.style.WARNING(f'    x{duplicate["count"]} {duplicate["sql"]}'))
+
@@ -0,0 +1,88 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import django
+from django.core.management.base import BaseCommand
+
+from products.models import Product
+from products.renditions import render_field, renditions_field, store
+from users.models import User
+
+MODELS = {
+    'product': Product,
+    'user': User,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Regenerates the image renditions of products and user profile pictures, rendering them '
+        'in parallel worker processes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            dest='models',
+            choices=list(MODELS),
+            action='append',
+            help='Only regenerate the renditions of this model; may be repeated. All models by default.'
+        )
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only render images that have no renditions yet.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of worker processes; 0 renders in this process.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Number of images fetched and handed to the workers at a time.'
+        )
+
+    def handle(self, *args, models, missing, workers, chunk_size, **options):
+        started = time.perf_counter()
+        rendered = failed = 0
+        # Workers are spawned rather than forked so they never share the parent's database connections;
+        # they only render files and hand the results back to be stored here.
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        ) if workers else nullcontext()
+        with pool:
+            render_all = pool.map if workers else map
+            for model in [MODELS[name] for name in models or MODELS]:
+                for chunk in self.chunks(model, missing, chunk_size):
+                    results = render_all(render_field, [model._meta.label] * len(chunk), [name for _, name in chunk])
+                    for (pk, name), renditions in zip(chunk, results):
+                        if renditions is None:
+                            failed += 1
+                        else:
+                            store(model, pk, name, renditions)
+                            rendered += 1
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} image(s) in {elapsed:.1f}s ({rendered / max(elapsed, 1e-9):.1f} images/s), '
+            f'{failed} could not be read.'
+        ))
+
+    def chunks(self, model, missing, chunk_size):
+        field = model.RENDITION_FIELD
+        queryset = model._default_manager.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+        if missing:
+            queryset = queryset.filter(**{renditions_field(model): {}})
+        last = 0
+        while chunk := list(queryset.filter(pk__gt=last).order_by('pk').values_list('pk', field)[:chunk_size]):
+            yield chunk
+            last = chunk[-1][0]
@@ -0,0 +1,87 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from products import jobs
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the queued background jobs, e.g. the side effects of placed orders, in batches of the same kind. '
+        'Polls the queue until stopped with SIGINT or SIGTERM, finishing the current batch first; several '
+        'workers can run side by side.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=jobs.BATCH_SIZE,
+            help='Number of jobs claimed per transaction.'
+        )
+        parser.add_argument(
+            '--kind',
+            dest='kinds',
+            action='append',
+            help='Only run the jobs of this kind; may be repeated.'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait before polling again when no job is due.'
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is due instead of polling.'
+        )
+        parser.add_argument(
+            '--retention',
+            type=float,
+            default=24.0,
+            help='Hours done jobs are kept before being pruned; 0 keeps them.'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Print the queue metrics per job kind and exit.'
+        )
+
+    def handle(self, *args, batch_size, kinds, sleep, burst, retention, stats, **options):
+        if stats:
+            for kind, metrics in jobs.stats().items():
+                self.stdout.write(f'{kind}: ' + ', '.join(f'{name}={value}' for name, value in metrics.items()))
+            return
+
+        self.stopping = False
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            ran = self.work(batch_size, kinds, sleep, burst, retention)
+        finally:
+            for signum, previous in handlers.items():
+                signal.signal(signum, previous)
+        self.stdout.write(f'Ran {ran} job(s).')
+
+    def work(self, batch_size, kinds, sleep, burst, retention):
+        ran = 0
+        pruned_at = None
+        while not self.stopping:
+            # A long-running worker must not hold on to a connection the database may have dropped.
+            close_old_connections()
+            if retention and (pruned_at is None or time.monotonic() - pruned_at > 60):
+                jobs.prune(timedelta(hours=retention))
+                pruned_at = time.monotonic()
+            count = jobs.run_batch(batch_size, kinds)
+            ran += count
+            if not count:
+                if burst:
+                    break
+                time.sleep(sleep)
+        return ran
+
+    def stop(self, signum, frame):
+        self.stopping = True
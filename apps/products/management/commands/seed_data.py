@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from products.seeding import PASSWORD, VOLUMES, finish, references, seed_categories, seed_chunk
+
+# Kinds seeded one phase after the other; the kinds of a phase only refer to rows of earlier phases.
+PHASES = [
+    ['users'],
+    ['products'],
+    ['reviews', 'orders'],
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates synthetic users, categories, products, reviews and orders for load testing, in chunks '
+        'written with bulk_create by parallel worker processes. Users share one pre-hashed password and '
+        'the data only depends on --seed, --prefix and --chunk-size.'
+    )
+
+    def add_arguments(self, parser):
+        for kind, count in VOLUMES.items():
+            parser.add_argument(
+                f'--{kind}',
+                type=int,
+                default=count,
+                help=f'Number of {kind} to generate.'
+            )
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Prefix of the generated usernames and slugs; must not have been used before.'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed of the generated data.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of worker processes; 0 generates in this process. SQLite always uses 0.'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Number of rows generated per task.'
+        )
+
+    def handle(self, *args, prefix, seed, workers, chunk_size, **options):
+        if workers and connection.vendor == 'sqlite':
+            self.stderr.write(self.style.WARNING('SQLite allows a single writer; generating in this process.'))
+            workers = 0
+        volumes = {kind: options[kind] for kind in VOLUMES}
+        started, today = time.perf_counter(), timezone.localdate()
+        # Workers are spawned rather than forked so they never share the parent's database connections.
+        pool = ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup
+        ) if workers else None
+        common = {'seed': seed, 'password': make_password(PASSWORD)}
+        total = 0
+        try:
+            for phase in PHASES:
+                if phase == ['products']:
+                    common['category_ids'] = seed_categories(prefix, volumes['categories'])
+                references.cache_clear()
+                total += self.run(pool, phase, prefix, volumes, chunk_size, common)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        phase_started = time.perf_counter()
+        finish()
+        call_command('backfill_sales', since=today, stdout=StringIO())
+        self.stdout.write(f'Refreshed counts, ratings and sales rollups in {time.perf_counter() - phase_started:.1f}s.')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {total} row(s) in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s).'
+        ))
+
+    def run(self, pool, kinds, prefix, volumes, chunk_size, common):
+        """
+        Generates every chunk of `kinds`, all submitted to the pool at once, and returns the number of rows written.
+        """
+        started = time.perf_counter()
+        tasks = [
+            (kind, prefix, start, min(start + chunk_size, volumes[kind]))
+            for kind in kinds
+            for start in range(0, volumes[kind], chunk_size)
+        ]
+        if pool is None:
+            results = [seed_chunk(*task, **common) for task in tasks]
+        else:
+            results = [future.result() for future in [pool.submit(seed_chunk, *task, **common) for task in tasks]]
+        rows = sum(results)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{" and ".join(kinds)}: {rows} row(s) in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s).'
+        )
+        return rows
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_low_stock_threshold_order_orderitem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_cost',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items_quantity',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_order_items_cost_order_items_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-created_at', '-id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'price'], name='product_status_price_idx'),
+        ),
+    ]
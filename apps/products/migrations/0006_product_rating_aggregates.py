@@ -0,0 +1,82 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:13
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Round
+
+
+def fill_rating_aggregates(apps, schema_editor):
+    """
+    Fills the new aggregates from the existing reviews with the set-based UPDATE of `rebuild_ratings`,
+    so that deleting a review written before this migration cannot take a count below zero.
+    """
+    Product = apps.get_model('products', 'Product')
+    Review = apps.get_model('products', 'Review')
+
+    def reviews(aggregate, **filters):
+        return Subquery(
+            Review.objects
+            .filter(product=OuterRef('pk'), **filters)
+            .order_by()
+            .values('product')
+            .annotate(value=aggregate)
+            .values('value')
+        )
+
+    values = {
+        f'rating_{rating}_count': Coalesce(reviews(Count('id'), rating=rating), Value(0), output_field=IntegerField())
+        for rating in range(1, 6)
+    }
+    values['rating_count'] = Coalesce(reviews(Count('id')), Value(0), output_field=IntegerField())
+    values['rating_avg'] = Coalesce(Round(reviews(Avg('rating')), 2), Value(0.0))
+    Product.objects.filter(pk__in=Review.objects.values('product')).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=3),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-rating_avg', '-rating_count'], name='product_active_rating_idx'),
+        ),
+        migrations.RunPython(fill_rating_aggregates, migrations.RunPython.noop),
+    ]
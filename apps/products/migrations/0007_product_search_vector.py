@@ -0,0 +1,43 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:14
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # GIN indexes and tsvector values only exist on PostgreSQL; other backends search with LIKE.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(
+        search_vector=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        )
+    )
+    schema_editor.execute(
+        'CREATE INDEX product_search_vector_idx ON products_product USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS product_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_paths_and_counts(apps, schema_editor):
+    # Every existing category becomes a top-level category.
+    Category = apps.get_model('products', 'Category')
+    Membership = apps.get_model('products', 'Product').category.through
+    categories = list(Category.objects.only('pk'))
+    for category in categories:
+        category.path = f'{category.pk:010d}/'
+    Category.objects.bulk_update(categories, ['path'], batch_size=1000)
+    counts = (
+        Membership.objects
+        .filter(category_id=OuterRef('pk'), product__status='active')
+        .order_by()
+        .values('category_id')
+        .annotate(total=Count('*'))
+        .values('total')
+    )
+    Category.objects.update(product_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='products.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['path'], name='category_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(fill_paths_and_counts, migrations.RunPython.noop),
+    ]
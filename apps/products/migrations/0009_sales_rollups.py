@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_category_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.category')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.BigIntegerField(default=0)),
+                ('orders', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('day', 'category'), name='daily_category_sales_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('day', 'product'), name='daily_product_sales_unique'),
+        ),
+    ]
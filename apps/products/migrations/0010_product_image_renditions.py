@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
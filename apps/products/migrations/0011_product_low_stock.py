@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low', 'Low stock'), ('restocked', 'Restocked')], max_length=20)),
+                ('stock', models.PositiveIntegerField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock',
+            field=models.GeneratedField(db_persist=True, expression=models.ExpressionWrapper(models.Q(('stock__lte', models.F('low_stock_threshold'))), output_field=models.BooleanField()), output_field=models.BooleanField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['stock', 'id'], name='product_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockevent',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_events', to='products.product'),
+        ),
+        migrations.AddIndex(
+            model_name='stockevent',
+            index=models.Index(fields=['-created_at', '-id'], name='stock_event_created_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:58
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_carts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_status_price_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.math.Round(django.db.models.functions.comparison.Greatest(django.db.models.expressions.CombinedExpression(models.F('price'), '-', django.db.models.functions.comparison.Coalesce(models.F('discount'), models.Value(Decimal('0')))), models.Value(Decimal('0'))), 2, output_field=models.DecimalField(decimal_places=2, max_digits=10)), output_field=models.DecimalField(decimal_places=2, max_digits=10)),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'effective_price'], name='product_status_eff_price_idx'),
+        ),
+    ]
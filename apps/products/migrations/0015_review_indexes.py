@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_product_effective_price'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'rating', 'id'], name='review_product_rating_idx'),
+        ),
+        # The foreign key index is only dropped once the new indexes, which lead with the product, exist.
+        migrations.AlterField(
+            model_name='review',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reviews', to='products.product'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_review_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['run_at', 'id'], name='job_queued_idx'), models.Index(fields=['status', 'finished_at'], name='job_status_finished_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_active_rating_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['-rating_avg', '-id'], name='product_active_rating_idx'),
+        ),
+    ]
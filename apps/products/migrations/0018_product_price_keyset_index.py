@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_product_rating_keyset_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_status_eff_price_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'effective_price', 'id'], name='product_status_eff_price_idx'),
+        ),
+    ]
@@ -2,11 +2,23 @@ from .category import Category
 from .product import Product
 from .review import Review
 from .order import Order, OrderItem
+from .sales import DailyCategorySales, DailyProductSales
+from .stock import StockEvent
+from .transition import OrderStatusTransition
+from .cart import Cart, CartItem
+from .job import Job
 
 __all__ = [
     'Category',
     'Product',
     'Review',
     'Order',
-    'OrderItem'
+    'OrderItem',
+    'DailyProductSales',
+    'DailyCategorySales',
+    'StockEvent',
+    'OrderStatusTransition',
+    'Cart',
+    'CartItem',
+    'Job'
 ]
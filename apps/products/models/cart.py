@@ -0,0 +1,56 @@
+from django.db import models
+from users.models import User
+from .product import Product
+
+
+class Cart(models.Model):
+    """
+    The persisted copy of a logged-in user's shopping cart.
+
+    The live cart is held in the cache by `products.carts.ShoppingCart`; this copy is written behind it,
+    at most every `PERSIST_EVERY` seconds while the cart changes, and reloaded when the cache lost the cart.
+
+    Attributes:
+        user (models.OneToOneField): The owner of the cart.
+        updated_at (models.DateTimeField): The date and time the cart was last persisted.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='cart'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )
+
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+
+
+class CartItem(models.Model):
+    """
+    A line of a persisted cart.
+
+    Attributes:
+        cart (models.ForeignKey): The cart the line belongs to.
+        product (models.ForeignKey): The product in the cart.
+        quantity (models.PositiveIntegerField): The quantity of the product.
+    """
+    cart = models.ForeignKey(
+        Cart,
+        on_delete=models.CASCADE,
+        related_name='items'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['cart', 'product'],
+                name='cart_item_unique'
+            ),
+        ]
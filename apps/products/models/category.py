@@ -1,20 +1,93 @@
-from django.db import models
-from django.utils.text import slugify
+from functools import partial
+
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat, Substr
+from ..cache import invalidate_categories
+from ..slugs import create_with_slugs
+
+# Width of one zero-padded id segment of `Category.path`; fixed so that paths sort in tree order.
+PATH_SEGMENT_WIDTH = 10
+
+
+class CategoryQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `Category` model.
+
+    Methods:
+        subtree(category): Filters the queryset down to `category` and all of its descendants with one prefix match on `path`.
+        refresh_product_counts(): Recomputes the cached active-product count of every category in the queryset in one UPDATE.
+        as_tree(): Returns the categories of the queryset as nested dictionaries, fetched with one query.
+            - Categories whose parent is not part of the queryset become roots.
+        update(**kwargs): Updates the queryset and drops the cached payloads of every updated category.
+        bulk_create(objs, ...): Gives categories without a slug a unique one derived from their name before inserting them.
+    """
+
+    def subtree(self, category):
+        return self.filter(path__startswith=category.path)
+
+    def refresh_product_counts(self):
+        Membership = self.model.products.through
+        counts = (
+            Membership.objects
+            .filter(category_id=OuterRef('pk'), product__status='active')
+            .order_by()
+            .values('category_id')
+            .annotate(total=Count('*'))
+            .values('total')
+        )
+        return self.update(product_count=Coalesce(Subquery(counts), 0))
+
+    def update(self, **kwargs):
+        slugs = list(self.values_list('slug', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_categories(slugs + ([kwargs['slug']] if 'slug' in kwargs else []))
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        return create_with_slugs(self.model, objs, partial(super().bulk_create, objs, *args, **kwargs))
+
+    def as_tree(self):
+        nodes, roots = {}, []
+        rows = self.order_by('path').values('id', 'name', 'slug', 'parent_id', 'depth', 'product_count')
+        for row in rows:
+            parent = nodes.get(row.pop('parent_id'))
+            node = nodes[row['id']] = {**row, 'children': []}
+            (parent['children'] if parent else roots).append(node)
+        return roots
+
 
 class Category(models.Model):
     """
     Represents a product category in the online shop application.
 
+    Categories form a tree. Every category stores its materialized path, the zero-padded ids of its
+    ancestors and itself (e.g. `0000000001/0000000004/`), so a whole subtree is one prefix query and
+    ordering by `path` yields the tree in depth-first order.
+
     Attributes:
         name (models.CharField): The name of the category, with a maximum length of 200 characters.
         slug (models.SlugField): A unique URL-friendly slug for the category, automatically generated from the category name.
             - The `unique` parameter ensures that each slug is unique across all categories.
             - The `blank` parameter allows the slug field to be left blank, as it will be automatically generated.
+        parent (models.ForeignKey): The parent category, or `None` for a top-level category.
+            - Categories with children cannot be deleted.
+        path (models.CharField): The materialized path of the category, maintained by `save`.
+        depth (models.PositiveIntegerField): The number of ancestors of the category, maintained by `save`.
+        product_count (models.PositiveIntegerField): The cached number of active products directly in the category.
+            - Refreshed whenever products are added to or removed from the category, or change status.
 
     Methods:
         save(self, *args, **kwargs): Overrides the default save method to automatically generate the slug from the category name if it has not been set.
-            - If the `slug` field is empty, it generates a slug using the `slugify` function from `django.utils.text`.
+            - If the `slug` field is empty, it allocates a unique slug from the name with `slugs.create_with_slugs`.
             - Calls the parent class's `save` method to save the updated object.
+            - Recomputes `path` and `depth`, and rewrites the paths of all descendants in one UPDATE when the category moved.
+            - Raises `ValueError` if the category would become its own ancestor.
+            - Drops the cached payload of the category, under its previous slug as well when the slug changed.
+        delete(self, *args, **kwargs): Deletes the category and drops its cached payload.
     """
     name = models.CharField(
         max_length=200
@@ -23,8 +96,67 @@ class Category(models.Model):
         unique=True,
         blank=True
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False
+    )
+    depth = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    product_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+
+    objects = CategoryQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['path'],
+                name='category_path_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_slug = instance.__dict__.get('slug')
+        return instance
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
+        if self.path and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValueError('A category cannot be moved below itself.')
+        old_path, old_depth = self.path, self.depth
+        with transaction.atomic():
+            create_with_slugs(Category, [self], partial(super().save, *args, **kwargs))
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = f'{parent_path}{self.pk:0{PATH_SEGMENT_WIDTH}d}/'
+            self.depth = parent_path.count('/')
+            if self.path != old_path:
+                Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+                if old_path:
+                    self._move_descendants(old_path, old_depth)
+        invalidate_categories({self.slug, getattr(self, '_saved_slug', None) or self.slug})
+        self._saved_slug = self.slug
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_categories([self.slug])
+        return result
+
+    def _move_descendants(self, old_path, old_depth):
+        Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+            path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + (self.depth - old_depth)
+        )
@@ -0,0 +1,83 @@
+from django.db import models
+from django.utils import timezone
+
+JOB_STATUS_CHOICES = [
+    ('queued', 'Queued'),
+    ('done', 'Done'),
+    ('failed', 'Failed')
+]
+
+
+class JobQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `Job` model.
+
+    Methods:
+        due(now=None): Returns the queued jobs whose `run_at` has come, oldest first.
+    """
+
+    def due(self, now=None):
+        return self.filter(status='queued', run_at__lte=now or timezone.now()).order_by('run_at', 'id')
+
+
+class Job(models.Model):
+    """
+    A unit of deferred work, run by the `run_jobs` worker with the handler registered for its kind (see `jobs`).
+
+    Jobs are enqueued in the transaction of the change that calls for them, so they exist exactly when
+    that change was committed, and are run in batches of the same kind.
+
+    Attributes:
+        kind (models.CharField): The name of the handler that runs the job.
+        payload (models.JSONField): The arguments of the job.
+        status (models.CharField): 'queued' until the job ran, then 'done', or 'failed' once it ran out of attempts.
+        attempts (models.PositiveSmallIntegerField): The number of failed runs so far.
+        run_at (models.DateTimeField): When the job is due; pushed back after every failed run.
+        last_error (models.TextField): The error of the last failed run.
+        created_at (models.DateTimeField): The date and time the job was enqueued.
+        finished_at (models.DateTimeField): The date and time the job was done or failed for good.
+            - `finished_at - created_at` is the latency reported by the job stats.
+    """
+    kind = models.CharField(
+        max_length=100
+    )
+    payload = models.JSONField(
+        default=dict
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=JOB_STATUS_CHOICES,
+        default='queued'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now
+    )
+    last_error = models.TextField(
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        default=timezone.now
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True
+    )
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # The worker's scan: only queued jobs are indexed, so done and failed ones cost it nothing.
+            models.Index(
+                fields=['run_at', 'id'],
+                condition=models.Q(status='queued'),
+                name='job_queued_idx'
+            ),
+            models.Index(
+                fields=['status', 'finished_at'],
+                name='job_status_finished_idx'
+            ),
+        ]
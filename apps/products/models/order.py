@@ -1,6 +1,14 @@
-from django.db import models
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import models, transaction
+from django.db.models import F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce, TruncDate
 from users.models import User
 from products.models import Product
+from .category import Category
+from .sales import SALES_STATUSES, DailyCategorySales, DailyProductSales
 
 # Define the choices for the order status
 ORDER_STATUS_CHOICES = [
@@ -10,6 +18,171 @@ ORDER_STATUS_CHOICES = [
     ('delivered', 'Delivered'),
     ('cancelled', 'Cancelled')
 ]
+# The statuses an order may move to from each status; delivered and cancelled orders are final.
+ALLOWED_TRANSITIONS = {
+    'pending': {'processing', 'cancelled'},
+    'processing': {'shipped', 'cancelled'},
+    'shipped': {'delivered'},
+    'delivered': set(),
+    'cancelled': set(),
+}
+# Statuses whose orders still hold the stock reserved at checkout, which cancelling them gives back.
+RESERVING_STATUSES = {'pending', 'processing'}
+
+# The orders whose totals wait for the end of the enclosing `deferred_order_totals` block, if any.
+_pending_totals = ContextVar('pending_totals', default=None)
+
+
+def _item_totals(field):
+    """
+    Returns a correlated subquery summing `field` over the items of the outer order.
+    """
+    return Subquery(
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(field))
+        .values('total')
+    )
+
+
+def refresh_order_totals(order_ids):
+    """
+    Refreshes the stored totals of the orders with `order_ids`, or leaves them to the enclosing
+    `deferred_order_totals` block.
+    """
+    pending = _pending_totals.get()
+    if pending is None:
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+    else:
+        pending.update(order_ids)
+
+
+@contextmanager
+def deferred_order_totals():
+    """
+    Collects the orders whose totals are refreshed inside the block, e.g. by the `post_delete` receiver
+    of every deleted item, and refreshes them with one UPDATE when it ends.
+    """
+    if _pending_totals.get() is not None:
+        yield
+        return
+    pending = set()
+    token = _pending_totals.set(pending)
+    try:
+        yield
+    finally:
+        _pending_totals.reset(token)
+    if pending:
+        Order.objects.filter(pk__in=pending).refresh_totals()
+
+
+class OrderQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `Order` model.
+
+    Methods:
+        with_totals(): Annotates `annotated_total_cost` and `annotated_total_products`, reading the stored
+            totals and falling back to a single SQL aggregate for orders saved before they existed.
+        refresh_totals(): Recomputes the stored totals of every order in the queryset with one UPDATE.
+        with_details(): Loads everything `OrderSerializer` renders (user, items, their products and
+            categories) in a fixed number of queries, however many orders are fetched.
+        record_sales(sign=1): Adds the items of every order in the queryset to the daily sales rollups,
+            or removes them with `sign=-1`, with a fixed number of queries.
+        update(**kwargs): Updates the queryset and moves orders entering or leaving `SALES_STATUSES` in or
+            out of the daily sales rollups.
+        delete(): Removes counted orders from the daily sales rollups and deletes the queryset.
+    """
+
+    def with_totals(self):
+        return self.annotate(
+            annotated_total_cost=Coalesce(
+                'items_cost',
+                _item_totals(F('quantity') * F('price')),
+                0
+            ),
+            annotated_total_products=Coalesce(
+                'items_quantity',
+                _item_totals('quantity'),
+                0
+            )
+        )
+
+    def refresh_totals(self):
+        return self.update(
+            items_cost=Coalesce(_item_totals(F('quantity') * F('price')), 0),
+            items_quantity=Coalesce(_item_totals('quantity'), 0)
+        )
+
+    def with_details(self):
+        items = (
+            OrderItem.objects
+            .select_related('product')
+            .prefetch_related(Prefetch('product__category', queryset=Category.objects.all()))
+        )
+        return (
+            self.with_totals()
+            .select_related('user')
+            .prefetch_related(Prefetch('items', queryset=items))
+        )
+
+    def record_sales(self, sign=1):
+        items = (
+            OrderItem.objects
+            .filter(order__in=self.order_by().values('pk'))
+            .values_list('order_id', TruncDate('order__order_date'), 'product_id', 'quantity', 'price')
+        )
+        products, product_orders = defaultdict(lambda: [0, 0, 0]), defaultdict(set)
+        for order_id, day, product_id, quantity, price in items:
+            products[day, product_id][0] += sign * quantity
+            products[day, product_id][1] += sign * quantity * price
+            product_orders[day, product_id].add(order_id)
+        for key, order_ids in product_orders.items():
+            products[key][2] = sign * len(order_ids)
+
+        memberships = defaultdict(list)
+        links = Product.category.through.objects.filter(
+            product_id__in={product_id for _, product_id in products}
+        ).values_list('product_id', 'category_id')
+        for product_id, category_id in links:
+            memberships[product_id].append(category_id)
+        categories, category_orders = defaultdict(lambda: [0, 0, 0]), defaultdict(set)
+        for (day, product_id), (quantity, revenue, _) in products.items():
+            for category_id in memberships[product_id]:
+                categories[day, category_id][0] += quantity
+                categories[day, category_id][1] += revenue
+                category_orders[day, category_id].update(product_orders[day, product_id])
+        for key, order_ids in category_orders.items():
+            categories[key][2] = sign * len(order_ids)
+
+        DailyProductSales.objects.apply(products)
+        DailyCategorySales.objects.apply(categories)
+
+    def update(self, **kwargs):
+        if 'status' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic():
+            order_ids = list(self.values_list('pk', flat=True))
+            counted = set(self.filter(status__in=SALES_STATUSES).values_list('pk', flat=True))
+            rows = super().update(**kwargs)
+            now_counted = set(
+                Order.objects.filter(pk__in=order_ids, status__in=SALES_STATUSES).values_list('pk', flat=True)
+            )
+            Order.objects.filter(pk__in=counted - now_counted).record_sales(-1)
+            Order.objects.filter(pk__in=now_counted - counted).record_sales()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        with transaction.atomic(), deferred_order_totals():
+            self.filter(status__in=SALES_STATUSES).record_sales(-1)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class Order(models.Model):
     """
@@ -21,13 +194,21 @@ class Order(models.Model):
         cost (models.PositiveIntegerField): The total cost of the order.
         status (models.CharField): The current status of the order, chosen from the `ORDER_STATUS_CHOICES`.
         address (models.TextField): The delivery address for the order.
+        items_cost (models.PositiveIntegerField): The stored sum of `price * quantity` over the order items.
+            - Kept in sync whenever order items are created, changed, deleted or bulk-inserted.
+            - `NULL` for orders saved before the column existed; `OrderQuerySet.with_totals` covers those.
+        items_quantity (models.PositiveIntegerField): The stored sum of `quantity` over the order items.
         created_at (models.DateTimeField): The date and time when the order was created.
         updated_at (models.DateTimeField): The date and time when the order was last updated.
 
     Methods:
         __str__(): Returns a string representation of the order.
-        total_cost: Calculates the total cost of the order.
-        total_products: Calculates the total number of products in the order.
+        total_cost: Returns the total cost of the order, preferring annotated or stored totals over a query.
+        total_products: Returns the total number of products in the order, preferring annotated or stored totals over a query.
+        save(self, *args, **kwargs): Saves the order and moves it in or out of the daily sales rollups when its status
+            enters or leaves `SALES_STATUSES`.
+            - Items of counted orders are treated as final; `backfill_sales` rebuilds the rollups after manual edits.
+        delete(self, *args, **kwargs): Removes the order from the daily sales rollups if it was counted and deletes it.
     """
     user = models.ForeignKey(
         User,
@@ -43,6 +224,16 @@ class Order(models.Model):
         default='pending'
     )
     address = models.TextField()
+    items_cost = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False
+    )
+    items_quantity = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False
+    )
     created_at = models.DateTimeField(
         auto_now_add=True
     )
@@ -50,19 +241,94 @@ class Order(models.Model):
         auto_now=True
     )
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'status' in fields:
+            self._saved_status = self.__dict__.get('status')
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            if self.items_cost is None:
+                self.items_cost = 0
+            if self.items_quantity is None:
+                self.items_quantity = 0
+        was_counted = getattr(self, '_saved_status', None) in SALES_STATUSES
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if was_counted != (self.status in SALES_STATUSES):
+                Order.objects.filter(pk=self.pk).record_sales(-1 if was_counted else 1)
+        self._saved_status = self.status
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(), deferred_order_totals():
+            Order.objects.filter(pk=self.pk, status__in=SALES_STATUSES).record_sales(-1)
+            return super().delete(*args, **kwargs)
+
     @property
     def total_cost(self):
-        return sum(item.quantity * item.price for item in self.items.all())
+        if hasattr(self, 'annotated_total_cost'):
+            return self.annotated_total_cost
+        if self.items_cost is not None:
+            return self.items_cost
+        return self.items.aggregate(total=Sum(F('quantity') * F('price')))['total'] or 0
 
     @property
     def total_products(self):
-        return sum(item.quantity for item in self.items.all())
+        if hasattr(self, 'annotated_total_products'):
+            return self.annotated_total_products
+        if self.items_quantity is not None:
+            return self.items_quantity
+        return self.items.aggregate(total=Sum('quantity'))['total'] or 0
+
+
+class OrderItemQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `OrderItem` model that keeps the stored order totals in sync
+    for bulk writes, which bypass `OrderItem.save`.
+
+    `bulk_create` accepts `refresh_totals=False` for callers that already stored the totals of
+    the orders they are filling. Deleted items, including those removed by cascades, are covered
+    by the `post_delete` receiver in `signals`.
+    """
+
+    def bulk_create(self, objs, *args, refresh_totals=True, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if refresh_totals:
+            Order.objects.filter(pk__in={obj.order_id for obj in objs}).refresh_totals()
+        return objs
+
+    def update(self, **kwargs):
+        order_ids = set(self.values_list('order_id', flat=True))
+        rows = super().update(**kwargs)
+        new_order = kwargs.get('order', kwargs.get('order_id'))
+        if new_order is not None:
+            order_ids.add(getattr(new_order, 'pk', new_order))
+        Order.objects.filter(pk__in=order_ids).refresh_totals()
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        with transaction.atomic(), deferred_order_totals():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
 
 class OrderItem(models.Model):
     """
@@ -76,6 +342,10 @@ class OrderItem(models.Model):
 
     Methods:
         __str__(): Returns a string representation of the order item.
+        save(self, *args, **kwargs): Saves the item and refreshes the stored totals of its order, and of the
+            order it was moved from.
+        delete(self, *args, **kwargs): Deletes the item; the `post_delete` receiver refreshes the stored totals
+            of its order.
     """
     order = models.ForeignKey(
         Order,
@@ -89,5 +359,31 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField()
     price = models.PositiveIntegerField()
 
+    objects = OrderItemQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_order_id = instance.__dict__.get('order_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        order_ids = {self.order_id, getattr(self, '_saved_order_id', None)} - {None}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            refresh_order_totals(order_ids | {self.order_id})
+        self._saved_order_id = self.order_id
+        self._refresh_cached_order()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(), deferred_order_totals():
+            result = super().delete(*args, **kwargs)
+        self._refresh_cached_order()
+        return result
+
+    def _refresh_cached_order(self):
+        if OrderItem.order.is_cached(self):
+            self.order.refresh_from_db(fields=['items_cost', 'items_quantity'])
@@ -1,6 +1,16 @@
-from django.db import models
+from collections import Counter
+from decimal import Decimal
+from functools import partial
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, SearchVectorField
+from django.apps import apps
+from django.db import connections, models
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest, NullIf, Round
 from .category import Category
-from django.utils.text import slugify
+from ..cache import invalidate_products
+from ..renditions import PRODUCT_RENDITIONS, schedule as schedule_renditions
+from ..slugs import create_with_slugs
 
 STATUS_CHOICES = (
     ('active', 'Active'),
@@ -9,6 +19,161 @@ STATUS_CHOICES = (
     ('sold_out', 'Sold out')
 )
 
+RATING_VALUES = range(1, 6)
+
+SEARCH_CONFIG = 'english'
+
+# Weighted document behind `Product.search_vector`: matches in the name rank above matches in the description.
+SEARCH_DOCUMENT = (
+    SearchVector('name', weight='A', config=SEARCH_CONFIG)
+    + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+)
+
+SEARCH_SOURCE_FIELDS = {'name', 'description'}
+
+
+def rating_bucket(rating):
+    """
+    Returns the name of the `Product` histogram field counting reviews with the given rating.
+    """
+    return f'rating_{rating}_count'
+
+
+
+class ProductQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `Product` model.
+
+    Methods:
+        active(): Filters the queryset down to products with the 'active' status.
+        in_category(slug): Filters the queryset down to products in the category with the given slug.
+        price_between(min_price=None, max_price=None): Filters the queryset down to an inclusive price range.
+            - Either bound may be `None` to leave that side of the range open.
+        adjust_stock(quantity): Adds `quantity` (negative to remove) to the stock of every product in the queryset
+            that has enough of it, in one conditional UPDATE, and returns the number of products updated.
+        low_stock(): Filters the queryset down to products whose stock is at or below their threshold, through the
+            generated `low_stock` column and its partial index.
+        record_stock_changes(deltas): Logs a `StockEvent` for every product whose stock crossed its low-stock threshold
+            through the `{product_id: applied change}` in `deltas`, reading the products of the queryset once.
+        record_ratings(added=(), removed=()): Adds and removes review ratings to and from the rating aggregates of every
+            product in the queryset, in one UPDATE.
+            - The histogram, count and average are all derived from the current column values, so concurrent
+              reviews never overwrite each other.
+        supports_full_text(): Returns `True` when the queryset's database is PostgreSQL, which stores search vectors.
+        update_search_vector(): Recomputes the stored search vector of every product in the queryset in one UPDATE.
+            - Does nothing on databases without full-text search.
+        search(terms): Filters the queryset down to products matching `terms`, best match first, annotated with `rank`.
+            - On PostgreSQL this is a web-search style query against the GIN-indexed `search_vector`.
+            - Elsewhere every word must appear in the name or description, and name matches rank higher.
+        update(**kwargs), bulk_create(objs, ...): Keep the stored search vectors current when names or descriptions are written in bulk.
+            - `bulk_create` also gives products without a slug a unique one derived from their name, see `slugs.create_with_slugs`.
+            - `update` also refreshes the cached product counts of the affected categories when `status` changes,
+              and drops the cached payloads of every updated product.
+    """
+
+    def active(self):
+        return self.filter(status='active')
+
+    def in_category(self, slug):
+        return self.filter(category__slug=slug)
+
+    def price_between(self, min_price=None, max_price=None):
+        queryset = self
+        if min_price is not None:
+            queryset = queryset.filter(effective_price__gte=min_price)
+        if max_price is not None:
+            queryset = queryset.filter(effective_price__lte=max_price)
+        return queryset
+
+    def adjust_stock(self, quantity):
+        # Stock writes skip the reads of `update` and read the slugs to invalidate after the UPDATE, through
+        # the queryset without the stock condition: under concurrent reservations, a read before the UPDATE
+        # makes SQLite upgrade a shared lock to a write lock, which fails at once.
+        rows = super(ProductQuerySet, self.filter(stock__gte=max(-quantity, 0))).update(stock=F('stock') + quantity)
+        if rows:
+            invalidate_products(self.values_list('slug', flat=True))
+        return rows
+
+    def low_stock(self):
+        return self.filter(low_stock=True)
+
+    def record_stock_changes(self, deltas):
+        rows = self.filter(pk__in=list(deltas)).values_list('pk', 'stock', 'low_stock_threshold')
+        return apps.get_model('products', 'StockEvent').objects.record_crossings(
+            (product_id, stock - deltas[product_id], stock, threshold) for product_id, stock, threshold in rows
+        )
+
+    def supports_full_text(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def update_search_vector(self):
+        if not self.supports_full_text():
+            return 0
+        return super().update(search_vector=SEARCH_DOCUMENT)
+
+    def search(self, terms):
+        if self.supports_full_text():
+            query = SearchQuery(terms, search_type='websearch', config=SEARCH_CONFIG)
+            return (
+                self.filter(search_vector=query)
+                .annotate(rank=SearchRank(F('search_vector'), query))
+                .order_by('-rank', '-id')
+            )
+        words = terms.split()
+        queryset = self
+        for word in words:
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        rank = sum(
+            Case(
+                When(name__icontains=word, then=Value(1.0)),
+                default=Value(0.4),
+                output_field=FloatField()
+            )
+            for word in words
+        )
+        return queryset.annotate(rank=rank or Value(0.0)).order_by('-rank', '-id')
+
+    def update(self, **kwargs):
+        targets = list(self.values_list('pk', 'slug'))
+        rows = super().update(**kwargs)
+        product_ids = [product_id for product_id, _ in targets]
+        invalidate_products([slug for _, slug in targets] + ([kwargs['slug']] if 'slug' in kwargs else []))
+        if not SEARCH_SOURCE_FIELDS.isdisjoint(kwargs):
+            self.model.objects.filter(pk__in=product_ids).update_search_vector()
+        if 'status' in kwargs:
+            Category.objects.filter(products__in=product_ids).refresh_product_counts()
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        objs = create_with_slugs(self.model, objs, partial(super().bulk_create, objs, *args, **kwargs))
+        product_ids = [obj.pk for obj in objs if obj.pk is not None]
+        if product_ids:
+            self.model.objects.filter(pk__in=product_ids).update_search_vector()
+        return objs
+
+    def record_ratings(self, added=(), removed=()):
+        delta = Counter(added)
+        delta.subtract(removed)
+        buckets = {
+            rating: F(rating_bucket(rating)) + delta[rating] if delta[rating] else F(rating_bucket(rating))
+            for rating in RATING_VALUES
+        }
+        count = sum(delta.values())
+        new_count = F('rating_count') + count if count else F('rating_count')
+        total = sum(rating * buckets[rating] for rating in RATING_VALUES)
+        return self.update(
+            **{rating_bucket(rating): buckets[rating] for rating in RATING_VALUES if delta[rating]},
+            rating_count=new_count,
+            rating_avg=Coalesce(
+                Round(Cast(total, FloatField()) / NullIf(new_count, 0), 2),
+                Value(0.0)
+            )
+        )
+
+
 class Product(models.Model):
     """
     Represents a product in the online shop application.
@@ -28,18 +193,46 @@ class Product(models.Model):
         price (models.DecimalField): The price of the product, with a maximum of 10 digits and up to 2 decimal places.
         discount (models.DecimalField): The discount applied to the product, with a maximum of 10 digits and up to 2 decimal places.
             - The `null` and `blank` parameters allow the discount field to be left empty.
+        effective_price (models.GeneratedField): Stored `price - discount`, never below 0, i.e. what the customer pays;
+            computed by the database on every write, so the catalog filters and sorts on it through an index.
         stock (models.PositiveIntegerField): The current stock level of the product, with a default value of 0.
         low_stock_threshold (models.PositiveIntegerField): The minimum stock level that triggers a low stock alert, with a default value of 5.
+        low_stock (models.GeneratedField): Stored `stock <= low_stock_threshold`, computed by the database on every write.
+        rating_avg (models.DecimalField): The average review rating of the product, 0 while it has no reviews.
+        rating_count (models.PositiveIntegerField): The number of reviews of the product.
+        rating_1_count ... rating_5_count (models.PositiveIntegerField): The review rating histogram of the product.
+            - All rating fields are maintained incrementally by `Review.save` and `Review.delete`, and rebuilt in bulk by the `rebuild_ratings` management command.
+        image_renditions (models.JSONField): The resized copies of `image`, as `{label: {'width', 'height', 'webp', 'jpg'}}`
+            with the sizes of `RENDITION_SIZES`; empty until they have been generated.
+            - Regenerated in the background whenever the image changes, and in bulk by the `regenerate_renditions` command.
+        search_vector (SearchVectorField): The stored, GIN-indexed full-text document of the name and description.
+            - Only populated on PostgreSQL; kept current by `save` and by bulk writes through `ProductQuerySet`.
         created_at (models.DateTimeField): The date and time when the product was created, automatically set when the product is first saved.
         updated_at (models.DateTimeField): The date and time when the product was last updated, automatically set whenever the product is saved.
 
+    Indexes:
+        - (`created_at`, `id`) descending, backing keyset pagination of the catalog.
+        - The same columns restricted to `status='active'`, so browsing active products never touches other rows.
+        - (`status`, `effective_price`, `id`), backing effective price range filters and sorts within a status.
+        - (`rating_avg`, `id`) descending, restricted to active products, backing rating sorts, their cursor and filters.
+        - (`stock`, `id`) restricted to `low_stock`, backing the low-stock feed without scanning the catalog.
+        - GIN on `search_vector`, created by migration on PostgreSQL only since other backends cannot build it.
+
     Methods:
         save(self, *args, **kwargs): Overrides the default save method to automatically generate the slug from the product name if it has not been set.
-            - If the `slug` field is empty, it generates a slug using the `slugify` function from `django.utils.text`.
+            - If the `slug` field is empty, it allocates a unique slug from the name with `slugs.create_with_slugs`,
+              adding a `-2`, `-3`, ... suffix on collisions and retrying if a concurrent insert takes it first.
             - Calls the parent class's `save` method to save the updated object.
-        update_stock(self, quantity): Updates the stock quantity of the product by the specified `quantity`.
-            - Adds the `quantity` to the current `stock_quantity` and saves the updated product.
-        is_low_stock (property): Returns `True` if the current stock quantity is less than or equal to the `low_stock_threshold`, indicating that the product is in low stock.
+            - Refreshes the stored search vector when the name or description may have changed.
+            - Clears `image_renditions` and schedules their regeneration when the image changed.
+            - Refreshes the cached product counts of the product's categories when its status changed.
+            - Drops the cached payload of the product.
+        delete(self, *args, **kwargs): Deletes the product, refreshes the cached product counts of its former categories and drops its cached payload.
+        update_stock(self, quantity): Updates the stock of the product by the specified `quantity`.
+            - Applies the change with a single conditional UPDATE, so concurrent updates are never lost and stock never goes negative.
+            - Returns `True` if the change was applied and refreshes `stock` from the database.
+            - Logs a `StockEvent` when the change crosses the low-stock threshold.
+        is_low_stock (property): Returns `True` if the current stock is less than or equal to the `low_stock_threshold`, indicating that the product is in low stock.
     """
     category = models.ManyToManyField(
         Category,
@@ -52,6 +245,11 @@ class Product(models.Model):
         upload_to='images'
     )
     description = models.TextField()
+    image_renditions = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False
+    )
     slug = models.SlugField(
         unique=True,
         blank=True
@@ -71,12 +269,64 @@ class Product(models.Model):
         null=True,
         blank=True
     )
+    effective_price = models.GeneratedField(
+        # Rounded so that SQLite, which computes in floating point, stores values that compare exactly.
+        expression=Round(
+            Greatest(F('price') - Coalesce(F('discount'), Value(Decimal(0))), Value(Decimal(0))),
+            2,
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        ),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True
+    )
     stock = models.PositiveIntegerField(
         default=0
     )
     low_stock_threshold = models.PositiveIntegerField(
         default=5
     )
+    low_stock = models.GeneratedField(
+        expression=ExpressionWrapper(
+            Q(stock__lte=F('low_stock_threshold')),
+            output_field=models.BooleanField()
+        ),
+        output_field=models.BooleanField(),
+        db_persist=True
+    )
+    rating_avg = models.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        default=0,
+        editable=False
+    )
+    rating_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_1_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_2_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_3_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_4_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    rating_5_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
     created_at = models.DateTimeField(
         auto_now_add=True
     )
@@ -84,15 +334,84 @@ class Product(models.Model):
         auto_now=True
     )
 
+    objects = ProductQuerySet.as_manager()
+
+    RENDITION_FIELD = 'image'
+    RENDITION_SIZES = PRODUCT_RENDITIONS
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='product_created_idx'
+            ),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(status='active'),
+                name='product_active_created_idx'
+            ),
+            models.Index(
+                fields=['status', 'effective_price', 'id'],
+                name='product_status_eff_price_idx'
+            ),
+            models.Index(
+                fields=['-rating_avg', '-id'],
+                condition=models.Q(status='active'),
+                name='product_active_rating_idx'
+            ),
+            models.Index(
+                fields=['stock', 'id'],
+                condition=models.Q(low_stock=True),
+                name='product_low_stock_idx'
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_status = instance.__dict__.get('status')
+        instance._saved_slug = instance.__dict__.get('slug')
+        instance._saved_image = instance.__dict__.get('image')
+        return instance
+
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.name)
-        super().save(*args, **kwargs)
-    
+        update_fields = kwargs.get('update_fields')
+        image_changed = (
+            (update_fields is None or 'image' in update_fields)
+            and self.image.name != getattr(self, '_saved_image', None)
+        )
+        if image_changed:
+            self.image_renditions = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'image_renditions']
+        create_with_slugs(Product, [self], partial(super().save, *args, **kwargs))
+        if update_fields is None or not SEARCH_SOURCE_FIELDS.isdisjoint(update_fields):
+            Product.objects.filter(pk=self.pk).update_search_vector()
+        if getattr(self, '_saved_status', None) not in (None, self.status):
+            self.category.all().refresh_product_counts()
+        invalidate_products({self.slug, getattr(self, '_saved_slug', None) or self.slug})
+        self._saved_status, self._saved_slug, self._saved_image = self.status, self.slug, self.image.name
+        if image_changed:
+            schedule_renditions(self)
+
+    def delete(self, *args, **kwargs):
+        category_ids = list(self.category.values_list('pk', flat=True))
+        result = super().delete(*args, **kwargs)
+        Category.objects.filter(pk__in=category_ids).refresh_product_counts()
+        invalidate_products([self.slug])
+        return result
+
     def update_stock(self, quantity):
-        self.stock_quantity += quantity
-        self.save()
+        applied = Product.objects.filter(pk=self.pk).adjust_stock(quantity) == 1
+        if applied:
+            Product.objects.record_stock_changes({self.pk: quantity})
+        self.refresh_from_db(fields=['stock'])
+        return applied
 
     @property
     def is_low_stock(self):
-        return self.stock_quantity <= self.low_stock_threshold
\ No newline at end of file
+        return self.stock <= self.low_stock_threshold
+
+    @property
+    def rating_histogram(self):
+        return {rating: getattr(self, rating_bucket(rating)) for rating in RATING_VALUES}
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator, MaxValueValidator
 from .product import Product
 from users.models import User
@@ -9,6 +9,8 @@ class Review(models.Model):
 
     Attributes:
         product (models.ForeignKey): A foreign key to the `Product` model, representing the product being reviewed.
+            - Indexed by the (`product`, `created_at`, `id`) and (`product`, `rating`, `id`) indexes that the
+              per-product review list pages through, instead of an index of its own.
         user (models.ForeignKey): A foreign key to the `User` model, representing the user who left the review.
         rating (models.PositiveIntegerField): The rating given by the user, ranging from 1 to 5 (inclusive).
             - The `verbose_name` parameter sets the human-readable name for this field in the admin interface.
@@ -18,11 +20,18 @@ class Review(models.Model):
             - The `verbose_name` parameter sets the human-readable name for this field in the admin interface.
         created_at (models.DateTimeField): The date and time when the review was created, automatically set when the review is first saved.
         updated_at (models.DateTimeField): The date and time when the review was last updated, automatically set whenever the review is saved.
+
+    Methods:
+        save(self, *args, **kwargs): Saves the review and moves its rating into the aggregates of its product.
+            - Only the difference to the rating and product the review was loaded with is applied, in one UPDATE per affected product.
+        delete(self, *args, **kwargs): Deletes the review; the `post_delete` receiver in `signals` removes its rating
+            from the aggregates of its product, also for reviews deleted in bulk or by cascades.
     """
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
-        related_name='reviews'
+        related_name='reviews',
+        db_index=False
     )
     user = models.ForeignKey(
         User,
@@ -42,3 +51,56 @@ class Review(models.Model):
     updated_at = models.DateTimeField(
         auto_now=True
     )
+
+    class Meta:
+        # Both lead with the product, so they also serve every other lookup of a product's reviews.
+        indexes = [
+            models.Index(
+                fields=['product', 'created_at', 'id'],
+                name='review_product_created_idx'
+            ),
+            models.Index(
+                fields=['product', 'rating', 'id'],
+                name='review_product_rating_idx'
+            ),
+        ]
+
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'product_id' in instance.__dict__ and 'rating' in instance.__dict__:
+            instance._remember_rating()
+        return instance
+
+    def _remember_rating(self):
+        self._saved_rating = (self.product_id, self.rating)
+
+    def _previous_rating(self):
+        if self._state.adding:
+            return None, None
+        if hasattr(self, '_saved_rating'):
+            return self._saved_rating
+        saved = Review.objects.filter(pk=self.pk).values_list('product_id', 'rating').first()
+        return saved or (None, None)
+
+    def save(self, *args, **kwargs):
+        previous_product, previous_rating = self._previous_rating()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if (previous_product, previous_rating) != (self.product_id, self.rating):
+                if previous_product == self.product_id:
+                    Product.objects.filter(pk=self.product_id).record_ratings(
+                        added=[self.rating],
+                        removed=[previous_rating]
+                    )
+                else:
+                    if previous_product is not None:
+                        Product.objects.filter(pk=previous_product).record_ratings(removed=[previous_rating])
+                    Product.objects.filter(pk=self.product_id).record_ratings(added=[self.rating])
+        self._remember_rating()
+
+    def delete(self, *args, **kwargs):
+        # The `post_delete` receiver removes the rating the review was saved with, not any unsaved edit.
+        self._saved_rating = self._previous_rating()
+        return super().delete(*args, **kwargs)
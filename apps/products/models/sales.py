@@ -0,0 +1,124 @@
+from django.db import models, transaction
+from .category import Category
+from .product import Product
+
+# Order statuses whose items count as sales in the daily rollups.
+SALES_STATUSES = {'delivered'}
+
+
+class SalesRollupQuerySet(models.QuerySet):
+    """
+    Custom queryset for the daily sales rollups.
+
+    Methods:
+        apply(deltas): Adds `{(day, key_id): (quantity, revenue, orders)}` deltas to the rollup rows, creating missing
+            rows and deleting rows left without orders, with a fixed number of queries per call.
+            - Existing rows are locked with `select_for_update`, so concurrent status changes add up instead of
+              overwriting each other.
+    """
+
+    def apply(self, deltas):
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+        key = self.model.rollup_key
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(day=day, **{key: target}) for day, target in deltas],
+                ignore_conflicts=True
+            )
+            rows = list(
+                self.select_for_update()
+                .filter(day__in={day for day, _ in deltas}, **{f'{key}__in': {target for _, target in deltas}})
+                .order_by('pk')
+            )
+            changed = []
+            for row in rows:
+                delta = deltas.get((row.day, getattr(row, key)))
+                if delta is not None:
+                    row.quantity += delta[0]
+                    row.revenue += delta[1]
+                    row.orders += delta[2]
+                    changed.append(row)
+            self.bulk_update(changed, ['quantity', 'revenue', 'orders'])
+            self.filter(pk__in=[row.pk for row in changed if row.orders <= 0]).delete()
+
+
+class DailySales(models.Model):
+    """
+    Abstract base of the daily sales rollups: the sales of one day, per `rollup_key`.
+
+    Rows are maintained incrementally by `OrderQuerySet.record_sales` whenever orders enter or leave one of
+    the `SALES_STATUSES`, and rebuilt from the order history by the `backfill_sales` command.
+
+    Attributes:
+        day (models.DateField): The day the orders were placed, in the current timezone.
+        quantity (models.IntegerField): The number of units sold.
+        revenue (models.BigIntegerField): The sum of `price * quantity` over the items sold.
+        orders (models.IntegerField): The number of orders the items belong to.
+    """
+    day = models.DateField()
+    quantity = models.IntegerField(
+        default=0
+    )
+    revenue = models.BigIntegerField(
+        default=0
+    )
+    orders = models.IntegerField(
+        default=0
+    )
+
+    objects = SalesRollupQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+
+class DailyProductSales(DailySales):
+    """
+    The sales of one product on one day.
+
+    Attributes:
+        product (models.ForeignKey): The product sold.
+    """
+    rollup_key = 'product_id'
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'product'],
+                name='daily_product_sales_unique'
+            ),
+        ]
+
+
+class DailyCategorySales(DailySales):
+    """
+    The sales of the products of one category on one day.
+
+    Products in several categories count towards each of them.
+
+    Attributes:
+        category (models.ForeignKey): The category of the products sold.
+    """
+    rollup_key = 'category_id'
+
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'category'],
+                name='daily_category_sales_unique'
+            ),
+        ]
@@ -0,0 +1,66 @@
+from django.db import models
+from .product import Product
+
+STOCK_EVENT_KINDS = [
+    ('low', 'Low stock'),
+    ('restocked', 'Restocked')
+]
+
+
+class StockEventQuerySet(models.QuerySet):
+    """
+    Custom queryset for the `StockEvent` model.
+
+    Methods:
+        record_crossings(changes): Creates, with one INSERT, an event for every `(product_id, stock before, stock after,
+            threshold)` change that crossed the threshold, and returns the created events.
+    """
+
+    def record_crossings(self, changes):
+        events = []
+        for product_id, before, after, threshold in changes:
+            if before > threshold >= after:
+                kind = 'low'
+            elif after > threshold >= before:
+                kind = 'restocked'
+            else:
+                continue
+            events.append(self.model(product_id=product_id, kind=kind, stock=after, threshold=threshold))
+        return self.bulk_create(events) if events else []
+
+
+class StockEvent(models.Model):
+    """
+    Records a product's stock crossing its low-stock threshold, feeding the low-stock alerts of the ops dashboard.
+
+    Attributes:
+        product (models.ForeignKey): The product whose stock changed.
+        kind (models.CharField): 'low' when the stock dropped to or below the threshold, 'restocked' when it rose above it.
+        stock (models.PositiveIntegerField): The stock right after the change.
+        threshold (models.PositiveIntegerField): The product's `low_stock_threshold` at the time.
+        created_at (models.DateTimeField): The date and time of the change.
+    """
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_events'
+    )
+    kind = models.CharField(
+        max_length=20,
+        choices=STOCK_EVENT_KINDS
+    )
+    stock = models.PositiveIntegerField()
+    threshold = models.PositiveIntegerField()
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    objects = StockEventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='stock_event_created_idx'
+            ),
+        ]
@@ -0,0 +1,42 @@
+from django.db import models
+from users.models import User
+from .order import ORDER_STATUS_CHOICES, Order
+
+
+class OrderStatusTransition(models.Model):
+    """
+    One step of the status history of an order, written by `transition_orders` with one INSERT per batch.
+
+    Attributes:
+        order (models.ForeignKey): The order whose status changed.
+        from_status (models.CharField): The status the order left.
+        to_status (models.CharField): The status the order entered.
+        changed_by (models.ForeignKey): The user who made the change, if any.
+        created_at (models.DateTimeField): The date and time of the change.
+    """
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='transitions'
+    )
+    from_status = models.CharField(
+        max_length=20,
+        choices=ORDER_STATUS_CHOICES
+    )
+    to_status = models.CharField(
+        max_length=20,
+        choices=ORDER_STATUS_CHOICES
+    )
+    changed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ['created_at', 'id']
@@ -0,0 +1,179 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderCursorPagination(CursorPagination):
+    """
+    Keyset pagination for order history, following `Order.Meta.ordering`.
+
+    The cursor encodes the last seen `created_at`, so deep pages cost the same as the first one
+    instead of scanning past an OFFSET.
+    """
+    ordering = '-created_at'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class StockEventCursorPagination(CursorPagination):
+    """
+    Keyset pagination for the stock event feed on (`created_at`, `id`), newest first.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class SearchPagination(PageNumberPagination):
+    """
+    Page number pagination for search results, which are ordered by relevance and so cannot use a cursor.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only keyset pagination on (`field`, `id`), for DRF views and, through `apaginate_queryset`,
+    for async views, which DRF paginators do not support.
+
+    Unlike `CursorPagination`, which only seeks on the first ordering field and skips ties with an OFFSET,
+    the cursor holds the full position of the last row served, so every page is read with one query
+    whatever its depth, even when the ordering field has few distinct values. Both fields are ordered in
+    the direction of the requested ordering. Responses have the shape of DRF cursor pages; `previous`
+    is always null.
+
+    Attributes:
+        ordering_fields (tuple): The fields the `ordering` query parameter may name, with or without `-`.
+        ordering (str): The ordering used when the parameter is missing or unknown.
+    """
+    ordering_fields = ()
+    ordering = None
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+
+    def get_ordering(self, request):
+        ordering = request.GET.get(self.ordering_query_param, self.ordering)
+        return ordering if ordering.lstrip('-') in self.ordering_fields else self.ordering
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(page_size, self.max_page_size) if page_size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.GET.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (UnicodeEncodeError, binascii.Error, ValueError, TypeError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(value, (str, int, float)) or not isinstance(pk, int):
+            raise NotFound('Invalid cursor')
+        return value, pk
+
+    def encode_cursor(self, value, pk):
+        # `str` keeps datetimes to the microsecond and decimals exact; lookups parse both back.
+        return base64.urlsafe_b64encode(json.dumps([value, pk], default=str).encode()).decode('ascii')
+
+    def page_rows(self, queryset, request):
+        """
+        Returns `queryset` ordered, filtered past the cursor and cut to one row more than a page.
+        """
+        self.request = request
+        ordering = self.get_ordering(request)
+        self.field, descending = ordering.lstrip('-'), ordering.startswith('-')
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(ordering, '-id' if descending else 'id')
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            after = 'lt' if descending else 'gt'
+            try:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{after}': value}) | Q(**{self.field: value, f'id__{after}': pk})
+                )
+            except ValidationError:
+                raise NotFound('Invalid cursor')
+        return queryset[:self.page_size + 1]
+
+    def cut(self, results):
+        """
+        Returns the page of `results` read by `page_rows` and works out the link to the next one.
+        """
+        self.next = None
+        if len(results) > self.page_size:
+            results = results[:self.page_size]
+            last = results[-1]
+            if isinstance(last, dict):
+                value, pk = last[self.field], last['id']
+            else:
+                value, pk = getattr(last, self.field), last.pk
+            self.next = replace_query_param(
+                self.request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(value, pk)
+            )
+        return results
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.cut(list(self.page_rows(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.cut([row async for row in self.page_rows(queryset, request).aiterator()])
+
+    def get_paginated_data(self, data):
+        return {'next': self.next, 'previous': None, 'results': data}
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+
+class ProductPagination(KeysetPagination):
+    """
+    Keyset pagination for the product catalog, sync and async, newest first by default.
+
+    Rating and price orderings tie on many products, most of all the unrated ones at `rating_avg` 0, so the
+    cursor seeks past ties on the id instead of paging through them with an OFFSET.
+    """
+    ordering_fields = ('created_at', 'rating_avg', 'effective_price')
+    ordering = '-created_at'
+
+
+class ReviewPagination(KeysetPagination):
+    """
+    Keyset pagination for the reviews of a product, newest first by default, following the
+    (`product`, `created_at`, `id`) and (`product`, `rating`, `id`) review indexes.
+    """
+    ordering_fields = ('created_at', 'rating')
+    ordering = '-created_at'
+    page_size = 20
+
+
+class LowStockPagination(KeysetPagination):
+    """
+    Keyset pagination for low-stock products on (`stock`, `id`), emptiest first.
+
+    Follows the partial low-stock index; many products share a stock level, so the cursor seeks past ties
+    on the id instead of paging through them with an OFFSET.
+    """
+    ordering_fields = ('stock',)
+    ordering = 'stock'
+    page_size = 50
+    max_page_size = 200
@@ -0,0 +1,171 @@
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# A statement run this many times by one request is reported as a likely N+1 query.
+DUPLICATE_THRESHOLD = 3
+# Most repeated statements kept per endpoint in the report.
+TOP_DUPLICATES = 5
+
+_lock = threading.Lock()
+_endpoints = {}
+
+
+class RequestProfile:
+    """
+    Database wrapper (see `connection.execute_wrapper`) counting and timing the queries of one request.
+
+    Statements are compared by their SQL with placeholders, so a query repeated with different
+    parameters, the signature of an N+1 loop, counts as a duplicate.
+
+    Attributes:
+        queries (int): The number of statements executed.
+        db_time (float): The seconds spent executing them.
+        render_time (float): The seconds spent rendering the response, e.g. to JSON.
+        statements (Counter): The number of executions of every SQL statement.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count >= DUPLICATE_THRESHOLD}
+
+
+class EndpointStats:
+    """
+    The profiles of every request served by one endpoint, summed up.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.duplicate_requests = 0
+        self.duplicates = Counter()
+
+    def add(self, profile, total_time):
+        self.requests += 1
+        self.queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.db_time += profile.db_time
+        self.render_time += profile.render_time
+        self.total_time += total_time
+        self.max_time = max(self.max_time, total_time)
+        duplicates = profile.duplicates()
+        if duplicates:
+            self.duplicate_requests += 1
+            for sql, count in duplicates.items():
+                self.duplicates[sql] = max(self.duplicates[sql], count)
+
+    def as_dict(self, endpoint):
+        return {
+            'endpoint': endpoint,
+            'requests': self.requests,
+            'avg_queries': round(self.queries / self.requests, 1),
+            'max_queries': self.max_queries,
+            'avg_db_ms': round(self.db_time / self.requests * 1000, 2),
+            'avg_render_ms': round(self.render_time / self.requests * 1000, 2),
+            'avg_total_ms': round(self.total_time / self.requests * 1000, 2),
+            'max_total_ms': round(self.max_time * 1000, 2),
+            'duplicate_requests': self.duplicate_requests,
+            'duplicates': [
+                {'sql': sql, 'count': count} for sql, count in self.duplicates.most_common(TOP_DUPLICATES)
+            ],
+        }
+
+
+def record(endpoint, profile, total_time):
+    with _lock:
+        _endpoints.setdefault(endpoint, EndpointStats()).add(profile, total_time)
+
+
+def report():
+    """
+    Returns the stats of every endpoint profiled by this process, the most time-consuming first.
+    """
+    with _lock:
+        rows = [stats.as_dict(endpoint) for endpoint, stats in _endpoints.items()]
+    return sorted(rows, key=lambda row: (-row['avg_total_ms'] * row['requests'], row['endpoint']))
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+def endpoint_name(request):
+    match = request.resolver_match
+    return f'{request.method} {match.view_name if match is not None else "<unresolved>"}'
+
+
+class QueryProfilingMiddleware:
+    """
+    Profiles every request when the `QUERY_PROFILING` setting is on: SQL statements and time spent in the
+    database, response rendering time and repeated statements, summed up per URL name in this process
+    (see `report`) and sent back in a `Server-Timing` header. Requests repeating a statement
+    `DUPLICATE_THRESHOLD` times or more are logged as likely N+1 queries.
+
+    When the setting is off the middleware removes itself from the chain when it is loaded, so it costs nothing.
+    Queries run while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = request.query_profile = RequestProfile()
+        started = time.perf_counter()
+        # Opens the default connection of this thread so that it is wrapped along with any other open one.
+        connections[DEFAULT_DB_ALIAS]
+        with ExitStack() as stack:
+            for connection in connections.all(initialized_only=True):
+                stack.enter_context(connection.execute_wrapper(profile))
+            response = self.get_response(request)
+        total_time = time.perf_counter() - started
+
+        endpoint = endpoint_name(request)
+        record(endpoint, profile, total_time)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={profile.db_time * 1000:.1f};desc="{profile.queries} queries"',
+            f'render;dur={profile.render_time * 1000:.1f}',
+            f'total;dur={total_time * 1000:.1f}',
+        ])
+        for sql, count in profile.duplicates().items():
+            logger.warning('%s ran the same query %d times: %s', endpoint, count, sql)
+        return response
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.query_profile.render_time += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,171 @@
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes of the renditions generated for each image field; images are scaled down to fit, keeping their aspect ratio.
+PRODUCT_RENDITIONS = {
+    'thumbnail': (200, 200),
+    'medium': (600, 600),
+}
+AVATAR_RENDITIONS = {
+    'small': (64, 64),
+    'medium': (256, 256),
+}
+# Encodings written for every rendition, as `{extension: (Pillow format, save options)}`.
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def rendition_name(name, label, extension):
+    """
+    Returns the storage name of the `label` rendition of the image stored as `name`,
+    e.g. `images/renditions/kettle_png-thumbnail.webp` for `images/kettle.png`.
+    """
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, 'renditions', f"{filename.replace('.', '_')}-{label}.{extension}")
+
+
+def render(storage, name, sizes):
+    """
+    Generates every rendition in `sizes` of the image stored as `name` and saves them to `storage`,
+    replacing earlier ones.
+
+    Returns `{label: {'width': ..., 'height': ..., extension: storage name, ...}}`.
+    """
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # Lets JPEG decoding scale down by a power of two while staying above the largest rendition.
+        image.draft('RGB', max(sizes.values()))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    renditions = {}
+    for label, size in sizes.items():
+        scaled = image.copy()
+        scaled.thumbnail(size, Image.Resampling.LANCZOS)
+        rendition = {'width': scaled.width, 'height': scaled.height}
+        for extension, (image_format, options) in FORMATS.items():
+            encoded = scaled.convert('RGB') if image_format == 'JPEG' else scaled
+            buffer = BytesIO()
+            encoded.save(buffer, image_format, **options)
+            path = rendition_name(name, label, extension)
+            storage.delete(path)
+            rendition[extension] = storage.save(path, ContentFile(buffer.getvalue()))
+        renditions[label] = rendition
+    return renditions
+
+
+def render_field(model_label, name):
+    """
+    Renders the image stored as `name` for the model `model_label`, with the sizes and the image field
+    configured on the model as `RENDITION_SIZES` and `RENDITION_FIELD`. Returns `None` if the image
+    cannot be read.
+
+    Takes plain values so that it can run in worker processes.
+    """
+    model = apps.get_model(model_label)
+    storage = model._meta.get_field(model.RENDITION_FIELD).storage
+    try:
+        return render(storage, name, model.RENDITION_SIZES)
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        logger.warning('Cannot render %s %s: %s', model_label, name, error)
+        return None
+
+
+def renditions_field(model):
+    """
+    Returns the name of the JSON field holding the renditions of the model's image, `<image field>_renditions`.
+    """
+    return f'{model.RENDITION_FIELD}_renditions'
+
+
+def store(model, pk, name, renditions):
+    """
+    Stores `renditions` of the image `name` on the object `pk`, unless its image changed in the meantime.
+    """
+    model._default_manager.filter(pk=pk, **{model.RENDITION_FIELD: name}).update(
+        **{renditions_field(model): renditions}
+    )
+
+
+def generate(model, pk, name):
+    """
+    Renders the image `name` of the object `pk` and stores the result with `store`.
+    Returns the renditions, or `None` if the image cannot be read.
+    """
+    renditions = render_field(model._meta.label, name)
+    if renditions is not None:
+        store(model, pk, name, renditions)
+    return renditions
+
+
+def _generate_in_thread(model, pk, name):
+    try:
+        generate(model, pk, name)
+    except Exception:
+        logger.exception('Cannot store the renditions of %s %s', model._meta.label, pk)
+    finally:
+        connections.close_all()
+
+
+def schedule(instance):
+    """
+    Generates the renditions of the image of `instance` once the current transaction commits, on a pool
+    of `RENDITION_WORKERS` threads so that the request saving the image is not blocked.
+
+    With the `RENDITIONS_SYNC` setting (used by tests) the renditions are generated right away instead.
+    """
+    global _executor
+    model, pk = type(instance), instance.pk
+    name = getattr(instance, model.RENDITION_FIELD).name
+    if not name:
+        return
+    if settings.RENDITIONS_SYNC:
+        renditions = generate(model, pk, name)
+        if renditions is not None:
+            setattr(instance, renditions_field(model), renditions)
+        return
+    if _executor is None:
+        _executor = ThreadPoolExecutor(settings.RENDITION_WORKERS, thread_name_prefix='renditions')
+    transaction.on_commit(lambda: _executor.submit(_generate_in_thread, model, pk, name))
+
+
+class RenditionsField(serializers.ReadOnlyField):
+    """
+    Renders a renditions field of a model serializer, turning the stored names into URLs the way
+    `FileField` does: absolute when the serializer has a request in its context.
+    """
+
+    def bind(self, field_name, parent):
+        super().bind(field_name, parent)
+        model = parent.Meta.model
+        self.storage = model._meta.get_field(model.RENDITION_FIELD).storage
+
+    def to_representation(self, value):
+        return self.represent(value, self.context.get('request'))
+
+    def represent(self, value, request):
+        def url(name):
+            url = self.storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+
+        return {
+            label: {key: url(item) if key in FORMATS else item for key, item in rendition.items()}
+            for label, rendition in value.items()
+        }
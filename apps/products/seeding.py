@@ -0,0 +1,236 @@
+import random
+from decimal import Decimal
+from functools import lru_cache
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+
+from users.models import User
+from .checkout import snapshot_price
+from .models import Category, Order, OrderItem, Product, Review
+
+# Rows seeded of each kind by default, small enough to seed SQLite in a few seconds.
+VOLUMES = {
+    'users': 200,
+    'categories': 20,
+    'products': 2000,
+    'reviews': 5000,
+    'orders': 1000,
+}
+ITEMS_PER_ORDER = 3
+BATCH_SIZE = 1000
+# Password of every seeded user; it is hashed once per run rather than once per user.
+PASSWORD = 'seed-password'
+# Relative frequency of each status among seeded orders.
+ORDER_STATUS_WEIGHTS = {
+    'pending': 10,
+    'processing': 10,
+    'shipped': 15,
+    'delivered': 55,
+    'cancelled': 10,
+}
+
+
+def chunk_random(seed, kind, start):
+    """
+    Returns the random generator of the rows of `kind` starting at `start`, so that a chunk of rows comes
+    out the same whichever worker seeds it and in whatever order.
+    """
+    return random.Random(f'{seed}:{kind}:{start}')
+
+
+def seed_users(prefix, start, stop, password=None):
+    """
+    Creates the users `start` to `stop` (exclusive), sharing one password hash, and returns their ids.
+    """
+    password = password or make_password(PASSWORD)
+    users = User.objects.bulk_create(
+        [
+            User(
+                username=f'{prefix}-user-{index}',
+                email=f'{prefix}-user-{index}@example.com',
+                password=password
+            )
+            for index in range(start, stop)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    return [user.pk for user in users]
+
+
+def seed_categories(prefix, count):
+    """
+    Creates `count` categories, a quarter of them roots and the rest spread below them, and returns their ids.
+    """
+    roots = max(count // 4, 1)
+    categories = []
+    for index in range(count):
+        parent = categories[index % roots] if index >= roots else None
+        categories.append(Category.objects.create(
+            name=f'Category {index}',
+            slug=f'{prefix}-category-{index}',
+            parent=parent
+        ))
+    return [category.pk for category in categories]
+
+
+def seed_products(prefix, start, stop, category_ids, seed=0):
+    """
+    Creates the products `start` to `stop` (exclusive) in one or two random categories each and returns
+    their ids. Category product counts are left to the caller (see `finish`).
+    """
+    rng = chunk_random(seed, 'products', start)
+    products = Product.objects.bulk_create(
+        [
+            Product(
+                name=f'Product {index}',
+                slug=f'{prefix}-product-{index}',
+                image='images/product.jpg',
+                description=f'Seeded product number {index}.',
+                status='active' if rng.random() < 0.9 else 'draft',
+                price=Decimal(rng.randint(100, 20000)) / 100,
+                discount=Decimal(rng.randint(10, 90)) / 100 if rng.random() < 0.25 else None,
+                stock=rng.randint(0, 100)
+            )
+            for index in range(start, stop)
+        ],
+        batch_size=BATCH_SIZE
+    )
+    Membership = Product.category.through
+    Membership.objects.bulk_create(
+        [
+            Membership(product_id=product.pk, category_id=category_id)
+            for product in products
+            for category_id in rng.sample(category_ids, min(rng.randint(1, 2), len(category_ids)))
+        ],
+        batch_size=BATCH_SIZE
+    )
+    return [product.pk for product in products]
+
+
+def seed_reviews(start, stop, user_ids, product_ids, seed=0):
+    """
+    Creates the reviews `start` to `stop` (exclusive), skewed towards 4 and 5 stars. Rating aggregates
+    are left to the caller (see `finish`).
+    """
+    rng = chunk_random(seed, 'reviews', start)
+    Review.objects.bulk_create(
+        [
+            Review(
+                product_id=rng.choice(product_ids),
+                user_id=rng.choice(user_ids),
+                rating=rng.choices([1, 2, 3, 4, 5], [5, 5, 15, 35, 40])[0],
+                text=f'Seeded review number {index}.'
+            )
+            for index in range(start, stop)
+        ],
+        batch_size=BATCH_SIZE
+    )
+
+
+def seed_orders(start, stop, user_ids, prices, seed=0, record_sales=True):
+    """
+    Creates the orders `start` to `stop` (exclusive) with `ITEMS_PER_ORDER` items each, from the
+    `{product_id: whole-unit price}` in `prices`, and adds the delivered ones to the sales rollups
+    unless `record_sales` is false. Returns the number of rows written.
+    """
+    rng = chunk_random(seed, 'orders', start)
+    product_ids = list(prices)
+    statuses, weights = zip(*ORDER_STATUS_WEIGHTS.items())
+    lines = [
+        [
+            (product_id, rng.randint(1, 3))
+            for product_id in rng.sample(product_ids, min(ITEMS_PER_ORDER, len(product_ids)))
+        ]
+        for _ in range(start, stop)
+    ]
+    orders = []
+    for order_lines in lines:
+        cost = sum(prices[product_id] * quantity for product_id, quantity in order_lines)
+        orders.append(Order(
+            user_id=rng.choice(user_ids),
+            address='Seed street 1',
+            status=rng.choices(statuses, weights)[0],
+            cost=cost,
+            items_cost=cost,
+            items_quantity=sum(quantity for _, quantity in order_lines)
+        ))
+    orders = Order.objects.bulk_create(orders, batch_size=BATCH_SIZE)
+    OrderItem.objects.bulk_create(
+        [
+            OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity, price=prices[product_id])
+            for order, order_lines in zip(orders, lines)
+            for product_id, quantity in order_lines
+        ],
+        batch_size=BATCH_SIZE,
+        refresh_totals=False
+    )
+    if record_sales:
+        Order.objects.filter(pk__in=[order.pk for order in orders if order.status == 'delivered']).record_sales()
+    return len(orders) + sum(len(order_lines) for order_lines in lines)
+
+
+def finish():
+    """
+    Brings the denormalized columns bulk seeding skips up to date: category product counts and product ratings.
+    """
+    Category.objects.all().refresh_product_counts()
+    call_command('rebuild_ratings', stdout=StringIO())
+
+
+def seed_prices(prefix):
+    """
+    Returns `{product_id: whole-unit price}` for the products seeded with `prefix`, as order items store them,
+    in slug order: parallel workers insert the chunks in any order, so the ids are not.
+    """
+    products = Product.objects.filter(slug__startswith=f'{prefix}-product-').order_by('slug')
+    products = products.only('effective_price')
+    return {product.pk: snapshot_price(product) for product in products.iterator()}
+
+
+@lru_cache
+def references(prefix):
+    """
+    Returns the user ids, in username order, and the `seed_prices` of the rows seeded with `prefix`, loaded
+    once per process.
+    """
+    users = User.objects.filter(username__startswith=f'{prefix}-user-').order_by('username')
+    user_ids = list(users.values_list('pk', flat=True))
+    return user_ids, seed_prices(prefix)
+
+
+def seed_chunk(kind, prefix, start, stop, seed=0, password=None, category_ids=None):
+    """
+    Seeds the rows `start` to `stop` (exclusive) of `kind` and returns the number of rows written.
+
+    Takes plain values so that it can run in worker processes. Reviews and orders refer to the users and
+    products seeded before them with the same `prefix`, see `references`; orders are not added to the
+    sales rollups, which the caller rebuilds once at the end.
+    """
+    if kind == 'users':
+        return len(seed_users(prefix, start, stop, password))
+    if kind == 'products':
+        return len(seed_products(prefix, start, stop, category_ids, seed))
+    user_ids, prices = references(prefix)
+    if kind == 'reviews':
+        seed_reviews(start, stop, user_ids, list(prices), seed)
+        return stop - start
+    return seed_orders(start, stop, user_ids, prices, seed, record_sales=False)
+
+
+def seed_all(volumes=None, prefix='seed', seed=0):
+    """
+    Seeds `volumes` (by default `VOLUMES`) of users, categories, products, reviews and orders in this process.
+
+    Rows get names and slugs derived from `prefix` and their number, and random values drawn from `seed`,
+    so the same arguments always produce the same data. Returns the ids created, per kind.
+    """
+    volumes = {**VOLUMES, **(volumes or {})}
+    user_ids = seed_users(prefix, 0, volumes['users'])
+    category_ids = seed_categories(prefix, volumes['categories'])
+    product_ids = seed_products(prefix, 0, volumes['products'], category_ids, seed)
+    seed_reviews(0, volumes['reviews'], user_ids, product_ids, seed)
+    seed_orders(0, volumes['orders'], user_ids, seed_prices(prefix), seed)
+    finish()
+    return {'users': user_ids, 'categories': category_ids, 'products': product_ids}
@@ -1,9 +1,16 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
 from rest_framework import serializers
-from models.product import Product
-from models.category import Category
-from models.order import Order, OrderItem
-from models.review import Review
-from users.serializers import UserSerializer
+from .models import Category, Order, OrderItem, Product, Review, StockEvent
+from .models.order import ORDER_STATUS_CHOICES
+from .models.product import STATUS_CHOICES
+from .models.stock import STOCK_EVENT_KINDS
+from .carts import MAX_QUANTITY
+from .renditions import RenditionsField
+from users.serializers import UserSerializer, UserSummarySerializer
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,9 +19,17 @@ class CategorySerializer(serializers.ModelSerializer):
             'id',
             'name',
             'slug',
+            'parent',
+            'depth',
+            'product_count',
         ]
 
 class ProductSerializer(serializers.ModelSerializer):
+    rating_histogram = serializers.ReadOnlyField()
+    image_renditions = RenditionsField()
+    low_stock = serializers.BooleanField(read_only=True)
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
     class Meta:
         model = Product
         fields = [
@@ -22,13 +37,19 @@ class ProductSerializer(serializers.ModelSerializer):
             'category',
             'name',
             'image',
+            'image_renditions',
             'description',
             'slug',
             'status',
             'price',
             'discount',
+            'effective_price',
             'stock',
             'low_stock_threshold',
+            'low_stock',
+            'rating_avg',
+            'rating_count',
+            'rating_histogram',
             'created_at',
             'updated_at',
         ]
@@ -64,6 +85,61 @@ class ProductSerializer(serializers.ModelSerializer):
             return product 
 
 
+class ProductFilterSerializer(serializers.Serializer):
+    """
+    Validates the query parameters accepted by the product catalog.
+
+    Draft products are unpublished, so only staff users, read from the `request` in the context, may
+    list them.
+    """
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, default='active')
+    category = serializers.SlugField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+    min_rating = serializers.DecimalField(
+        max_digits=3,
+        decimal_places=2,
+        min_value=Decimal('0'),
+        max_value=Decimal('5'),
+        required=False
+    )
+
+    def validate_status(self, value):
+        request = self.context.get('request')
+        if value == 'draft' and not (request and request.user.is_staff):
+            raise serializers.ValidationError('Only staff users can list draft products.')
+        return value
+
+    def validate(self, attrs):
+        min_price, max_price = attrs.get('min_price'), attrs.get('max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise serializers.ValidationError('min_price must not be greater than max_price.')
+        return attrs
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    Validates one row of a product feed. Only the columns present in the row are returned, so that
+    columns missing from the feed keep their stored values.
+    """
+    slug = serializers.SlugField(max_length=50, required=False)
+    name = serializers.CharField(max_length=250)
+    description = serializers.CharField(allow_blank=True, required=False)
+    image = serializers.CharField(max_length=100, allow_blank=True, required=False)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0.01'))
+    discount = serializers.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        min_value=Decimal('0'),
+        allow_null=True,
+        required=False
+    )
+    stock = serializers.IntegerField(min_value=0, required=False)
+    low_stock_threshold = serializers.IntegerField(min_value=0, required=False)
+    categories = serializers.ListField(child=serializers.SlugField(), required=False)
+
+
 class OrderItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
 
@@ -76,6 +152,109 @@ class OrderItemSerializer(serializers.ModelSerializer):
             'price'
             ]
 
+class ProductSearchSerializer(ProductFilterSerializer):
+    """
+    Validates the query parameters accepted by product search: the catalog filters plus the search terms.
+    """
+    q = serializers.CharField(max_length=200)
+
+
+class CheckoutLineSerializer(serializers.Serializer):
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """
+    Validates an order submitted for checkout: a delivery address and the ordered lines.
+    """
+    address = serializers.CharField()
+    items = CheckoutLineSerializer(many=True, allow_empty=False)
+
+
+class CartLineSerializer(serializers.Serializer):
+    """
+    Validates a change to a cart line: the product and its new quantity, 0 removing it.
+    """
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_QUANTITY)
+
+
+class CartCheckoutSerializer(serializers.Serializer):
+    """
+    Validates the checkout of a cart: the delivery address.
+    """
+    address = serializers.CharField()
+
+
+class OrderExportSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the order export: output format, placement date range and status.
+    """
+    output = serializers.ChoiceField(choices=['csv', 'jsonl'], default='csv')
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    status = serializers.ChoiceField(choices=ORDER_STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        since, until = attrs.get('since'), attrs.get('until')
+        if since is not None and until is not None and since > until:
+            raise serializers.ValidationError('since must not be later than until.')
+        return attrs
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    """
+    Validates a batch status change: the ids of the orders and the status they move to.
+    """
+    orders = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=10000
+    )
+    status = serializers.ChoiceField(choices=ORDER_STATUS_CHOICES)
+
+
+class SalesReportSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the sales report: day range, grouping and number of rows.
+    """
+    since = serializers.DateField(required=False)
+    until = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=['day', 'product', 'category'], default='day')
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+    def validate(self, attrs):
+        attrs.setdefault('until', timezone.localdate())
+        attrs.setdefault('since', attrs['until'] - timedelta(days=29))
+        if attrs['since'] > attrs['until']:
+            raise serializers.ValidationError('since must not be later than until.')
+        return attrs
+
+
+class StockEventFilterSerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the stock event feed.
+    """
+    kind = serializers.ChoiceField(choices=STOCK_EVENT_KINDS, required=False)
+
+
+class StockEventSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = StockEvent
+        fields = [
+            'id',
+            'product',
+            'product_name',
+            'kind',
+            'stock',
+            'threshold',
+            'created_at'
+        ]
+
+
 class OrderSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     items = OrderItemSerializer(many=True, read_only=True)
@@ -99,9 +278,12 @@ class OrderSerializer(serializers.ModelSerializer):
             ]
 
 
-class ReviewSerializer(serializers.Serializer):
-    user = UserSerializer(read_only=True)
-    Product = ProductSerializer(read_only=True)
+class ReviewSerializer(serializers.ModelSerializer):
+    """
+    A review with a summary of its author; the product is given by id, as reviews are listed per product.
+    """
+    user = UserSummarySerializer(read_only=True)
+
     class Meta:
         model = Review
         fields = [
@@ -112,4 +294,7 @@ class ReviewSerializer(serializers.Serializer):
             'text',
             'created_at',
             'updated_at'
-            ]
\ No newline at end of file
+            ]
+        read_only_fields = [
+            'product'
+        ]
\ No newline at end of file
@@ -0,0 +1,52 @@
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_products
+from .models import Category, OrderItem, Product, Review
+from .models.order import refresh_order_totals
+
+
+@receiver(m2m_changed, sender=Product.category.through)
+def refresh_category_product_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeps `Category.product_count` current when products are added to or removed from categories,
+    from either side of the relation, and drops the cached payloads of the products involved.
+    """
+    if action == 'pre_clear':
+        # The cleared rows are gone by `post_clear`, so remember what they linked.
+        if reverse:
+            instance._cleared_links = ([instance.pk], list(instance.products.values_list('slug', flat=True)))
+        else:
+            instance._cleared_links = (list(instance.category.values_list('pk', flat=True)), [instance.slug])
+        return
+    if action == 'post_clear':
+        category_ids, product_slugs = getattr(instance, '_cleared_links', ([], []))
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            category_ids = [instance.pk]
+            product_slugs = Product.objects.filter(pk__in=pk_set).values_list('slug', flat=True)
+        else:
+            category_ids, product_slugs = pk_set, [instance.slug]
+    else:
+        return
+    Category.objects.filter(pk__in=category_ids).refresh_product_counts()
+    invalidate_products(product_slugs)
+
+
+@receiver(post_delete, sender=OrderItem)
+def refresh_totals_of_deleted_items(sender, instance, **kwargs):
+    """
+    Keeps the stored totals of an order current when its items are deleted, including by cascades
+    from their product, which bypass `OrderItem.delete`.
+    """
+    refresh_order_totals([instance.order_id])
+
+
+@receiver(post_delete, sender=Review)
+def remove_deleted_review_ratings(sender, instance, **kwargs):
+    """
+    Removes the rating of a deleted review from the aggregates of its product, including for reviews
+    deleted in bulk or by cascades from their user, which bypass `Review.delete`.
+    """
+    product_id, rating = getattr(instance, '_saved_rating', (instance.product_id, instance.rating))
+    Product.objects.filter(pk=product_id).record_ratings(removed=[rating])
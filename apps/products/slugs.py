@@ -0,0 +1,93 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+# Characters kept free at the end of a truncated slug for a `-<number>` suffix.
+SUFFIX_ROOM = 8
+# Distinct slug bases looked up per query.
+LOOKUP_BATCH = 500
+# Times a write is retried with freshly allocated slugs when a concurrent insert took one of them.
+RETRIES = 5
+
+
+def _stem(base, max_length):
+    return base[:max_length - SUFFIX_ROOM].rstrip('-')
+
+
+def _taken(model, bases, max_length):
+    """
+    Returns `{base: (base is taken, highest numeric suffix in use)}` for `bases` with one query per `LOOKUP_BATCH` bases.
+    """
+    bases = list(bases)
+    taken = {base: (False, 1) for base in bases}
+    for start in range(0, len(bases), LOOKUP_BATCH):
+        batch = bases[start:start + LOOKUP_BATCH]
+        stems = {_stem(base, max_length): base for base in batch}
+        condition = Q(slug__in=batch)
+        for stem in stems:
+            condition |= Q(slug__startswith=f'{stem}-')
+        for slug in model._default_manager.filter(condition).values_list('slug', flat=True).iterator():
+            if slug in taken:
+                taken[slug] = (True, taken[slug][1])
+            stem, _, number = slug.rpartition('-')
+            if stem in stems and number.isdigit():
+                base = stems[stem]
+                taken[base] = (taken[base][0], max(taken[base][1], int(number)))
+    return taken
+
+
+def allocate_slugs(model, names, reserved=()):
+    """
+    Returns one unique slug per name in `names` for `model`, in order.
+
+    Names are slugified (falling back to the model name when nothing is left) and truncated to the slug
+    column; colliding slugs get the next free `-2`, `-3`, ... suffix above the highest one in use. Existing
+    slugs are looked up with one prefix query per batch of distinct names, however many names are repeated.
+    Slugs in `reserved` are treated as taken as well. Concurrent allocations may pick the same slug; writers
+    go through `create_with_slugs`, which retries on the resulting conflict.
+    """
+    max_length = model._meta.get_field('slug').max_length
+    bases = [
+        (slugify(name) or model._meta.model_name)[:max_length].rstrip('-') for name in names
+    ]
+    taken = _taken(model, dict.fromkeys(bases), max_length)
+    used = set(reserved)
+    slugs = []
+    for base in bases:
+        is_taken, number = taken[base]
+        slug = base
+        while is_taken or slug in used:
+            number += 1
+            slug = f'{_stem(base, max_length)}-{number}'
+            is_taken = False
+        taken[base] = (True, number)
+        used.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+def create_with_slugs(model, objs, create):
+    """
+    Gives every object of `objs` without a slug a free one derived from its name and calls `create()`.
+
+    `create()` runs in a savepoint; if it fails with an `IntegrityError` while one of the allocated slugs
+    is now in the database, a concurrent insert took it, so slugs are allocated again and `create()` is
+    retried, up to `RETRIES` times. Returns what `create()` returns.
+    """
+    pending = [obj for obj in objs if not obj.slug]
+    if not pending:
+        return create()
+    reserved = {obj.slug for obj in objs if obj.slug}
+    unsaved = [obj for obj in objs if obj.pk is None]
+    for attempt in range(RETRIES):
+        for obj in unsaved:
+            obj.pk, obj._state.adding = None, True
+        slugs = allocate_slugs(model, [obj.name for obj in pending], reserved)
+        for obj, slug in zip(pending, slugs):
+            obj.slug = slug
+        try:
+            with transaction.atomic():
+                return create()
+        except IntegrityError:
+            if attempt == RETRIES - 1 or not model._default_manager.filter(slug__in=slugs).exists():
+                raise
@@ -0,0 +1,153 @@
+from collections import Counter
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+
+from .models import Product, StockEvent
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when one or more lines of a reservation cannot be covered by the current stock.
+
+    Attributes:
+        failed (list): The `(product_id, quantity)` pairs that could not be reserved, ordered by product id.
+    """
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(
+            'Insufficient stock for product(s): '
+            + ', '.join(str(product_id) for product_id, _ in failed)
+        )
+
+
+def merge_lines(lines):
+    """
+    Merges `(product_id, quantity)` pairs into a `{product_id: quantity}` mapping, summing repeated products.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def reserve_stock(product_id, quantity):
+    """
+    Removes `quantity` from the stock of a single product.
+
+    The decrement is one conditional UPDATE (`stock >= quantity`), so concurrent reservations
+    can neither oversell nor overwrite each other. Returns `True` if the stock was reserved, logging a
+    `StockEvent` if the reservation took the product to its low-stock threshold.
+    """
+    reserved = Product.objects.filter(pk=product_id).adjust_stock(-quantity) == 1
+    if reserved:
+        Product.objects.record_stock_changes({product_id: -quantity})
+    return reserved
+
+
+def release_stock(product_id, quantity):
+    """
+    Puts `quantity` back into the stock of a single product, logging a `StockEvent` if it goes back
+    above its low-stock threshold.
+    """
+    if Product.objects.filter(pk=product_id).adjust_stock(quantity):
+        Product.objects.record_stock_changes({product_id: quantity})
+
+
+def reserve_lines(lines):
+    """
+    Reserves stock for every `(product_id, quantity)` line, all or nothing.
+
+    All lines are reserved inside one transaction, one conditional UPDATE per product. Products are
+    always locked in ascending id order, so two checkouts touching the same products cannot deadlock.
+    Every line is attempted so the caller learns about all shortages at once; if any line fails the
+    transaction is rolled back and `InsufficientStock` is raised listing the failed lines.
+    """
+    quantities = merge_lines(lines)
+    with transaction.atomic():
+        failed = [
+            (product_id, quantities[product_id])
+            for product_id in sorted(quantities)
+            if not reserve_stock(product_id, quantities[product_id])
+        ]
+        if failed:
+            raise InsufficientStock(failed)
+
+
+def reserve_lines_bulk(lines):
+    """
+    Reserves stock for every `(product_id, quantity)` line, all or nothing, in a fixed number of queries.
+
+    The products are first locked with `SELECT ... FOR UPDATE` in ascending id order, which both avoids
+    deadlocks and reports every shortage up front; all lines are then decremented by a single UPDATE whose
+    per-product amounts come from a CASE expression. The UPDATE repeats the `stock >= quantity` condition,
+    so backends without row locks still cannot oversell. Raises `InsufficientStock` like `reserve_lines`.
+
+    Threshold crossings are logged as `StockEvent`s from the stock read under the lock, with one INSERT.
+    """
+    quantities = merge_lines(lines)
+    product_ids = sorted(quantities)
+    amount = Case(
+        *[When(pk=product_id, then=Value(quantities[product_id])) for product_id in product_ids],
+        output_field=models.PositiveIntegerField()
+    )
+    with transaction.atomic():
+        locked = list(
+            Product.objects
+            .select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by('pk')
+            .values_list('pk', 'stock', 'low_stock_threshold')
+        )
+        thresholds = {product_id: threshold for product_id, _, threshold in locked}
+        stock = {product_id: stock for product_id, stock, _ in locked}
+        failed = _shortages(quantities, stock)
+        if not failed:
+            updated = (
+                Product.objects
+                .filter(pk__in=product_ids, stock__gte=amount)
+                .update(stock=F('stock') - amount)
+            )
+            if updated != len(product_ids):
+                # Only reachable without row locks (SQLite), when stock changed after it was read.
+                stock = dict(Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock'))
+                failed = _shortages(quantities, stock) or sorted(quantities.items())
+        if failed:
+            raise InsufficientStock(failed)
+        StockEvent.objects.record_crossings(
+            (product_id, stock[product_id], stock[product_id] - quantities[product_id], thresholds[product_id])
+            for product_id in product_ids
+        )
+
+
+def release_lines_bulk(lines):
+    """
+    Puts the stock of every `(product_id, quantity)` line back with a single UPDATE whose per-product
+    amounts come from a CASE expression, logging the products that go back above their threshold.
+    """
+    quantities = merge_lines(lines)
+    if not quantities:
+        return
+    amount = Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()],
+        output_field=models.PositiveIntegerField()
+    )
+    with transaction.atomic():
+        Product.objects.filter(pk__in=list(quantities)).update(stock=F('stock') + amount)
+        Product.objects.record_stock_changes(quantities)
+
+
+def _shortages(quantities, stock):
+    return [
+        (product_id, quantities[product_id])
+        for product_id in sorted(quantities)
+        if stock.get(product_id, 0) < quantities[product_id]
+    ]
+
+
+def reserve_order(order):
+    """
+    Reserves stock for every item of `order`. See `reserve_lines`.
+    """
+    reserve_lines(order.items.values_list('product_id', 'quantity'))
@@ -1,3 +1,1719 @@
-from django.test import TestCase
+import base64
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from users.models import User
+from users.serializers import UserSerializer
+from . import carts, jobs, profiling, seeding
+from .cache import read_through
+from .carts import ShoppingCart
+from .checkout import ProductUnavailable, place_order
+from .export import iter_orders
+from .imports import ProductImporter, read_feed
+from .management.commands.backfill_sales import Command as BackfillSalesCommand
+from .seeding import seed_all
+from .slugs import allocate_slugs
+from .models import (
+    Cart,
+    CartItem,
+    Category,
+    DailyCategorySales,
+    DailyProductSales,
+    Job,
+    Order,
+    OrderItem,
+    OrderStatusTransition,
+    Product,
+    Review,
+    StockEvent,
+)
+from .fast_serializers import order_item_values, order_values, product_values
+from .serializers import OrderItemSerializer, OrderSerializer, ProductSerializer
+from .profiling import QueryProfilingMiddleware
+from .stock import InsufficientStock, release_stock, reserve_lines, reserve_stock
+from .transitions import InvalidTransition, transition_orders
+
+
+def create_user(username='customer', **kwargs):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='secret',
+        **kwargs
+    )
+
+
+def create_product(name='Product', **kwargs):
+    kwargs.setdefault('image', 'images/product.jpg')
+    kwargs.setdefault('description', f'{name} description')
+    kwargs.setdefault('price', Decimal('10.00'))
+    kwargs.setdefault('stock', 10)
+    return Product.objects.create(name=name, **kwargs)
+
+
+def create_order(user, **kwargs):
+    kwargs.setdefault('cost', 0)
+    kwargs.setdefault('address', 'Somewhere 1')
+    return Order.objects.create(user=user, **kwargs)
+
+
+class OrderTotalsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.first = create_product('First')
+        cls.second = create_product('Second')
+
+    def test_totals_follow_item_writes(self):
+        order = create_order(self.user)
+        self.assertEqual((order.total_cost, order.total_products), (0, 0))
+
+        item = order.items.create(product=self.first, quantity=2, price=10)
+        self.assertEqual((order.total_cost, order.total_products), (20, 2))
+
+        item.quantity = 3
+        item.save()
+        order.refresh_from_db()
+        self.assertEqual((order.total_cost, order.total_products), (30, 3))
+
+        item.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.total_cost, order.total_products), (0, 0))
+
+    def test_totals_follow_bulk_writes(self):
+        order = create_order(self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.first, quantity=1, price=10),
+            OrderItem(order=order, product=self.second, quantity=4, price=5),
+        ])
+        order.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (30, 5))
+
+        order.items.filter(product=self.second).update(quantity=2)
+        order.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (20, 3))
+
+        order.items.all().delete()
+        order.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (0, 0))
+
+    def test_totals_follow_cascades_and_moved_items(self):
+        order, other = create_order(self.user), create_order(self.user)
+        order.items.create(product=self.first, quantity=2, price=5)
+        moved = order.items.create(product=self.second, quantity=1, price=7)
+
+        moved.order = other
+        moved.save()
+        order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (10, 2))
+        self.assertEqual((other.items_cost, other.items_quantity), (7, 1))
+
+        other.items.create(product=self.first, quantity=1, price=5)
+        self.first.delete()
+        order.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (0, 0))
+        self.assertEqual((other.items_cost, other.items_quantity), (7, 1))
+
+    def test_deleting_items_refreshes_each_order_once(self):
+        order = create_order(self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=1, price=10)
+            for product in (self.first, self.second)
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            order.items.all().delete()
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+        order.refresh_from_db()
+        self.assertEqual((order.items_cost, order.items_quantity), (0, 0))
+
+    def test_with_totals_covers_orders_without_stored_totals(self):
+        order = create_order(self.user)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=self.first, quantity=3, price=7),
+        ])
+        Order.objects.filter(pk=order.pk).update(items_cost=None, items_quantity=None)
+
+        order = Order.objects.with_totals().get(pk=order.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual((order.total_cost, order.total_products), (21, 3))
+
+    def test_serializer_reads_stored_totals(self):
+        order = create_order(self.user)
+        order.items.create(product=self.first, quantity=2, price=10)
+        order = (
+            Order.objects
+            .select_related('user')
+            .prefetch_related('items__product__category')
+            .get(pk=order.pk)
+        )
+
+        with self.assertNumQueries(0):
+            data = OrderSerializer(order).data
+        self.assertEqual((data['total_cost'], data['total_products']), (20, 2))
+
+
+class OrderApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.other = create_user('other')
+        books = Category.objects.create(name='Books')
+        for index in range(12):
+            product = create_product(f'Product {index}')
+            product.category.add(books)
+            order = create_order(cls.user)
+            order.items.create(product=product, quantity=1, price=10)
+            order.items.create(product=product, quantity=2, price=10)
+        create_order(cls.other)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        url = reverse('order-list')
+        with CaptureQueriesContext(connection) as small_page:
+            response = self.client.get(url, {'page_size': 2})
+        self.assertEqual(len(response.data['results']), 2)
+
+        with self.assertNumQueries(len(small_page)):
+            response = self.client.get(url, {'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_cursor_walks_own_orders_newest_first(self):
+        response = self.client.get(reverse('order-list'), {'page_size': 5})
+        seen = [order['id'] for order in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            seen.extend(order['id'] for order in response.data['results'])
+
+        expected = list(Order.objects.filter(user=self.user).values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_detail_hides_other_users_orders(self):
+        order = Order.objects.filter(user=self.other).get()
+        response = self.client.get(reverse('order-detail', args=[order.pk]))
+        self.assertEqual(response.status_code, 404)
+
+        order = Order.objects.filter(user=self.user).first()
+        response = self.client.get(reverse('order-detail', args=[order.pk]))
+        self.assertEqual(response.data['total_products'], 3)
+        self.assertEqual(len(response.data['items']), 2)
+
+
+class ProductCatalogTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(name='Books')
+        for index in range(10):
+            product = create_product(f'Book {index}', price=Decimal(10 + index))
+            product.category.add(cls.books)
+        create_product('Draft book', status='draft').category.add(cls.books)
+        create_product('Lamp', price=Decimal('15.00'))
+
+    def collect(self, params):
+        response = self.client.get(reverse('product-list'), params)
+        names = [product['name'] for product in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            names.extend(product['name'] for product in response.data['results'])
+        return names
+
+    def test_cursor_walks_active_products_newest_first(self):
+        names = self.collect({'page_size': 4})
+        expected = list(
+            Product.objects.active().order_by('-created_at', '-id').values_list('name', flat=True)
+        )
+        self.assertEqual(names, expected)
+        self.assertNotIn('Draft book', names)
+
+    def test_filters(self):
+        self.assertEqual(
+            self.collect({'category': 'books', 'min_price': '12', 'max_price': '14.50'}),
+            ['Book 4', 'Book 3', 'Book 2']
+        )
+        self.assertEqual(self.client.get(reverse('product-list'), {'status': 'draft'}).status_code, 400)
+        self.client.force_login(create_user('staff', is_staff=True))
+        self.assertEqual(self.collect({'status': 'draft'}), ['Draft book'])
+
+    def test_effective_price_filters_and_sorts_on_discounted_price(self):
+        create_product('Sale lamp', price=Decimal('30.00'), discount=Decimal('17.50'))
+        create_product('Free lamp', price=Decimal('5.00'), discount=Decimal('8.00'))
+        self.assertEqual(
+            list(
+                Product.objects.filter(name__endswith='lamp').order_by('name')
+                .values_list('effective_price', flat=True)
+            ),
+            [Decimal('0.00'), Decimal('15.00'), Decimal('12.50')]
+        )
+
+        names = self.collect({'min_price': '12', 'max_price': '13', 'ordering': 'effective_price'})
+        self.assertEqual(names, ['Book 2', 'Sale lamp', 'Book 3'])
+        response = self.client.get(reverse('product-list'), {'ordering': 'effective_price', 'page_size': 1})
+        self.assertEqual(response.data['results'][0]['name'], 'Free lamp')
+        self.assertEqual(response.data['results'][0]['effective_price'], '0.00')
+
+        # Book 5 and Lamp tie at 15.00: the cursor seeks past the tie on the id rather than with an OFFSET.
+        with CaptureQueriesContext(connection) as queries:
+            names = self.collect({'min_price': '14', 'max_price': '16', 'ordering': '-effective_price', 'page_size': 1})
+        self.assertEqual(names, ['Book 6', 'Lamp', 'Book 5', 'Book 4'])
+        self.assertFalse([query for query in queries if 'OFFSET' in query['sql']])
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(reverse('product-list'), {'min_price': '20', 'max_price': '10'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('product-list'), {'status': 'unknown'})
+        self.assertEqual(response.status_code, 400)
+
+
+class StockTests(TestCase):
+    def test_update_stock_never_goes_negative(self):
+        product = create_product(stock=3)
+        self.assertTrue(product.update_stock(2))
+        self.assertEqual(product.stock, 5)
+        self.assertFalse(product.update_stock(-6))
+        self.assertEqual(product.stock, 5)
+        self.assertTrue(product.update_stock(-5))
+        self.assertEqual(product.stock, 0)
+        self.assertTrue(product.is_low_stock)
+
+    def test_reserve_lines_is_all_or_nothing(self):
+        first = create_product('First', stock=5)
+        second = create_product('Second', stock=1)
+        third = create_product('Third', stock=0)
+
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_lines([(first.pk, 2), (second.pk, 1), (second.pk, 1), (third.pk, 1)])
+        self.assertEqual(raised.exception.failed, [(second.pk, 2), (third.pk, 1)])
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('stock', flat=True)),
+            [5, 1, 0]
+        )
+
+        reserve_lines([(first.pk, 2), (second.pk, 1)])
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('stock', flat=True)),
+            [3, 0, 0]
+        )
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Concurrent connections need a file or server backed test database.')
+
+    def run_concurrently(self, target, arguments):
+        results = []
+
+        def worker(argument):
+            try:
+                results.append(target(argument))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(argument,)) for argument in arguments]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        product = create_product(stock=10)
+        results = self.run_concurrently(lambda _: reserve_stock(product.pk, 1), range(25))
+
+        self.assertEqual(results.count(True), 10)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+
+    def test_concurrent_orders_reserve_in_any_line_order(self):
+        first = create_product('First', stock=20)
+        second = create_product('Second', stock=20)
+
+        def reserve(reverse_lines):
+            lines = [(first.pk, 1), (second.pk, 1)]
+            reserve_lines(reversed(lines) if reverse_lines else lines)
+
+        self.run_concurrently(reserve, [index % 2 == 0 for index in range(20)])
+        self.assertEqual(
+            list(Product.objects.order_by('pk').values_list('stock', flat=True)),
+            [0, 0]
+        )
+
+
+class LowStockTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.user = create_user()
+
+    def test_generated_column_follows_stock_and_threshold(self):
+        product = create_product(stock=6, low_stock_threshold=5)
+        self.assertFalse(Product.objects.low_stock().exists())
+        Product.objects.filter(pk=product.pk).update(low_stock_threshold=6)
+        self.assertEqual(list(Product.objects.low_stock()), [product])
+
+    def test_threshold_crossings_are_logged(self):
+        product = create_product(stock=7, low_stock_threshold=5)
+        self.assertTrue(product.update_stock(-1))
+        self.assertFalse(StockEvent.objects.exists())
+        self.assertTrue(reserve_stock(product.pk, 2))
+        self.assertTrue(product.update_stock(-3))
+        release_stock(product.pk, 4)
+        self.assertTrue(product.update_stock(1))
+        self.assertEqual(
+            list(StockEvent.objects.order_by('pk').values_list('kind', 'stock', 'threshold')),
+            [('low', 4, 5), ('restocked', 6, 5)]
+        )
+
+    def test_checkout_logs_crossings_in_one_insert(self):
+        low, plenty = create_product('Low', stock=6), create_product('Plenty', stock=50)
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.user, 'Somewhere 1', [(low.pk, 2), (plenty.pk, 2)])
+        self.assertEqual(
+            list(StockEvent.objects.values_list('product_id', 'kind', 'stock')),
+            [(low.pk, 'low', 4)]
+        )
+        inserts = [query for query in queries if 'stockevent' in query['sql'] and query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_low_stock_endpoint(self):
+        empty = create_product('Empty', stock=0)
+        create_product('Plenty', stock=50)
+        create_product('Draft', stock=0, status='draft')
+        few = create_product('Few', stock=3)
+        url = reverse('product-low-stock')
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [empty.pk, few.pk])
+        self.assertTrue(all(item['low_stock'] for item in response.data['results']))
+
+    def test_low_stock_pages_seek_past_ties_without_offset(self):
+        empty = [create_product(f'Empty {index}', stock=0) for index in range(4)]
+        few = create_product('Few', stock=3)
+        url, ids = reverse('product-low-stock'), []
+
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'page_size': 2})
+            ids += [item['id'] for item in response.data['results']]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                ids += [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [product.pk for product in empty] + [few.pk])
+        self.assertFalse([query for query in queries if 'OFFSET' in query['sql']])
+
+    def test_stock_event_feed(self):
+        product = create_product('Kettle', stock=6)
+        reserve_stock(product.pk, 3)
+        release_stock(product.pk, 3)
+        url = reverse('stock-event-list')
+
+        self.client.force_login(self.staff)
+        response = self.client.get(url)
+        self.assertEqual(
+            [(event['product_name'], event['kind']) for event in response.data['results']],
+            [('Kettle', 'restocked'), ('Kettle', 'low')]
+        )
+        response = self.client.get(url, {'kind': 'low'})
+        self.assertEqual([event['kind'] for event in response.data['results']], ['low'])
+        self.assertEqual(self.client.get(url, {'kind': 'gone'}).status_code, 400)
+
+
+class OrderTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.user = create_user()
+        cls.kettle = create_product('Kettle', price=Decimal('10.00'), stock=10)
+
+    def place(self, quantity=1):
+        return place_order(self.user, 'Somewhere 1', [(self.kettle.pk, quantity)])
+
+    def test_batch_moves_with_one_update_per_source_status(self):
+        pending = [self.place() for _ in range(3)]
+        processing = [self.place() for _ in range(2)]
+        transition_orders([order.pk for order in processing], 'processing')
+
+        order_ids = [order.pk for order in pending + processing]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(transition_orders(order_ids, 'cancelled', changed_by=self.staff), 5)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "products_order"')]
+        self.assertEqual(len(updates), 2)
+
+        self.assertEqual(set(Order.objects.values_list('status', flat=True)), {'cancelled'})
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.stock, 10)
+        self.assertEqual(
+            sorted(OrderStatusTransition.objects.filter(to_status='cancelled').values_list('from_status', flat=True)),
+            ['pending'] * 3 + ['processing'] * 2
+        )
+        self.assertEqual(OrderStatusTransition.objects.filter(changed_by=self.staff).count(), 5)
+
+    def test_invalid_moves_reject_the_whole_batch(self):
+        pending, shipped = self.place(), self.place()
+        transition_orders([shipped.pk], 'processing')
+        transition_orders([shipped.pk], 'shipped')
+
+        with self.assertRaises(InvalidTransition) as raised:
+            transition_orders([pending.pk, shipped.pk, 999999], 'cancelled')
+        self.assertEqual(raised.exception.rejected, [(shipped.pk, 'shipped'), (999999, None)])
+        self.assertEqual(Order.objects.get(pk=pending.pk).status, 'pending')
+        self.assertEqual(OrderStatusTransition.objects.filter(to_status='cancelled').count(), 0)
+
+    def test_delivery_is_counted_in_sales(self):
+        order = self.place(quantity=2)
+        for status in ('processing', 'shipped', 'delivered'):
+            transition_orders([order.pk], status)
+        self.assertEqual(
+            list(DailyProductSales.objects.values_list('product_id', 'quantity', 'revenue')),
+            [(self.kettle.pk, 2, 20)]
+        )
+
+    def test_endpoint(self):
+        order = self.place()
+        url = reverse('order-transition')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(url, {'orders': [order.pk], 'status': 'processing'}).status_code, 403)
+
+        self.client.force_login(self.staff)
+        response = self.client.post(url, {'orders': [order.pk], 'status': 'delivered'}, content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['invalid_transitions'], [{'order': order.pk, 'status': 'pending'}])
+        response = self.client.post(url, {'orders': [order.pk], 'status': 'processing'}, content_type='application/json')
+        self.assertEqual(response.data, {'status': 'processing', 'moved': 1})
+
+
+class CartTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.kettle = create_product('Kettle', price=Decimal('20.00'), discount=Decimal('4.60'), stock=5)
+        cls.hose = create_product('Hose', price=Decimal('9.50'), stock=5)
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('cart')
+
+    def add(self, product, quantity):
+        return self.client.post(self.url, {'product': product.pk, 'quantity': quantity})
+
+    def test_anonymous_cart_lives_in_the_cache(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.add(self.kettle, 2)
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+        self.assertIn('cart', response.cookies)
+        self.add(self.hose, 1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [(item['name'], item['unit_price'], item['line_total']) for item in response.data['items']],
+            [('Kettle', 15, 30), ('Hose', 10, 10)]
+        )
+        self.assertEqual((response.data['total'], response.data['total_quantity']), (40, 3))
+        self.assertFalse(Cart.objects.exists())
+
+    def test_prices_are_read_with_one_query(self):
+        products = [create_product(f'Product {index}') for index in range(20)]
+        cart = ShoppingCart(self.user)
+        for product in products:
+            cart.lines[product.pk] = 1
+        with self.assertNumQueries(1):
+            self.assertEqual(len(cart.priced()['items']), 20)
+
+    def persisted(self):
+        return sorted(CartItem.objects.values_list('product_id', 'quantity'))
+
+    @mock.patch('products.cache.is_shared', return_value=True)
+    def test_user_carts_are_written_behind(self, is_shared):
+        self.client.force_login(self.user)
+        self.add(self.kettle, 1)
+        self.assertEqual(self.persisted(), [(self.kettle.pk, 1)])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.add(self.kettle, 3)
+            self.add(self.hose, 1)
+        self.assertFalse([query for query in queries if 'products_cartitem' in query['sql']])
+        self.assertEqual(Job.objects.filter(kind='persist_cart').count(), 1)
+        with mock.patch('products.carts.time.time', return_value=time.time() + carts.PERSIST_EVERY):
+            self.add(self.hose, 2)
+        self.assertEqual(self.persisted(), [(self.kettle.pk, 3), (self.hose.pk, 2)])
+
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).data['total_quantity'], 5)
+
+    @mock.patch('products.cache.is_shared', return_value=True)
+    def test_dirty_carts_are_flushed_by_a_job(self, is_shared):
+        self.client.force_login(self.user)
+        self.add(self.kettle, 1)
+        self.add(self.kettle, 2)
+        self.add(self.hose, 4)
+        self.assertEqual(self.persisted(), [(self.kettle.pk, 1)])
+        self.assertEqual(jobs.run_batch(), 0)
+
+        self.assertEqual(jobs.run_batch(now=timezone.now() + timedelta(seconds=carts.PERSIST_EVERY)), 1)
+        self.assertEqual(self.persisted(), [(self.kettle.pk, 2), (self.hose.pk, 4)])
+        cache.clear()
+        self.assertEqual(self.client.get(self.url).data['total_quantity'], 6)
+
+    def test_user_carts_are_written_through_with_a_process_local_cache(self):
+        self.client.force_login(self.user)
+        self.add(self.kettle, 1)
+        self.add(self.hose, 3)
+        self.assertEqual(self.persisted(), [(self.kettle.pk, 1), (self.hose.pk, 3)])
+        self.assertFalse(Job.objects.exists())
+
+    def test_anonymous_cart_is_merged_on_login(self):
+        self.add(self.kettle, 2)
+        self.client.force_login(self.user)
+        self.assertEqual(
+            [(item['product'], item['quantity']) for item in self.client.get(self.url).data['items']],
+            [(self.kettle.pk, 2)]
+        )
+
+    def test_checkout(self):
+        self.client.force_login(self.user)
+        checkout = reverse('cart-checkout')
+        self.assertEqual(self.client.post(checkout, {'address': 'Somewhere 1'}).status_code, 400)
+
+        self.add(self.kettle, 6)
+        response = self.client.post(checkout, {'address': 'Somewhere 1'})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.get(self.url).data['total_quantity'], 6)
+
+        self.add(self.kettle, 2)
+        response = self.client.post(checkout, {'address': 'Somewhere 1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_cost'], 30)
+        self.assertEqual(self.client.get(self.url).data['items'], [])
+        self.assertFalse(Cart.objects.exists())
+        self.kettle.refresh_from_db()
+        self.assertEqual(self.kettle.stock, 3)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.products = [
+            create_product(f'Product {index}', price=Decimal('9.60'), stock=5)
+            for index in range(200)
+        ]
+
+    def test_query_count_does_not_depend_on_line_count(self):
+        with CaptureQueriesContext(connection) as few_lines:
+            place_order(self.user, 'Somewhere 1', [(product.pk, 1) for product in self.products[:5]])
+
+        with self.assertNumQueries(len(few_lines)):
+            order = place_order(self.user, 'Somewhere 1', [(product.pk, 2) for product in self.products])
+        self.assertEqual(order.items.count(), 200)
+
+    def test_order_snapshots_prices_and_reserves_stock(self):
+        first, second = self.products[:2]
+        order = place_order(self.user, 'Somewhere 1', [(first.pk, 2), (second.pk, 1), (first.pk, 1)])
+
+        order.refresh_from_db()
+        self.assertEqual((order.cost, order.total_cost, order.total_products), (40, 40, 4))
+        self.assertEqual(
+            list(order.items.order_by('product_id').values_list('product_id', 'quantity', 'price')),
+            [(first.pk, 3, 10), (second.pk, 1, 10)]
+        )
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 2)
+
+    def test_failed_checkout_writes_nothing(self):
+        first, second = self.products[:2]
+        with self.assertRaises(InsufficientStock) as raised:
+            place_order(self.user, 'Somewhere 1', [(first.pk, 1), (second.pk, 6)])
+        self.assertEqual(raised.exception.failed, [(second.pk, 6)])
+
+        Product.objects.filter(pk=second.pk).update(status='draft')
+        with self.assertRaises(ProductUnavailable):
+            place_order(self.user, 'Somewhere 1', [(first.pk, 1), (second.pk, 1)])
+
+        self.assertFalse(Order.objects.exists())
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 5)
+
+    def test_checkout_api(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        first, second = self.products[:2]
+
+        response = client.post(
+            reverse('order-list'),
+            {'address': 'Somewhere 1', 'items': [{'product': first.pk, 'quantity': 2}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_cost'], 20)
+
+        response = client.post(
+            reverse('order-list'),
+            {'address': 'Somewhere 1', 'items': [{'product': second.pk, 'quantity': 9}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['insufficient_stock'], [{'product': second.pk, 'quantity': 9}])
+
+
+class JobQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.product = create_product()
+
+    def test_checkout_defers_side_effects_to_jobs(self):
+        order = place_order(self.user, 'Somewhere 1', [(self.product.pk, 2)])
+        self.assertCountEqual(
+            Job.objects.filter(status='queued').values_list('kind', flat=True),
+            ['last_purchase_date', 'order_confirmation']
+        )
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_purchase_date)
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(jobs.run_batch(), 2)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_purchase_date, timezone.localdate())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, f'Your order #{order.pk}')
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+        self.assertFalse(Job.objects.filter(finished_at__isnull=True).exists())
+        self.assertEqual(jobs.run_batch(), 0)
+
+    def test_last_purchase_dates_are_coalesced_into_one_update_per_day(self):
+        users = [create_user(f'buyer{index}') for index in range(3)]
+        later = create_user('later', last_purchase_date=date(2024, 6, 1))
+        purchases = [(user, '2024-05-01') for user in [*users, later]] + [(user, '2024-05-02') for user in users[:2]]
+        jobs.enqueue_many(('last_purchase_date', {'user': user.pk, 'date': day}) for user, day in purchases * 10)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(jobs.run_batch(), 60)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "users_user"')]
+        self.assertEqual(len(updates), 2)
+        buyers = User.objects.filter(pk__in=[user.pk for user in users]).order_by('pk')
+        self.assertEqual(
+            [str(user.last_purchase_date) for user in buyers],
+            ['2024-05-02', '2024-05-02', '2024-05-01']
+        )
+        later.refresh_from_db()
+        self.assertEqual(str(later.last_purchase_date), '2024-06-01')
+
+    def test_failed_job_is_retried_with_backoff_until_it_gives_up(self):
+        def flaky(payloads):
+            if any(payload.get('bad') for payload in payloads):
+                raise ValueError('bad payload')
+
+        self.assertEqual(
+            [jobs.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 10)],
+            [10, 20, 40, jobs.MAX_RETRY_DELAY]
+        )
+        with mock.patch.dict(jobs.HANDLERS, {'flaky': flaky}):
+            good, bad = jobs.enqueue_many([('flaky', {}), ('flaky', {'bad': True})])
+            with self.assertLogs('products.jobs', 'WARNING'):
+                self.assertEqual(jobs.run_batch(), 2)
+
+            good.refresh_from_db()
+            bad.refresh_from_db()
+            self.assertEqual(good.status, 'done')
+            self.assertEqual((bad.status, bad.attempts, bad.last_error), ('queued', 1, 'ValueError: bad payload'))
+            self.assertAlmostEqual((bad.run_at - timezone.now()).total_seconds(), 10, delta=2)
+            self.assertEqual(jobs.run_batch(), 0)
+
+            with self.assertLogs('products.jobs', 'WARNING') as logs:
+                for _ in range(jobs.MAX_ATTEMPTS - 1):
+                    self.assertEqual(jobs.run_batch(now=timezone.now() + timedelta(days=1)), 1)
+            self.assertEqual(len(logs.records), jobs.MAX_ATTEMPTS - 1)
+            bad.refresh_from_db()
+            self.assertEqual((bad.status, bad.attempts), ('failed', jobs.MAX_ATTEMPTS))
+            self.assertIsNotNone(bad.finished_at)
+            self.assertEqual(jobs.run_batch(now=timezone.now() + timedelta(days=1)), 0)
+
+    def test_stats_report_queue_depth_and_latency(self):
+        now = timezone.now()
+        Job.objects.bulk_create([
+            Job(kind='mail', run_at=now - timedelta(seconds=30)),
+            Job(kind='mail', run_at=now + timedelta(minutes=5)),
+            Job(kind='mail', status='failed', finished_at=now),
+            Job(kind='mail', status='done', created_at=now - timedelta(seconds=2), finished_at=now),
+            Job(kind='mail', status='done', created_at=now - timedelta(seconds=4), finished_at=now),
+            Job(kind='mail', status='done', created_at=now - timedelta(days=1), finished_at=now - timedelta(hours=2)),
+            Job(kind='sync', status='done', created_at=now - timedelta(seconds=1), finished_at=now),
+        ])
+
+        self.assertEqual(jobs.stats(now=now), {
+            'mail': {
+                'queued': 2,
+                'due': 1,
+                'failed': 1,
+                'oldest_due_seconds': 30.0,
+                'done': 2,
+                'avg_latency_ms': 3000.0,
+                'max_latency_ms': 4000.0,
+            },
+            'sync': {
+                'queued': 0,
+                'due': 0,
+                'failed': 0,
+                'oldest_due_seconds': None,
+                'done': 1,
+                'avg_latency_ms': 1000.0,
+                'max_latency_ms': 1000.0,
+            },
+        })
+
+        self.assertEqual(jobs.prune(timedelta(hours=1), now=now), 1)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('job-stats')).status_code, 403)
+        client.force_authenticate(create_user('staff', is_staff=True))
+        response = client.get(reverse('job-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['kinds']['mail']['due'], 1)
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def test_burst_runs_every_due_job(self):
+        user = create_user()
+        jobs.enqueue_many(('last_purchase_date', {'user': user.pk, 'date': '2024-05-01'}) for _ in range(5))
+        jobs.enqueue('last_purchase_date', {'user': user.pk, 'date': '2024-05-02'}, timezone.now() + timedelta(hours=1))
+
+        stdout = StringIO()
+        call_command('run_jobs', '--burst', '--batch-size', '2', stdout=stdout)
+        self.assertEqual(stdout.getvalue().strip(), 'Ran 5 job(s).')
+        user.refresh_from_db()
+        self.assertEqual(str(user.last_purchase_date), '2024-05-01')
+
+        stdout = StringIO()
+        call_command('run_jobs', '--stats', stdout=stdout)
+        self.assertIn('last_purchase_date: queued=1, due=0, failed=0', stdout.getvalue())
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+        cls.product = create_product('Rated')
+        cls.other = create_product('Other')
+
+    def assertRatings(self, product, average, histogram):
+        product.refresh_from_db()
+        self.assertEqual(product.rating_avg, Decimal(average))
+        self.assertEqual(product.rating_count, sum(histogram))
+        self.assertEqual(list(product.rating_histogram.values()), histogram)
+
+    def test_reviews_maintain_aggregates(self):
+        first = Review.objects.create(product=self.product, user=self.user, rating=5, text='Great')
+        Review.objects.create(product=self.product, user=self.user, rating=4, text='Good')
+        Review.objects.create(product=self.product, user=self.user, rating=4, text='Fine')
+        self.assertRatings(self.product, '4.33', [0, 0, 0, 2, 1])
+
+        first = Review.objects.get(pk=first.pk)
+        first.rating = 1
+        first.save()
+        self.assertRatings(self.product, '3.00', [1, 0, 0, 2, 0])
+
+        first.product = self.other
+        first.save()
+        self.assertRatings(self.product, '4.00', [0, 0, 0, 2, 0])
+        self.assertRatings(self.other, '1.00', [1, 0, 0, 0, 0])
+
+        first.delete()
+        self.assertRatings(self.other, '0.00', [0, 0, 0, 0, 0])
+
+    def test_cascade_deletes_maintain_aggregates(self):
+        author = create_user('author')
+        Review.objects.create(product=self.product, user=author, rating=2, text='Meh')
+        Review.objects.create(product=self.product, user=author, rating=3, text='Ok')
+        Review.objects.create(product=self.product, user=self.user, rating=5, text='Great')
+
+        author.delete()
+        self.assertRatings(self.product, '5.00', [0, 0, 0, 0, 1])
+        Review.objects.filter(product=self.product).delete()
+        self.assertRatings(self.product, '0.00', [0, 0, 0, 0, 0])
+
+    def test_rebuild_command(self):
+        Review.objects.bulk_create([
+            Review(product=self.product, user=self.user, rating=rating, text='Bulk')
+            for rating in (2, 3, 3)
+        ])
+        Product.objects.filter(pk=self.other.pk).update(rating_count=3, rating_avg=5, rating_5_count=3)
+
+        call_command('rebuild_ratings', batch_size=1, stdout=StringIO())
+        self.assertRatings(self.product, '2.67', [0, 1, 2, 0, 0])
+        self.assertRatings(self.other, '0.00', [0, 0, 0, 0, 0])
+
+    def test_catalog_orders_and_filters_by_rating(self):
+        Review.objects.create(product=self.product, user=self.user, rating=4, text='Good')
+        Review.objects.create(product=self.other, user=self.user, rating=2, text='Meh')
+
+        response = self.client.get(reverse('product-list'), {'ordering': '-rating_avg'})
+        self.assertEqual([product['name'] for product in response.data['results']], ['Rated', 'Other'])
+
+        response = self.client.get(reverse('product-list'), {'min_rating': '3'})
+        self.assertEqual([product['name'] for product in response.data['results']], ['Rated'])
+        self.assertEqual(response.data['results'][0]['rating_histogram'], {1: 0, 2: 0, 3: 0, 4: 1, 5: 0})
+
+    def test_rating_pages_seek_past_ties_without_offset(self):
+        unrated = [create_product(f'Unrated {index}') for index in range(7)]
+        Review.objects.create(product=self.other, user=self.user, rating=3, text='Ok')
+
+        url, names = reverse('product-list'), []
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'ordering': '-rating_avg', 'page_size': 3})
+            names += [product['name'] for product in response.data['results']]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                names += [product['name'] for product in response.data['results']]
+        tied = sorted([*unrated, self.product], key=lambda product: product.pk, reverse=True)
+        self.assertEqual(names, ['Other'] + [product.name for product in tied])
+        self.assertFalse([query for query in queries if 'OFFSET' in query['sql']])
+
+
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        create_product('Blue kettle', description='Boils water quickly')
+        create_product('Teapot', description='Pairs well with a blue kettle')
+        create_product('Red kettle', description='Boils water', status='draft')
+        create_product('Toaster', description='Makes toast')
+
+    def search(self, **params):
+        response = self.client.get(reverse('product-search'), params)
+        return [product['name'] for product in response.data['results']]
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search(q='blue kettle'), ['Blue kettle', 'Teapot'])
+
+    def test_filters_apply_to_results(self):
+        self.assertEqual(self.search(q='kettle', status='archived'), [])
+        self.client.force_login(create_user('staff', is_staff=True))
+        self.assertEqual(self.search(q='kettle', status='draft'), ['Red kettle'])
+        self.assertEqual(self.search(q='toast'), ['Toaster'])
+
+    def test_terms_are_required(self):
+        response = self.client.get(reverse('product-search'))
+        self.assertEqual(response.status_code, 400)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.root = Category.objects.create(name='Home')
+        self.kitchen = Category.objects.create(name='Kitchen', parent=self.root)
+        self.pots = Category.objects.create(name='Pots', parent=self.kitchen)
+        self.garden = Category.objects.create(name='Garden')
+
+    def test_paths_follow_moves(self):
+        self.assertEqual(self.pots.depth, 2)
+        self.assertEqual(
+            set(Category.objects.subtree(self.root).values_list('name', flat=True)),
+            {'Home', 'Kitchen', 'Pots'}
+        )
+
+        self.kitchen.parent = self.garden
+        self.kitchen.save()
+        self.pots.refresh_from_db()
+        self.assertTrue(self.pots.path.startswith(self.garden.path))
+        self.assertEqual(
+            set(Category.objects.subtree(self.garden).values_list('name', flat=True)),
+            {'Garden', 'Kitchen', 'Pots'}
+        )
+
+        self.garden.parent = self.pots
+        with self.assertRaises(ValueError):
+            self.garden.save()
+
+    def test_product_counts_follow_membership_and_status(self):
+        kettle = create_product('Kettle')
+        pan = create_product('Pan')
+        kettle.category.add(self.kitchen, self.pots)
+        self.pots.products.add(pan)
+
+        counts = lambda: dict(Category.objects.values_list('name', 'product_count'))
+        self.assertEqual(counts(), {'Home': 0, 'Kitchen': 1, 'Pots': 2, 'Garden': 0})
+
+        kettle = Product.objects.get(pk=kettle.pk)
+        kettle.status = 'archived'
+        kettle.save()
+        self.assertEqual(counts(), {'Home': 0, 'Kitchen': 0, 'Pots': 1, 'Garden': 0})
+
+        Product.objects.filter(pk=kettle.pk).update(status='active')
+        pan.category.clear()
+        self.assertEqual(counts(), {'Home': 0, 'Kitchen': 1, 'Pots': 1, 'Garden': 0})
+
+        kettle.delete()
+        self.assertEqual(counts(), {'Home': 0, 'Kitchen': 0, 'Pots': 0, 'Garden': 0})
+
+    def test_tree_endpoint_uses_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-tree'))
+        self.assertEqual([node['name'] for node in response.data], ['Home', 'Garden'])
+        self.assertEqual(response.data[0]['children'][0]['children'][0]['name'], 'Pots')
+
+        response = self.client.get(reverse('category-tree'), {'root': self.kitchen.slug})
+        self.assertEqual([node['name'] for node in response.data], ['Kitchen'])
+
+
+class ProductCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = create_product('Kettle', stock=4)
+        self.url = reverse('product-detail', args=[self.product.slug])
+
+    def fetch(self):
+        return self.client.get(self.url).data
+
+    def test_second_read_skips_database(self):
+        self.fetch()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.fetch()['name'], 'Kettle')
+
+    def test_writes_invalidate_payload(self):
+        self.fetch()
+        self.product.name = 'Steel kettle'
+        self.product.save()
+        self.assertEqual(self.fetch()['name'], 'Steel kettle')
+
+        reserve_stock(self.product.pk, 3)
+        self.assertEqual(self.fetch()['stock'], 1)
+
+        category = Category.objects.create(name='Kitchen')
+        category.products.add(self.product)
+        self.assertEqual(self.fetch()['category'], [category.pk])
+
+        category_url = reverse('category-detail', args=[category.slug])
+        self.assertEqual(self.client.get(category_url).data['product_count'], 1)
+        Product.objects.filter(pk=self.product.pk, status='active').update(status='archived')
+        self.assertEqual(self.client.get(category_url).data['product_count'], 0)
+        self.assertEqual(self.fetch()['status'], 'archived')
+
+        Product.objects.filter(slug=self.product.slug).update(slug='tea-kettle')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_renamed_category_drops_its_old_payload(self):
+        category = Category.objects.create(name='Kitchen')
+        old_url = reverse('category-detail', args=[category.slug])
+        self.assertEqual(self.client.get(old_url).status_code, 200)
+
+        category = Category.objects.get(pk=category.pk)
+        category.slug = 'cooking'
+        category.save()
+        self.assertEqual(self.client.get(old_url).status_code, 404)
+        self.assertEqual(self.client.get(reverse('category-detail', args=['cooking'])).data['name'], 'Kitchen')
+
+    def test_missing_and_draft_products_are_not_found(self):
+        self.assertEqual(self.client.get(reverse('product-detail', args=['nothing'])).status_code, 404)
+        self.product.status = 'draft'
+        self.product.save()
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_concurrent_misses_load_once(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'loaded': True}
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(read_through('stampede', loader)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'loaded': True}] * 8)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = Category.objects.create(name='Books')
+        for index in range(7):
+            product = create_product(
+                f'Book {index}',
+                price=Decimal(10 + index % 3),
+                discount=Decimal('1.50') if index % 2 else None
+            )
+            product.category.add(cls.books)
+        create_product('Draft book', status='draft')
+        cls.product = Product.objects.get(name='Book 0')
+        for index, rating in enumerate([3, 5, 4]):
+            Review.objects.create(product=cls.product, user=create_user(f'reader{index}'), rating=rating, text='Ok')
+
+    def setUp(self):
+        cache.clear()
+
+    async def walk(self, name, params, client=None):
+        client = client or self.async_client
+        response = await client.get(reverse(name), params)
+        pages = [json.loads(response.content)]
+        while pages[-1]['next']:
+            pages.append(json.loads((await client.get(pages[-1]['next'])).content))
+        return [product for page in pages for product in page['results']]
+
+    async def test_catalog_matches_sync_catalog(self):
+        for ordering in ['-created_at', 'effective_price', '-rating_avg', 'unknown']:
+            params = {'category': 'books', 'ordering': ordering}
+            response = await sync_to_async(self.client.get)(reverse('product-list'), {**params, 'page_size': 100})
+            expected = json.loads(response.content)['results']
+            products = await self.walk('async-product-list', {**params, 'page_size': 2})
+            self.assertEqual(products, expected)
+
+        response = await self.async_client.get(reverse('async-product-list'), {'min_price': '12', 'max_price': '11'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', json.loads(response.content))
+        response = await self.async_client.get(reverse('async-product-list'), {'cursor': 'bm9wZQ=='})
+        self.assertEqual(response.status_code, 404)
+
+        response = await self.async_client.get(reverse('async-product-list'), {'status': 'draft'})
+        self.assertEqual(response.status_code, 400)
+        await self.async_client.aforce_login(await sync_to_async(create_user)('staff', is_staff=True))
+        products = await self.walk('async-product-list', {'status': 'draft'})
+        self.assertEqual([product['name'] for product in products], ['Draft book'])
+
+    async def test_details_share_sync_payloads(self):
+        for name, slug in [('product-detail', self.product.slug), ('category-detail', 'books')]:
+            response = await self.async_client.get(reverse(f'async-{name}', args=[slug]))
+            await sync_to_async(cache.clear)()
+            expected = await sync_to_async(self.client.get)(reverse(name, args=[slug]))
+            self.assertEqual(json.loads(response.content), json.loads(expected.content))
+
+        url = reverse('async-product-detail', args=[self.product.slug])
+        await self.async_client.get(url)
+        with mock.patch('products.async_views.aload_product_payload') as load:
+            self.assertEqual(json.loads((await self.async_client.get(url)).content)['name'], 'Book 0')
+        load.assert_not_called()
+        for slug in ['draft-book', 'nothing']:
+            response = await self.async_client.get(reverse('async-product-detail', args=[slug]))
+            self.assertEqual((response.status_code, json.loads(response.content)), (404, {'detail': 'Not found.'}))
+
+    async def test_reviews_match_sync_reviews(self):
+        for params in [{'page_size': 2}, {'ordering': '-rating'}]:
+            url = reverse('async-product-reviews', args=[self.product.slug])
+            response = await self.async_client.get(url, params)
+            expected = await sync_to_async(self.client.get)(
+                reverse('product-reviews', args=[self.product.slug]), params
+            )
+            self.assertEqual(json.loads(response.content)['results'], json.loads(expected.content)['results'])
+
+        response = await self.async_client.get(reverse('async-product-reviews', args=['draft-book']))
+        self.assertEqual(response.status_code, 404)
+
+
+class ReviewListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = create_product('Kettle')
+        other = create_product('Toaster')
+        cls.reviews = [
+            Review.objects.create(product=cls.product, user=create_user(f'reader{index}'), rating=rating, text='Ok')
+            for index, rating in enumerate([4, 5, 4, 4, 2, 5, 4])
+        ]
+        Review.objects.create(product=other, user=create_user('elsewhere'), rating=1, text='No')
+        cls.url = reverse('product-reviews', args=[cls.product.slug])
+
+    def collect(self, params):
+        response = self.client.get(self.url, params)
+        reviews = response.data['results']
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            reviews.extend(response.data['results'])
+        return reviews
+
+    def test_cursor_walks_reviews_in_order(self):
+        newest = [review.pk for review in reversed(self.reviews)]
+        self.assertEqual([review['id'] for review in self.collect({'page_size': 2})], newest)
+        self.assertEqual([review['id'] for review in self.collect({'ordering': 'created_at'})], newest[::-1])
+
+        # Equal ratings are paged through on the review id rather than skipped with an offset.
+        by_rating = sorted(self.reviews, key=lambda review: (review.rating, review.pk), reverse=True)
+        self.assertEqual(
+            [review['id'] for review in self.collect({'ordering': '-rating', 'page_size': 2})],
+            [review.pk for review in by_rating]
+        )
+
+    def test_payload_summarizes_authors(self):
+        review = self.client.get(self.url, {'page_size': 1}).data['results'][0]
+        self.assertEqual(set(review['user']), {'id', 'username', 'first_name', 'last_name'})
+        self.assertEqual((review['user']['username'], review['product']), ('reader6', self.product.pk))
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for page_size in [2, 7]:
+            with self.assertNumQueries(3):
+                response = self.client.get(self.url, {'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_missing_products_and_bad_cursors_are_not_found(self):
+        self.assertEqual(self.client.get(reverse('product-reviews', args=['nothing'])).status_code, 404)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'garbage'}).status_code, 404)
+        cursor = base64.urlsafe_b64encode(b'["not a date", 1]').decode()
+        self.assertEqual(self.client.get(self.url, {'cursor': cursor}).status_code, 404)
+
+
+class LoadTestCommandTests(TransactionTestCase):
+    def test_reports_both_targets(self):
+        product = create_product('Kettle', image='')
+        product.category.add(Category.objects.create(name='Kitchen'))
+        Review.objects.create(product=product, user=create_user(), rating=4, text='Ok')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        output = os.path.join(directory, 'loadtest.json')
+
+        out = StringIO()
+        call_command(
+            'loadtest', '--requests', '6', '--concurrency', '3', '--warmup', '1', '--output', output, stdout=out
+        )
+        self.assertIn('req/s', out.getvalue())
+        with open(output, encoding='utf-8') as stream:
+            results = json.load(stream)['results']
+        self.assertEqual(set(results), {'catalog', 'product', 'category', 'reviews'})
+        self.assertTrue(all(set(targets) == {'wsgi', 'asgi'} for targets in results.values()))
+        self.assertTrue(all(result['errors'] == 0 for targets in results.values() for result in targets.values()))
+
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--endpoint', 'checkout', stdout=StringIO())
+
+
+class ValuesSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(first_name='Ada', profile_picture='profile_pictures/ada.png')
+        kitchen = Category.objects.create(name='Kitchen')
+        garden = Category.objects.create(name='Garden')
+        cls.kettle = create_product('Kettle', discount=Decimal('1.50'))
+        cls.kettle.category.add(kitchen, garden)
+        cls.hose = create_product('Hose', image='')
+        Review.objects.create(product=cls.kettle, user=cls.user, rating=4, text='Good')
+        order = create_order(cls.user)
+        order.items.create(product=cls.kettle, quantity=2, price=10)
+        order.items.create(product=cls.hose, quantity=1, price=10)
+        create_order(cls.user)
+
+    def assertSameJson(self, serializer_class, values_serializer, queryset):
+        request = RequestFactory().get('/')
+        expected = JSONRenderer().render(
+            serializer_class(queryset, many=True, context={'request': request}).data
+        )
+        self.assertEqual(JSONRenderer().render(values_serializer.serialize(queryset, request)), expected)
+
+    def test_products_render_identically(self):
+        queryset = Product.objects.prefetch_related('category').order_by('pk')
+        self.assertSameJson(ProductSerializer, product_values, queryset)
+
+    def test_orders_render_identically(self):
+        self.assertSameJson(OrderSerializer, order_values, Order.objects.with_details())
+        self.assertSameJson(OrderItemSerializer, order_item_values, OrderItem.objects.order_by('pk'))
+
+    def test_query_count_is_fixed_per_relation(self):
+        # Orders, users, items, item products and product categories.
+        with self.assertNumQueries(5):
+            order_values.serialize(Order.objects.all())
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.user = create_user()
+        kettle = create_product('Kettle')
+        hose = create_product('Hose')
+        for index in range(5):
+            order = create_order(cls.user, status='delivered' if index % 2 else 'pending')
+            order.items.create(product=kettle, quantity=1, price=10)
+            order.items.create(product=hose, quantity=2, price=5)
+        create_order(cls.user, address='No items')
+        Order.objects.filter(address='No items').update(order_date=timezone.now() - timedelta(days=40))
+
+    def export(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        response = client.get(reverse('order-export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_has_one_line_per_item(self):
+        rows = list(csv.DictReader(StringIO(self.export())))
+        self.assertEqual(len(rows), 11)
+        empty = rows[-1]
+        self.assertEqual((empty['address'], empty['product_id'], empty['quantity']), ('No items', '', ''))
+        self.assertEqual(rows[0]['product_name'], 'Kettle')
+
+    def test_filters(self):
+        lines = self.export(output='jsonl', status='delivered').splitlines()
+        orders = [json.loads(line) for line in lines]
+        self.assertEqual([order['status'] for order in orders], ['delivered', 'delivered'])
+        self.assertEqual([item['quantity'] for item in orders[0]['items']], [1, 2])
+
+        recent = self.export(output='jsonl', since=(timezone.localdate() - timedelta(days=1)).isoformat())
+        self.assertEqual(len(recent.splitlines()), 5)
+
+    def test_items_are_loaded_per_chunk(self):
+        # One cursor over the orders plus one items query per chunk of two orders.
+        with self.assertNumQueries(4):
+            orders = list(iter_orders(Order.objects.all(), chunk_size=2))
+        self.assertEqual(len(orders), 6)
+
+    def test_export_is_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(reverse('order-export')).status_code, 403)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('export_orders', format='jsonl', status='pending', stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.kitchen = Category.objects.create(name='Kitchen')
+        cls.garden = Category.objects.create(name='Garden')
+        cls.kettle = create_product('Kettle')
+        cls.kettle.category.add(cls.kitchen, cls.garden)
+        cls.hose = create_product('Hose')
+        cls.hose.category.add(cls.garden)
+        cls.orders = []
+        for _ in range(3):
+            order = create_order(cls.staff)
+            order.items.create(product=cls.kettle, quantity=1, price=20)
+            order.items.create(product=cls.hose, quantity=2, price=5)
+            cls.orders.append(order)
+
+    def sales(self, model, **filters):
+        return list(model.objects.filter(**filters).values_list('quantity', 'revenue', 'orders'))
+
+    def test_status_changes_move_orders_in_and_out(self):
+        first, second, third = self.orders
+        first.status = 'delivered'
+        first.save()
+        Order.objects.filter(pk__in=[second.pk, third.pk]).update(status='delivered')
+        self.assertEqual(self.sales(DailyProductSales, product=self.kettle), [(3, 60, 3)])
+        self.assertEqual(self.sales(DailyCategorySales, category=self.garden), [(9, 90, 3)])
+
+        Order.objects.filter(pk=first.pk).update(status='cancelled')
+        second.delete()
+        self.assertEqual(self.sales(DailyProductSales, product=self.hose), [(2, 10, 1)])
+        self.assertEqual(self.sales(DailyCategorySales, category=self.kitchen), [(1, 20, 1)])
+
+        third.refresh_from_db()
+        third.status = 'cancelled'
+        third.save()
+        self.assertFalse(DailyProductSales.objects.exists())
+        self.assertFalse(DailyCategorySales.objects.exists())
+
+    def test_backfill_matches_incremental_rollups(self):
+        Order.objects.update(status='delivered')
+        expected = self.sales(DailyCategorySales)
+        DailyCategorySales.objects.update(revenue=0)
+        call_command('backfill_sales', chunk_size=2, stdout=StringIO())
+        self.assertEqual(self.sales(DailyCategorySales), expected)
+
+    def test_backfill_processes_whole_days_per_chunk(self):
+        first, second, third = self.orders
+        Order.objects.update(status='delivered')
+        Order.objects.filter(pk=first.pk).update(order_date=first.order_date - timedelta(days=2))
+        Order.objects.filter(pk=second.pk).update(order_date=second.order_date - timedelta(days=1))
+
+        stdout = StringIO()
+        call_command('backfill_sales', chunk_size=1, stdout=stdout)
+        self.assertIn('Rolled up 3 order(s) in 3 chunk(s) into 12 row(s)', stdout.getvalue())
+        self.assertEqual(self.sales(DailyCategorySales, category=self.garden), [(3, 30, 1)] * 3)
+
+        stdout = StringIO()
+        since = timezone.localdate(second.order_date - timedelta(days=1))
+        call_command('backfill_sales', chunk_size=2, since=since, stdout=stdout)
+        self.assertIn('Rolled up 2 order(s) in 1 chunk(s) into 8 row(s)', stdout.getvalue())
+        self.assertEqual(DailyProductSales.objects.count(), 6)
+
+    def test_backfill_replaces_rollups_chunk_by_chunk(self):
+        first, second, third = self.orders
+        Order.objects.update(status='delivered')
+        Order.objects.filter(pk=first.pk).update(order_date=first.order_date - timedelta(days=4))
+        Order.objects.filter(pk=second.pk).update(order_date=second.order_date - timedelta(days=2))
+        today = timezone.localdate(third.order_date)
+        # A stale rollup on a day without sales between two chunks.
+        DailyProductSales.objects.create(
+            product=self.hose, day=today - timedelta(days=3), quantity=1, revenue=5, orders=1
+        )
+
+        roll_up = BackfillSalesCommand.roll_up
+
+        def fail_after_first_chunk(command, orders, chunk_size):
+            if DailyProductSales.objects.filter(day=today - timedelta(days=4)).exists():
+                raise RuntimeError('Stopped')
+            return roll_up(command, orders, chunk_size)
+
+        with mock.patch.object(BackfillSalesCommand, 'roll_up', autospec=True, side_effect=fail_after_first_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('backfill_sales', chunk_size=1, stdout=StringIO())
+        # The first chunk is committed and the days of the stopped chunks keep their rollups.
+        self.assertEqual(
+            self.sales(DailyProductSales, product=self.kettle, day=today - timedelta(days=4)), [(1, 20, 1)]
+        )
+        self.assertEqual(self.sales(DailyProductSales, product=self.kettle, day=today), [(3, 60, 3)])
+
+        call_command('backfill_sales', chunk_size=1, stdout=StringIO())
+        self.assertEqual(
+            list(DailyProductSales.objects.filter(product=self.hose).order_by('day').values_list('day', 'quantity')),
+            [(today - timedelta(days=4), 2), (today - timedelta(days=2), 2), (today, 2)]
+        )
+
+    def test_report(self):
+        Order.objects.update(status='delivered')
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        url = reverse('sales-report')
+
+        response = client.get(url, {'group_by': 'category'})
+        self.assertEqual(
+            [(row['name'], row['revenue']) for row in response.data['results']],
+            [('Garden', 90), ('Kitchen', 60)]
+        )
+        with self.assertNumQueries(1):
+            response = client.get(url)
+        self.assertEqual([row['quantity'] for row in response.data['results']], [9])
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.kitchen = Category.objects.create(name='Kitchen')
+        cls.garden = Category.objects.create(name='Garden')
+        cls.kettle = create_product('Kettle', stock=3)
+        cls.kettle.category.add(cls.garden)
+
+    def test_upserts_by_slug_and_reports_bad_rows(self):
+        feed = StringIO(
+            'slug,name,price,stock,categories\n'
+            'kettle,Steel Kettle,25.00,7,kitchen\n'
+            ',Garden Hose,12.50,,garden|kitchen\n'
+            'bad,Broken,free,1,\n'
+            'rake,Rake,5.00,1,unknown\n'
+            'kettle,Kettle again,1.00,1,\n'
+        )
+        importer = ProductImporter(chunk_size=10).run(read_feed(feed, 'csv'))
+
+        self.assertEqual((importer.created, importer.updated), (1, 1))
+        self.assertEqual([line for line, _ in importer.errors], [4, 5, 6])
+        self.kettle.refresh_from_db()
+        self.assertEqual((self.kettle.name, self.kettle.price, self.kettle.stock), ('Steel Kettle', Decimal('25.00'), 7))
+        self.assertEqual(self.kettle.description, 'Kettle description')
+        self.assertEqual(list(self.kettle.category.all()), [self.kitchen])
+        hose = Product.objects.get(slug='garden-hose')
+        self.assertEqual(hose.category.count(), 2)
+        self.assertEqual(
+            dict(Category.objects.values_list('slug', 'product_count')),
+            {'kitchen': 2, 'garden': 1}
+        )
+
+    def test_columns_left_out_keep_their_stored_values(self):
+        feed = StringIO(
+            'slug,name,description,price,stock\n'
+            'kettle,Steel Kettle,,25.00,\n'
+            'rake,Rake,Garden rake,5.00,4\n'
+        )
+        importer = ProductImporter(chunk_size=10).run(read_feed(feed, 'csv'))
+
+        self.assertEqual((importer.created, importer.updated, importer.errors), (1, 1, []))
+        self.kettle.refresh_from_db()
+        self.assertEqual(
+            (self.kettle.name, self.kettle.description, self.kettle.stock),
+            ('Steel Kettle', 'Kettle description', 3)
+        )
+        rake = Product.objects.get(slug='rake')
+        self.assertEqual((rake.description, rake.stock), ('Garden rake', 4))
+
+    def test_query_count_does_not_depend_on_rows(self):
+        def feed(count):
+            return [
+                (line, {'name': f'Item {line}', 'price': '1.00', 'categories': ['kitchen']})
+                for line in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as few:
+            ProductImporter().run(feed(2))
+        with self.assertNumQueries(len(few)):
+            ProductImporter().run(feed(40))
+        self.assertEqual(Category.objects.get(slug='kitchen').product_count, 40)
+
+    def test_command(self):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(handle, 'w') as stream:
+            stream.write('{"slug": "kettle", "name": "Kettle", "price": "9.99", "status": "archived"}\nnot json\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_products', path, stdout=out, stderr=err)
+        self.assertIn('1 updated, 1 rejected', out.getvalue())
+        self.assertIn('Line 2', err.getvalue())
+        self.assertEqual(Product.objects.get(slug='kettle').status, 'archived')
+
+
+class SlugAllocationTests(TestCase):
+    def test_same_named_products_get_suffixes(self):
+        first = create_product('Tea Pot')
+        second = create_product('Tea Pot')
+        self.assertEqual((first.slug, second.slug), ('tea-pot', 'tea-pot-2'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_slugs(Product, ['Tea Pot', 'Tea pot!', 'Cup']), ['tea-pot-3', 'tea-pot-4', 'cup'])
+
+    def test_bulk_insert_of_ten_thousand_same_named_products(self):
+        create_product('Mug')
+        with CaptureQueriesContext(connection) as queries:
+            Product.objects.bulk_create(
+                Product(name='Mug', image='images/mug.jpg', description='Mug', price=Decimal('3.00'))
+                for _ in range(10000)
+            )
+        self.assertEqual(len([query for query in queries if 'LIKE' in query['sql']]), 1)
+        slugs = set(Product.objects.values_list('slug', flat=True))
+        self.assertEqual(len(slugs), 10001)
+        self.assertIn('mug-10001', slugs)
+        self.assertEqual(create_product('Mug').slug, 'mug-10002')
+
+    def test_long_names_keep_room_for_suffixes(self):
+        name = 'x' * 80
+        slugs = [create_product(name).slug for _ in range(3)]
+        self.assertEqual(slugs[0], 'x' * 50)
+        self.assertEqual(slugs[1:], ['x' * 42 + '-2', 'x' * 42 + '-3'])
+
+    def test_conflicting_concurrent_insert_is_retried(self):
+        create_product('Lamp')
+        # The first lookup misses the existing 'lamp', as if it had been inserted concurrently.
+        with mock.patch('products.slugs._taken', side_effect=[{'lamp': (False, 1)}, {'lamp': (True, 1)}]) as taken:
+            self.assertEqual(create_product('Lamp').slug, 'lamp-2')
+        self.assertEqual(taken.call_count, 2)
+
+    def test_categories(self):
+        Category.objects.create(name='Tools')
+        Category.objects.bulk_create([Category(name='Tools'), Category(name='Tools', slug='garage')])
+        self.assertEqual(
+            sorted(Category.objects.values_list('slug', flat=True)),
+            ['garage', 'tools', 'tools-2']
+        )
+
+
+@override_settings(RENDITIONS_SYNC=True)
+class RenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, name, size=(800, 400), mode='RGB'):
+        buffer = BytesIO()
+        Image.new(mode, size).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_renditions(self):
+        product = create_product('Kettle', image=self.upload('kettle.png'))
+        thumbnail = product.image_renditions['thumbnail']
+        self.assertEqual((thumbnail['width'], thumbnail['height']), (200, 100))
+        self.assertEqual(thumbnail['webp'], 'images/renditions/kettle_png-thumbnail.webp')
+        with default_storage.open(thumbnail['jpg']) as stored:
+            self.assertEqual(Image.open(stored).size, (200, 100))
+        product.refresh_from_db()
+        self.assertEqual(product.image_renditions['medium']['width'], 600)
+
+        product.stock = 3
+        with mock.patch('products.models.product.schedule_renditions') as schedule:
+            product.save()
+        schedule.assert_not_called()
+
+    def test_serializers_expose_urls(self):
+        user = create_user(profile_picture=self.upload('ada.png', (100, 300), 'RGBA'))
+        self.assertEqual(user.profile_picture_renditions['small']['height'], 64)
+        request = RequestFactory().get('/')
+        data = UserSerializer(user, context={'request': request}).data
+        self.assertEqual(
+            data['profile_picture_renditions']['small']['webp'],
+            'http://testserver/media/profile_pictures/renditions/ada_png-small.webp'
+        )
+
+    def test_regenerate_command(self):
+        product = create_product('Lamp', image=self.upload('lamp.png'))
+        with self.assertLogs('products.renditions', 'WARNING'):
+            broken = create_product('Broken', image='images/missing.png')
+            Product.objects.update(image_renditions={})
+            out = StringIO()
+            call_command('regenerate_renditions', model=['product'], missing=True, workers=0, stdout=out)
+        self.assertIn('Rendered 1 image(s)', out.getvalue())
+        self.assertIn('1 could not be read', out.getvalue())
+        product.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual(set(product.image_renditions), {'thumbnail', 'medium'})
+        self.assertEqual(broken.image_renditions, {})
+
+
+class BenchmarkTests(TestCase):
+    VOLUMES = ['--users', '5', '--categories', '4', '--products', '30', '--reviews', '40', '--orders', '20']
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_seeding_is_deterministic(self):
+        def seed(prefix):
+            seed_all({'users': 5, 'categories': 4, 'products': 30, 'reviews': 40, 'orders': 20}, prefix, seed=7)
+            return list(
+                Product.objects.filter(slug__startswith=f'{prefix}-')
+                .order_by('pk').values_list('name', 'price', 'stock', 'rating_count')
+            )
+
+        self.assertEqual(seed('first'), seed('second'))
+        self.assertEqual(Order.objects.filter(items_cost__gt=0).count(), 40)
+
+    def test_chunks_seeded_in_any_order_refer_to_the_same_rows(self):
+        # Workers insert the chunks of a phase in any order; SQLite has none, so the order is swapped by hand.
+        def seed(prefix, order):
+            common = {'seed': 3, 'password': 'unusable'}
+            for kind, count in [('users', 9), ('products', 12)]:
+                if kind == 'products':
+                    common['category_ids'] = seeding.seed_categories(prefix, 2)
+                for start in order(range(0, count, 3)):
+                    seeding.seed_chunk(kind, prefix, start, min(start + 3, count), **common)
+            seeding.references.cache_clear()
+            for kind in ['reviews', 'orders']:
+                for start in order(range(0, 10, 5)):
+                    seeding.seed_chunk(kind, prefix, start, start + 5, **common)
+            reviews = Review.objects.filter(product__slug__startswith=f'{prefix}-').values_list(
+                'text', 'product__slug', 'user__username', 'rating'
+            )
+            items = OrderItem.objects.filter(order__user__username__startswith=f'{prefix}-').values_list(
+                'order__user__username', 'order__status', 'product__slug', 'quantity', 'price'
+            )
+            return sorted(
+                tuple(str(value).removeprefix(f'{prefix}-') for value in row) for row in [*reviews, *items]
+            )
+
+        self.assertEqual(seed('first', list), seed('second', reversed))
+
+    def test_seed_data_command(self):
+        out = StringIO()
+        call_command(
+            'seed_data', *self.VOLUMES, '--prefix', 'load', '--chunk-size', '7', '--workers', '0', stdout=out
+        )
+        self.assertIn('rows/s', out.getvalue())
+        self.assertEqual(User.objects.filter(username__startswith='load-user-').count(), 5)
+        self.assertEqual(OrderItem.objects.count(), 3 * Order.objects.count())
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(Review.objects.count(), 40)
+        self.assertTrue(User.objects.get(username='load-user-3').check_password(seeding.PASSWORD))
+        self.assertEqual(Product.objects.aggregate(total=Sum('rating_count'))['total'], 40)
+        delivered = OrderItem.objects.filter(order__status='delivered').aggregate(total=Sum('quantity'))['total']
+        self.assertEqual(DailyProductSales.objects.aggregate(total=Sum('quantity'))['total'], delivered)
+
+    def test_results_are_written_compared_and_rolled_back(self):
+        output = os.path.join(self.directory, 'results.json')
+        call_command('benchmark', *self.VOLUMES, '--repeat', '2', '--output', output, stdout=StringIO())
+        with open(output) as stream:
+            results = json.load(stream)['results']
+        self.assertIn('checkout', results)
+        self.assertGreater(results['catalog_list']['queries'], 0)
+        self.assertFalse(Product.objects.exists())
+
+        for result in results.values():
+            result['queries'] -= 1
+        with open(output, 'w') as stream:
+            json.dump({'volumes': {}, 'database': 'other', 'results': results}, stream)
+        with self.assertRaisesMessage(CommandError, 'regression(s): catalog_list'):
+            call_command(
+                'benchmark', *self.VOLUMES, '--scenario', 'catalog_list', '--compare', output,
+                stdout=StringIO(), stderr=StringIO()
+            )
+
+
+@override_settings(QUERY_PROFILING=True)
+class QueryProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff', is_staff=True)
+        cls.products = [create_product(f'Product {index}') for index in range(4)]
+
+    def setUp(self):
+        profiling.reset()
+
+    @override_settings(QUERY_PROFILING=False)
+    def test_middleware_removes_itself_when_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            QueryProfilingMiddleware(lambda request: None)
+
+    def test_requests_are_aggregated_per_url_name(self):
+        for _ in range(2):
+            response = self.client.get(reverse('product-list'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.client.get(reverse('product-detail', args=[self.products[0].slug]))
+
+        endpoints = {row['endpoint']: row for row in profiling.report()}
+        self.assertEqual(endpoints['GET product-list']['requests'], 2)
+        self.assertGreater(endpoints['GET product-list']['avg_queries'], 0)
+        self.assertGreater(endpoints['GET product-list']['avg_render_ms'], 0)
+        self.assertEqual(endpoints['GET product-detail']['requests'], 1)
+
+    def test_repeated_queries_are_reported(self):
+        def view(request):
+            for product in self.products:
+                Product.objects.get(pk=product.pk)
+            return HttpResponse()
+
+        middleware = QueryProfilingMiddleware(view)
+        with self.assertLogs('products.profiling', 'WARNING'):
+            middleware(RequestFactory().get('/'))
+        [row] = profiling.report()
+        self.assertEqual(row['duplicate_requests'], 1)
+        self.assertEqual(row['duplicates'][0]['count'], 4)
+
+    def test_report_endpoint_and_command(self):
+        out = StringIO()
+        call_command('profile_endpoints', reverse('category-tree'), repeat=3, as_json=True, stdout=out)
+        self.assertEqual([row['requests'] for row in json.loads(out.getvalue())], [3])
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('profiling-report'))
+        self.assertTrue(response.data['enabled'])
+        self.assertEqual(self.client.delete(reverse('profiling-report')).status_code, 204)
+        self.assertEqual([row['endpoint'] for row in profiling.report()], ['DELETE profiling-report'])
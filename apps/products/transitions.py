@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Order, OrderItem, OrderStatusTransition
+from .models.order import ALLOWED_TRANSITIONS, RESERVING_STATUSES
+from .stock import release_lines_bulk
+
+
+class InvalidTransition(Exception):
+    """
+    Raised when some orders of a batch cannot move to the requested status.
+
+    Attributes:
+        status (str): The requested status.
+        rejected (list): The `(order_id, current status)` pairs that cannot make the move, ordered by order id;
+            the status is `None` for orders that do not exist.
+    """
+
+    def __init__(self, status, rejected):
+        self.status = status
+        self.rejected = rejected
+        super().__init__(
+            f'Cannot move order(s) to {status}: '
+            + ', '.join(f'{order_id} ({current or "unknown"})' for order_id, current in rejected)
+        )
+
+
+def transition_orders(order_ids, status, changed_by=None):
+    """
+    Moves every order of `order_ids` to `status`, all or nothing, and returns the number of orders moved.
+
+    The orders are locked with one `SELECT ... FOR UPDATE` in ascending id order and checked against
+    `ALLOWED_TRANSITIONS`; if any of them cannot make the move, nothing is written and `InvalidTransition`
+    lists them all. Otherwise the orders are moved with one UPDATE per source status, conditioned on that
+    status so backends without row locks cannot apply a stale move either. Cancelled orders give their
+    reserved stock back with a single UPDATE, and the history is written with one INSERT.
+    """
+    order_ids = sorted(set(order_ids))
+    with transaction.atomic():
+        current = dict(
+            Order.objects
+            .select_for_update()
+            .filter(pk__in=order_ids)
+            .order_by('pk')
+            .values_list('pk', 'status')
+        )
+        rejected = [
+            (order_id, current.get(order_id))
+            for order_id in order_ids
+            if status not in ALLOWED_TRANSITIONS.get(current.get(order_id), ())
+        ]
+        if rejected:
+            raise InvalidTransition(status, rejected)
+
+        sources = defaultdict(list)
+        for order_id in order_ids:
+            sources[current[order_id]].append(order_id)
+        now = timezone.now()
+        for source, ids in sources.items():
+            if Order.objects.filter(pk__in=ids, status=source).update(status=status, updated_at=now) != len(ids):
+                # Only reachable without row locks (SQLite), when another writer moved some of the orders.
+                moved = Order.objects.filter(pk__in=ids).exclude(status=status).values_list('pk', 'status')
+                raise InvalidTransition(status, sorted(moved) or [(order_id, source) for order_id in ids])
+
+        if status == 'cancelled':
+            release_lines_bulk(
+                OrderItem.objects
+                .filter(order_id__in=[order_id for source in RESERVING_STATUSES for order_id in sources[source]])
+                .values_list('product_id', 'quantity')
+            )
+        OrderStatusTransition.objects.bulk_create([
+            OrderStatusTransition(
+                order_id=order_id,
+                from_status=current[order_id],
+                to_status=status,
+                changed_by=changed_by
+            )
+            for order_id in order_ids
+        ])
+    return len(order_ids)
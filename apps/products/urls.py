@@ -0,0 +1,31 @@
+from django.urls import path
+
+from . import async_views, views
+
+urlpatterns = [
+    path('async/categories/<slug:slug>/', async_views.AsyncCategoryDetailView.as_view(), name='async-category-detail'),
+    path('async/products/', async_views.AsyncProductListView.as_view(), name='async-product-list'),
+    path('async/products/<slug:slug>/', async_views.AsyncProductDetailView.as_view(), name='async-product-detail'),
+    path(
+        'async/products/<slug:slug>/reviews/',
+        async_views.AsyncProductReviewListView.as_view(),
+        name='async-product-reviews'
+    ),
+    path('cart/', views.CartView.as_view(), name='cart'),
+    path('cart/checkout/', views.CartCheckoutView.as_view(), name='cart-checkout'),
+    path('categories/tree/', views.CategoryTreeView.as_view(), name='category-tree'),
+    path('categories/<slug:slug>/', views.CategoryDetailView.as_view(), name='category-detail'),
+    path('products/', views.ProductListView.as_view(), name='product-list'),
+    path('products/search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('products/low-stock/', views.LowStockProductListView.as_view(), name='product-low-stock'),
+    path('products/<slug:slug>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('products/<slug:slug>/reviews/', views.ProductReviewListView.as_view(), name='product-reviews'),
+    path('jobs/', views.JobStatsView.as_view(), name='job-stats'),
+    path('orders/', views.OrderListView.as_view(), name='order-list'),
+    path('orders/export/', views.OrderExportView.as_view(), name='order-export'),
+    path('orders/transition/', views.OrderTransitionView.as_view(), name='order-transition'),
+    path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
+    path('profiling/', views.ProfilingReportView.as_view(), name='profiling-report'),
+    path('sales/', views.SalesReportView.as_view(), name='sales-report'),
+    path('stock-events/', views.StockEventListView.as_view(), name='stock-event-list'),
+]
@@ -1,3 +1,461 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db.models import F, Sum
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from . import jobs, profiling
+from .cache import category_key, product_key, read_through
+from .carts import CART_COOKIE, CART_TTL, EmptyCart, ShoppingCart
+from .checkout import ProductUnavailable, place_order
+from .export import EXPORT_FORMATS, export_orders, filter_orders
+from .fast_serializers import order_values, product_values, review_values
+from .models import Category, DailyCategorySales, DailyProductSales, Order, Product, Review, StockEvent
+from .pagination import (
+    LowStockPagination,
+    OrderCursorPagination,
+    ProductPagination,
+    ReviewPagination,
+    SearchPagination,
+    StockEventCursorPagination,
+)
+from .serializers import (
+    CartCheckoutSerializer,
+    CartLineSerializer,
+    CategorySerializer,
+    CheckoutSerializer,
+    OrderExportSerializer,
+    OrderSerializer,
+    OrderTransitionSerializer,
+    ProductFilterSerializer,
+    ProductSearchSerializer,
+    ProductSerializer,
+    ReviewSerializer,
+    SalesReportSerializer,
+    StockEventFilterSerializer,
+    StockEventSerializer,
+)
+from .stock import InsufficientStock
+from .transitions import InvalidTransition, transition_orders
+
+
+class OrderQuerysetMixin:
+    """
+    Restricts orders to the requesting user (staff users see every order) and loads
+    everything `OrderSerializer` renders up front.
+    """
+    serializer_class = OrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_own_orders(self):
+        queryset = Order.objects.all()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(user=self.request.user)
+        return queryset
+
+    def get_queryset(self):
+        return self.get_own_orders().with_details()
+
+    def place(self, create_order):
+        """
+        Runs `create_order()` and answers with the created order, 400 for unavailable products or 409
+        listing the lines whose stock ran out.
+        """
+        try:
+            order = create_order()
+        except ProductUnavailable as error:
+            return Response(
+                {'unavailable': error.product_ids},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except InsufficientStock as error:
+            return Response(
+                {'insufficient_stock': [
+                    {'product': product_id, 'quantity': quantity}
+                    for product_id, quantity in error.failed
+                ]},
+                status=status.HTTP_409_CONFLICT
+            )
+        order = self.get_queryset().get(pk=order.pk)
+        return Response(self.get_serializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class ValuesListMixin:
+    """
+    Serves list responses through a `ValuesSerializer` compiled from the view's serializer,
+    paginating plain `.values()` rows instead of model instances.
+    """
+    values_serializer = None
+
+    def get_list_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        rows = self.values_serializer.values(self.get_list_queryset())
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(self.values_serializer.serialize_rows(list(rows), request))
+        return self.get_paginated_response(self.values_serializer.serialize_rows(page, request))
+
+
+class OrderListView(OrderQuerysetMixin, ValuesListMixin, generics.ListAPIView):
+    """
+    Lists the order history of the requesting user, newest first, and places new orders.
+
+    A POST takes a `CheckoutSerializer` payload and answers with the created order, 400 for
+    unavailable products or 409 listing the lines whose stock ran out.
+    """
+    pagination_class = OrderCursorPagination
+    values_serializer = order_values
+
+    def get_list_queryset(self):
+        return self.filter_queryset(self.get_own_orders())
+
+    def post(self, request, *args, **kwargs):
+        checkout = CheckoutSerializer(data=request.data)
+        checkout.is_valid(raise_exception=True)
+        lines = [(line['product'], line['quantity']) for line in checkout.validated_data['items']]
+        return self.place(lambda: place_order(request.user, checkout.validated_data['address'], lines))
+
+
+class CartView(APIView):
+    """
+    Returns the shopping cart of the requesting user or visitor with its prices recomputed; a DELETE empties it.
+
+    A POST takes a `CartLineSerializer` payload and sets the quantity of a product, 0 removing it.
+    Anonymous visitors are identified by the cart cookie, set on their first change.
+    """
+
+    def get(self, request):
+        cart = ShoppingCart.for_request(request)
+        return Response(cart.priced())
+
+    def post(self, request):
+        line = CartLineSerializer(data=request.data)
+        line.is_valid(raise_exception=True)
+        product, quantity = line.validated_data['product'], line.validated_data['quantity']
+        if quantity and not Product.objects.filter(pk=product, status='active').exists():
+            return Response({'unavailable': [product]}, status=status.HTTP_400_BAD_REQUEST)
+        cart = ShoppingCart.for_request(request)
+        cart.set_quantity(product, quantity)
+        response = Response(cart.priced())
+        if cart.user is None and request.COOKIES.get(CART_COOKIE) != cart.token:
+            response.set_cookie(CART_COOKIE, cart.token, max_age=CART_TTL, httponly=True, samesite='Lax')
+        return response
+
+    def delete(self, request):
+        ShoppingCart.for_request(request).clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartCheckoutView(OrderQuerysetMixin, generics.GenericAPIView):
+    """
+    Turns the cart of the requesting user into an order, answering like an order POST, or 400 for an empty cart.
+    """
+
+    def post(self, request):
+        checkout = CartCheckoutSerializer(data=request.data)
+        checkout.is_valid(raise_exception=True)
+        cart = ShoppingCart.for_request(request)
+        try:
+            return self.place(lambda: cart.checkout(checkout.validated_data['address']))
+        except EmptyCart:
+            return Response({'detail': 'The cart is empty.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class OrderDetailView(OrderQuerysetMixin, generics.RetrieveAPIView):
+    """
+    Returns a single order of the requesting user with its items.
+    """
+
+
+class OrderExportView(APIView):
+    """
+    Streams every order with its items to staff users as CSV or JSON Lines, in constant memory.
+
+    Query parameters:
+        output: `csv` (default) or `jsonl`.
+        since, until: Inclusive range of order placement dates (YYYY-MM-DD).
+        status: Order status to export.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        params = OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        output = params.validated_data['output']
+        orders = filter_orders(
+            Order.objects.all(),
+            since=params.validated_data.get('since'),
+            until=params.validated_data.get('until'),
+            status=params.validated_data.get('status')
+        )
+        response = StreamingHttpResponse(export_orders(orders, output), content_type=EXPORT_FORMATS[output][1])
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
+
+class OrderTransitionView(APIView):
+    """
+    Moves a batch of orders to a new status for staff users, all or nothing.
+
+    A POST takes an `OrderTransitionSerializer` payload and answers with the number of orders moved,
+    or 409 listing the orders whose current status does not allow the move.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        params = OrderTransitionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        try:
+            moved = transition_orders(
+                params.validated_data['orders'],
+                params.validated_data['status'],
+                changed_by=request.user
+            )
+        except InvalidTransition as error:
+            return Response(
+                {'invalid_transitions': [
+                    {'order': order_id, 'status': current}
+                    for order_id, current in error.rejected
+                ]},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({'status': params.validated_data['status'], 'moved': moved})
+
+
+class SalesReportView(APIView):
+    """
+    Reports sales revenue and units between two days to staff users, read from the daily rollups,
+    so the cost follows the number of days and products reported rather than the order history.
+
+    Query parameters:
+        since, until: Inclusive range of days (YYYY-MM-DD), the last 30 days by default.
+        group_by: `day` (default), `product` or `category`; products and categories come best selling first.
+        limit: Number of products or categories reported, 50 by default.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        params = SalesReportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since, until, group_by = (params.validated_data[name] for name in ('since', 'until', 'group_by'))
+        totals = {'quantity': Sum('quantity'), 'revenue': Sum('revenue')}
+
+        if group_by == 'category':
+            rows = DailyCategorySales.objects.filter(day__range=(since, until)).values(
+                'category_id', name=F('category__name')
+            )
+        else:
+            rows = DailyProductSales.objects.filter(day__range=(since, until))
+            rows = rows.values('day') if group_by == 'day' else rows.values(
+                'product_id', name=F('product__name')
+            )
+        rows = rows.annotate(**totals)
+        if group_by == 'day':
+            rows = rows.order_by('day')
+        else:
+            rows = rows.order_by('-revenue', F('name').asc())[:params.validated_data['limit']]
+
+        return Response({'since': since, 'until': until, 'group_by': group_by, 'results': list(rows)})
+
+
+class ProfilingReportView(APIView):
+    """
+    Returns the per-endpoint query and latency stats gathered by `QueryProfilingMiddleware` in this
+    process to staff users; a DELETE starts over.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({'enabled': settings.QUERY_PROFILING, 'endpoints': profiling.report()})
+
+    def delete(self, request):
+        profiling.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobStatsView(APIView):
+    """
+    Returns the background job queue metrics per job kind to staff users: the queue depth, and the
+    number and latency of the jobs done in the last hour.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({'kinds': jobs.stats()})
+
+
+class CatalogFilterMixin:
+    """
+    Validates the catalog query parameters with `filter_serializer_class` and applies them
+    to the active-by-default product queryset.
+    """
+    filter_serializer_class = ProductFilterSerializer
+
+    def get_filter_params(self):
+        filters = self.filter_serializer_class(data=self.request.query_params, context={'request': self.request})
+        filters.is_valid(raise_exception=True)
+        return filters.validated_data
+
+    def filter_catalog(self, params):
+        queryset = Product.objects.filter(status=params['status'])
+        if 'category' in params:
+            queryset = queryset.in_category(params['category'])
+        queryset = queryset.price_between(params.get('min_price'), params.get('max_price'))
+        if 'min_rating' in params:
+            queryset = queryset.filter(rating_avg__gte=params['min_rating'])
+        return queryset.defer('search_vector').prefetch_related('category')
+
+
+class ProductListView(CatalogFilterMixin, ValuesListMixin, generics.ListAPIView):
+    """
+    Lists the product catalog, newest first.
+
+    Pages are cut by `ProductPagination` on (ordering field, `id`), so deep pages of a sort with many
+    ties cost the same as the first one.
+
+    Query parameters:
+        status: Product status to list, 'active' by default; 'draft' is limited to staff users.
+        category: Slug of a category the products must belong to.
+        min_price, max_price: Inclusive range of the effective (discounted) price.
+        min_rating: Lowest average review rating.
+        ordering: `-created_at` (default), `-rating_avg`, `effective_price` or `-effective_price`.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = ProductPagination
+    values_serializer = product_values
+
+    def get_queryset(self):
+        return self.filter_catalog(self.get_filter_params())
+
+
+class ProductSearchView(CatalogFilterMixin, generics.ListAPIView):
+    """
+    Full-text product search, best match first.
+
+    Query parameters:
+        q: The search terms.
+        status, category, min_price, max_price, min_rating: The same filters as the catalog.
+    """
+    serializer_class = ProductSerializer
+    pagination_class = SearchPagination
+    filter_serializer_class = ProductSearchSerializer
+
+    def get_queryset(self):
+        params = self.get_filter_params()
+        return self.filter_catalog(params).search(params['q'])
+
+
+class ProductReviewListView(ValuesListMixin, generics.ListAPIView):
+    """
+    Lists the reviews of a published product, newest first, with a summary of their authors.
+
+    Pages are cut by `ReviewPagination` along the per-product review indexes, and a page of any size
+    costs three queries: the product, the reviews and their authors.
+
+    Query parameters:
+        ordering: `-created_at` (default), `created_at`, `rating` or `-rating`.
+    """
+    serializer_class = ReviewSerializer
+    pagination_class = ReviewPagination
+    values_serializer = review_values
+
+    def get_queryset(self):
+        product = get_object_or_404(Product.objects.exclude(status='draft').only('pk'), slug=self.kwargs['slug'])
+        return Review.objects.filter(product=product)
+
+
+class LowStockProductListView(ValuesListMixin, generics.ListAPIView):
+    """
+    Lists the active products at or below their low-stock threshold to staff users, emptiest first.
+
+    Reads the partial low-stock index, so the cost follows the number of low-stock products, not the catalog.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = ProductSerializer
+    pagination_class = LowStockPagination
+    values_serializer = product_values
+
+    def get_queryset(self):
+        return Product.objects.low_stock().filter(status='active')
+
+
+class StockEventListView(generics.ListAPIView):
+    """
+    Lists low-stock alerts and restocks to staff users, newest first.
+
+    Query parameters:
+        kind: `low` or `restocked` to list only one kind of event.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    serializer_class = StockEventSerializer
+    pagination_class = StockEventCursorPagination
+
+    def get_queryset(self):
+        params = StockEventFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = StockEvent.objects.select_related('product').only(
+            'kind', 'stock', 'threshold', 'created_at', 'product__name'
+        )
+        if 'kind' in params.validated_data:
+            queryset = queryset.filter(kind=params.validated_data['kind'])
+        return queryset
+
+
+class CategoryTreeView(APIView):
+    """
+    Returns the whole category tree, or the subtree below `?root=<slug>`, built from one query.
+
+    Every node carries its cached count of active products.
+    """
+
+    def get(self, request):
+        categories = Category.objects.all()
+        root = request.query_params.get('root')
+        if root:
+            categories = categories.subtree(get_object_or_404(Category, slug=root))
+        return Response(categories.as_tree())
+
+
+def load_product_payload(slug):
+    product = (
+        Product.objects
+        .exclude(status='draft')
+        .defer('search_vector')
+        .prefetch_related('category')
+        .filter(slug=slug)
+        .first()
+    )
+    return dict(ProductSerializer(product).data) if product else None
+
+
+def load_category_payload(slug):
+    category = Category.objects.filter(slug=slug).first()
+    return dict(CategorySerializer(category).data) if category else None
+
+
+class ProductDetailView(APIView):
+    """
+    Returns a published product by slug, served from the read-through cache.
+    """
+
+    def get(self, request, slug):
+        payload = read_through(product_key(slug), lambda: load_product_payload(slug))
+        if payload is None:
+            raise Http404
+        return Response(payload)
+
+
+class CategoryDetailView(APIView):
+    """
+    Returns a category by slug, served from the read-through cache.
+    """
+
+    def get(self, request, slug):
+        payload = read_through(category_key(slug), lambda: load_category_payload(slug))
+        if payload is None:
+            raise Http404
+        return Response(payload)
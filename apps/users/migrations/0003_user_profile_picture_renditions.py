@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_remove_user_country_remove_user_is_subscribed_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='profile_picture_renditions',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='profile picture renditions'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from products.renditions import AVATAR_RENDITIONS, schedule as schedule_renditions
 
 
 class User(AbstractUser):
@@ -9,6 +10,8 @@ class User(AbstractUser):
     This model adds additional fields to the standard Django User model,
     such as email, profile picture, bio, phone number, date of birth,
     address, city, province, postal code, and last purchase date.
+    Resized copies of the profile picture are generated in the background
+    whenever it changes and kept in `profile_picture_renditions`.
     """
     # Email field, unique and required
     email = models.EmailField(
@@ -24,6 +27,13 @@ class User(AbstractUser):
         null=True,
         blank=True
     )
+    # Resized copies of the profile picture, filled in by the rendition pipeline
+    profile_picture_renditions = models.JSONField(
+        _("profile picture renditions"),
+        default=dict,
+        blank=True,
+        editable=False
+    )
     # Bio field, optional
     bio = models.TextField(
         _("bio"),
@@ -78,6 +88,34 @@ class User(AbstractUser):
         blank=True
     )
 
+    RENDITION_FIELD = 'profile_picture'
+    RENDITION_SIZES = AVATAR_RENDITIONS
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_profile_picture = instance.__dict__.get('profile_picture') or None
+        return instance
+
+    def save(self, *args, **kwargs):
+        """
+        Saves the user, clearing the profile picture renditions and scheduling
+        their regeneration when the profile picture changed.
+        """
+        update_fields = kwargs.get('update_fields')
+        picture_changed = (
+            (update_fields is None or 'profile_picture' in update_fields)
+            and (self.profile_picture.name or None) != getattr(self, '_saved_profile_picture', None)
+        )
+        if picture_changed:
+            self.profile_picture_renditions = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = [*update_fields, 'profile_picture_renditions']
+        super().save(*args, **kwargs)
+        self._saved_profile_picture = self.profile_picture.name or None
+        if picture_changed:
+            schedule_renditions(self)
+
     def __str__(self):
         """
         Returns the full name of the user as a string.
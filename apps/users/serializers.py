@@ -1,9 +1,25 @@
 from .models import User
 from rest_framework import serializers
 from django.core.validators import EmailValidator
+from products.renditions import RenditionsField
 
-class UserSerializer(serializers.Serializer):
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    The public identity of a user shown next to their content, e.g. on reviews, without the profile.
+    """
+    class Meta:
+        model = User
+        fields = [
+        'id',
+        'username',
+        'first_name',
+        'last_name',
+        ]
+
+
+class UserSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(validators=[EmailValidator()])
+    profile_picture_renditions = RenditionsField()
     class Meta:
         model = User
         fields = [
@@ -13,6 +29,7 @@ class UserSerializer(serializers.Serializer):
         'first_name',
         'last_name',
         'profile_picture',
+        'profile_picture_renditions',
         'bio',
         'phone_number',
         'date_of_birth',
@@ -40,6 +40,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Removes itself unless QUERY_PROFILING is set.
+    'products.profiling.QueryProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'onlineshop.urls'
@@ -62,9 +64,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'onlineshop.wsgi.application'
 
+# PostgreSQL is the supported production backend; DATABASE_ENGINE=django.db.backends.sqlite3
+# (with DATABASE_NAME pointing at a file) runs the project and its tests without a server.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": os.getenv('DATABASE_ENGINE', "django.db.backends.postgresql"),
         "NAME": os.getenv('DATABASE_NAME'),
         "USER": os.getenv('DATABASE_USER'),
         "PASSWORD": os.getenv('DATABASE_PASS'),
@@ -73,6 +77,26 @@ DATABASES = {
     }
 }
 
+# Redis in production (REDIS_URL), a per-process in-memory cache for development and tests.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Sessions are read from the cache and only written through to the database when they change;
+# carts live in the cache on their own (see products.carts) and never touch the session.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -98,6 +122,16 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Image renditions are generated on a thread pool after the upload commits; tests generate them inline.
+RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', 2))
+RENDITIONS_SYNC = False
+
+# Per-request SQL and latency profiling, reported per URL name at api/profiling/ and by `profile_endpoints`.
+QUERY_PROFILING = bool(os.getenv('QUERY_PROFILING'))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
\ No newline at end of file